@@ -9,7 +9,7 @@ from fastapi import APIRouter
 
 # APIRoute is not used in this module
 # Removed login, users routes as per microservice architecture
-from app.api.routes import pages, private, utils, services, claude, file_stream
+from app.api.routes import pages, private, utils, services, claude, file_stream, workspaces
 from app.core.config import settings
 
 # No prefix here since main.py already adds the /api/v1 prefix
@@ -26,6 +26,9 @@ api_router.include_router(services.router)
 # Claude API routes
 api_router.include_router(claude.router)
 
+# Conversation workspace routes
+api_router.include_router(workspaces.router)
+
 # File streaming routes for real-time file monitoring
 api_router.include_router(file_stream.router)
 
@@ -4,20 +4,41 @@ Provides endpoints for both streaming and non-streaming Claude Code SDK interact
 Includes Server-Sent Events (SSE) support and tool usage capabilities.
 """
 
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, status
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, Any, Optional, Tuple
+from fastapi import APIRouter, Header, HTTPException, status
 from fastapi.responses import StreamingResponse
 from fastapi.params import Depends
 from loguru import logger
-import json
 
-from app.services.claude import claude_service, ClaudeRequest, ClaudeResponse
+from app.services.claude_admission import AdmissionRejected, AdmissionTicket, claude_admission
+from app.services.claude import (
+    claude_md_writer, claude_service, new_conversation_id, ClaudeRequest, ClaudeResponse
+)
+from app.services.claude_jobs import ClaudeJob, JobQueueFull, claude_jobs
+from app.services.claude_sessions import claude_session_manager
+from app.services.conversation_store import conversation_store
+from app.services.mcp_supervisor import mcp_supervisor
+from app.services.sse_transport import sse_transport
+from app.services.turn_cancellation import turn_canceller
+from app.services.turn_events import TurnEventLog, parse_event_id, run_turn_into_log, turn_event_logs
 from app.core.config import settings
 
 
 router = APIRouter(prefix="/claude", tags=["claude"])
 
 
+def _too_many_requests(rejection: AdmissionRejected) -> HTTPException:
+    """Build the 429 response for a turn that was not admitted."""
+    logger.warning(f"Claude turn rejected: {rejection}")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(rejection),
+        headers={"Retry-After": str(rejection.retry_after)},
+    )
+
+
 @router.post("/chat", response_model=ClaudeResponse)
 async def chat_with_claude(request: ClaudeRequest) -> ClaudeResponse:
     """Send a prompt to Claude Code SDK and get a complete response.
@@ -29,8 +50,13 @@ async def chat_with_claude(request: ClaudeRequest) -> ClaudeResponse:
         ClaudeResponse: Complete response from Claude Code SDK
         
     Raises:
-        HTTPException: If the API call fails
+        HTTPException: If Claude is at capacity (429) or the API call fails
     """
+    try:
+        ticket = await claude_admission.acquire(request.conversation_id)
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+    
     try:
         logger.info(f"Claude Code SDK chat request: {request.prompt[:100]}...")
         response = await claude_service.generate_response(request)
@@ -43,125 +69,110 @@ async def chat_with_claude(request: ClaudeRequest) -> ClaudeResponse:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Claude Code SDK error: {str(e)}"
         )
+    finally:
+        ticket.release()
+
+
+async def _produce_turn(request: ClaudeRequest, log: TurnEventLog, ticket: AdmissionTicket) -> None:
+    """Run a streamed turn into its event log, independently of any connection."""
+    try:
+        await run_turn_into_log(request, log)
+    finally:
+        ticket.release()
+
+
+def _sse_response(
+    events: AsyncIterator[Tuple[Optional[str], bytes]],
+    conversation_id: str,
+    on_close: Callable[[], None],
+    stats: Optional[Dict[str, Any]] = None,
+) -> StreamingResponse:
+    """Stream log events as Server-Sent Events; ``on_close`` runs when the response ends.
+    
+    Frames are coalesced into fewer writes and idle streams get keepalive
+    comments (see ``sse_transport``); ``stats`` receives the turn's frame counts.
+    """
+    
+    async def generate_sse():
+        """Generate Server-Sent Events with IDs clients can resume from."""
+        try:
+            async with aclosing(events) as followed:
+                async with aclosing(sse_transport.stream(followed, stats)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+        finally:
+            on_close()
+    
+    return StreamingResponse(
+        generate_sse(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID",
+            # Keep proxies from buffering the stream (and holding back keepalives)
+            "X-Accel-Buffering": "no",
+            "X-Conversation-Id": conversation_id,
+        }
+    )
+
+
+def _stream_response(log: TurnEventLog, after_seq: int) -> StreamingResponse:
+    """Stream a turn's events after ``after_seq``, then follow it live."""
+    # When the client goes away (or the turn is over), maybe nobody is watching anymore
+    return _sse_response(
+        log.follow(after_seq), log.conversation_id, lambda: turn_canceller.follower_left(log), log.stats
+    )
 
 
 @router.post("/stream")
-async def stream_chat_with_claude(request: ClaudeRequest):
+async def stream_chat_with_claude(
+    request: ClaudeRequest,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
     """Stream a conversation with Claude Code SDK using Server-Sent Events.
     
+    The turn runs in the background and every event carries an ID. Sending
+    the request again with a ``Last-Event-ID`` header from the running (or a
+    recently finished) turn replays the missed events and continues live,
+    without starting a new generation. A turn no client follows for
+    ``CLAUDE_DISCONNECT_GRACE_SECONDS`` is cancelled and its processes killed.
+    
     Args:
         request: The Claude request with prompt and parameters
+        last_event_id: ID of the last event received before a disconnect
         
     Returns:
         StreamingResponse: SSE stream of Claude Code SDK response
         
     Raises:
-        HTTPException: If the API call fails
+        HTTPException: If Claude is at capacity (429) or the API call fails
     """
+    if request.conversation_id and last_event_id:
+        resume = turn_event_logs.find(request.conversation_id, last_event_id, same_turn_only=True)
+        if resume is not None:
+            logger.info(f"Resuming stream of {request.conversation_id} after {last_event_id}")
+            return _stream_response(*resume)
+    
+    # Admit the turn before the response starts, so overload can still get a 429
+    try:
+        ticket = await claude_admission.acquire(request.conversation_id)
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+    
     try:
         logger.info(f"Claude Code SDK streaming request: {request.prompt[:100]}...")
         
-        async def generate_sse():
-            """Generate Server-Sent Events for Claude Code SDK message-level streaming."""
-            try:
-                async for chunk in claude_service.generate_stream(request):
-                    # Parse the chunk which is now JSON from our service
-                    try:
-                        chunk_data = json.loads(chunk)
-                        
-                        # Handle different chunk types from enhanced Claude Code SDK streaming
-                        chunk_type = chunk_data.get("type")
-                        
-                        if chunk_type == "message_info":
-                            # Message progression info
-                            progress_data = {
-                                'type': 'progress',
-                                'message_type': chunk_data.get('message_type'),
-                                'timestamp': chunk_data.get('timestamp', 0)
-                            }
-                            sse_data = f"data: {json.dumps(progress_data)}\n\n"
-                            yield sse_data
-                            
-                        elif chunk_type == "content":
-                            # Content events from Claude service
-                            content_data = {
-                                'type': 'content',
-                                'content': chunk_data.get('content', ''),
-                                'block_index': chunk_data.get('block_index', 0)
-                            }
-                            sse_data = f"data: {json.dumps(content_data)}\n\n"
-                            yield sse_data
-                            
-                        elif chunk_type == "tool_use":
-                            # Regular tool execution info
-                            tool_data = {
-                                'type': 'tool_use',
-                                'tool_name': chunk_data.get('tool_name'),
-                                'block_index': chunk_data.get('block_index', 0)
-                            }
-                            sse_data = f"data: {json.dumps(tool_data)}\n\n"
-                            yield sse_data
-                            
-                        elif chunk_type == "mcp_tool_use":
-                            # MCP tool execution info
-                            mcp_tool_data = {
-                                'type': 'mcp_tool_use',
-                                'tool_name': chunk_data.get('tool_name'),
-                                'server_name': chunk_data.get('server_name'),
-                                'tool_function': chunk_data.get('tool_function'),
-                                'block_index': chunk_data.get('block_index', 0)
-                            }
-                            sse_data = f"data: {json.dumps(mcp_tool_data)}\n\n"
-                            yield sse_data
-                            
-                        elif chunk_type == "done":
-                            # Stream completion
-                            complete_data = {
-                                'type': 'complete',
-                                'final_content': chunk_data.get('response', ''),
-                                'conversation_id': chunk_data.get('conversation_id'),
-                                'tools_used': chunk_data.get('tools_used', 0)
-                            }
-                            sse_data = f"data: {json.dumps(complete_data)}\n\n"
-                            yield sse_data
-                            
-                        elif chunk_data.get("type") in ["cli_error", "process_error", "api_error"]:
-                            # Error handling
-                            error_data = {
-                                'type': 'error',
-                                'error': chunk_data.get('error', 'Unknown error'),
-                                'error_type': chunk_data.get('type')
-                            }
-                            sse_data = f"data: {json.dumps(error_data)}\n\n"
-                            yield sse_data
-                            return
-                            
-                    except json.JSONDecodeError:
-                        # Fallback for plain text chunks (shouldn't happen with new implementation)
-                        sse_data = f"data: {json.dumps({'content': chunk, 'type': 'content'})}\n\n"
-                        yield sse_data
-                
-                # Send completion event
-                completion_data = f"data: {json.dumps({'type': 'done'})}\n\n"
-                yield completion_data
-                
-            except Exception as e:
-                # Send error event
-                error_data = f"data: {json.dumps({'error': str(e), 'type': 'error'})}\n\n"
-                yield error_data
-        
-        return StreamingResponse(
-            generate_sse(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Cache-Control",
-            }
-        )
+        # The event log is keyed by conversation, so settle the ID up front
+        request.conversation_id = request.conversation_id or new_conversation_id()
+        log = turn_event_logs.start(request.conversation_id)
+        log.cancel_on_disconnect = settings.CLAUDE_CANCEL_ON_DISCONNECT
+        log.task = asyncio.create_task(_produce_turn(request, log, ticket))
+        return _stream_response(log, 0)
         
     except Exception as e:
+        ticket.release()
         logger.error(f"Claude Code SDK streaming setup failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -169,6 +180,227 @@ async def stream_chat_with_claude(request: ClaudeRequest):
         )
 
 
+@router.get("/stream/{conversation_id}")
+async def resume_claude_stream(
+    conversation_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    """Resume the stream of a conversation's running or recently finished turn.
+    
+    Observer-only: never starts a generation, so any number of clients can
+    follow the turn. Works with EventSource reconnects. Without a ``Last-Event-ID`` (or with
+    one from an earlier turn) the current turn is replayed from its start.
+    
+    Args:
+        conversation_id: The conversation ID
+        last_event_id: ID of the last event received before a disconnect
+        
+    Returns:
+        StreamingResponse: SSE stream of the missed and upcoming events
+        
+    Raises:
+        HTTPException: If the conversation has no turn to resume
+    """
+    resume = turn_event_logs.find(conversation_id, last_event_id)
+    if resume is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No turn to resume for conversation {conversation_id}"
+        )
+    log, after_seq = resume
+    return _stream_response(log, after_seq)
+
+
+@router.get("/conversations/{conversation_id}/events")
+async def watch_claude_conversation(
+    conversation_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    """Watch a conversation's turns as Server-Sent Events, without starting any.
+    
+    For dashboards and extra tabs: replays the current turn, follows it and
+    then every later turn of the conversation, all sharing the events of the
+    one running generation. A watcher that falls too far behind receives a
+    ``lagged`` event and is disconnected; it can reconnect with its last ID.
+    
+    Args:
+        conversation_id: The conversation ID
+        last_event_id: ID of the last event received before a disconnect
+        
+    Returns:
+        StreamingResponse: SSE stream of the conversation's turns
+    """
+    
+    def watcher_left() -> None:
+        log = turn_event_logs.get(conversation_id)
+        if log is not None:
+            turn_canceller.follower_left(log)
+    
+    return _sse_response(
+        turn_event_logs.watch(conversation_id, last_event_id), conversation_id, watcher_left
+    )
+
+
+@router.post("/cancel/{conversation_id}")
+async def cancel_claude_turn(conversation_id: str) -> Dict[str, Any]:
+    """Cancel a conversation's running turn and kill its CLI process tree.
+    
+    Followers of the turn receive a ``cancelled`` event and the stream ends.
+    
+    Args:
+        conversation_id: The conversation ID
+        
+    Returns:
+        Dict with the cancelled turn and the number of processes killed
+        
+    Raises:
+        HTTPException: If the conversation has no running turn
+    """
+    result = await turn_canceller.cancel(conversation_id)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No running turn for conversation {conversation_id}"
+        )
+    return result
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_claude_job(request: ClaudeRequest) -> Dict[str, Any]:
+    """Run a turn as a background job, independently of this connection.
+    
+    Returns at once; poll ``GET /claude/jobs/{job_id}`` for the status and
+    result, or subscribe to ``GET /claude/jobs/{job_id}/events``.
+    
+    Args:
+        request: The Claude request with prompt and parameters
+        
+    Returns:
+        Dict with the job ID, conversation ID and where to follow the job
+        
+    Raises:
+        HTTPException: If the job queue is full (429)
+    """
+    try:
+        job = claude_jobs.submit(request)
+    except JobQueueFull as e:
+        logger.warning(f"Claude job rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(int(settings.CLAUDE_QUEUE_TIMEOUT_SECONDS))},
+        )
+    
+    return {
+        "job_id": job.job_id,
+        "conversation_id": job.conversation_id,
+        "status": job.status,
+        "status_url": f"{settings.API_V1_STR}/claude/jobs/{job.job_id}",
+        "events_url": f"{settings.API_V1_STR}/claude/jobs/{job.job_id}/events",
+    }
+
+
+def _get_job_or_404(job_id: str) -> ClaudeJob:
+    """Look up a job, or raise 404."""
+    job = claude_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_claude_job(job_id: str) -> Dict[str, Any]:
+    """Get a job's status, queue and run times, and its result once finished.
+    
+    Args:
+        job_id: The job ID
+        
+    Returns:
+        Dict describing the job
+        
+    Raises:
+        HTTPException: If the job is unknown or expired
+    """
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_claude_job_events(
+    job_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    """Subscribe to a job's events as Server-Sent Events.
+    
+    Replays the events so far (or those after ``Last-Event-ID``), then follows
+    the job until it finishes. Works for queued, running and finished jobs.
+    
+    Args:
+        job_id: The job ID
+        last_event_id: ID of the last event received before a disconnect
+        
+    Returns:
+        StreamingResponse: SSE stream of the job's events
+        
+    Raises:
+        HTTPException: If the job is unknown or expired
+    """
+    log = _get_job_or_404(job_id).log
+    parsed = parse_event_id(last_event_id)
+    after_seq = parsed[1] if parsed and parsed[0] == log.turn_id else 0
+    return _stream_response(log, after_seq)
+
+
+@router.get("/metrics")
+async def claude_metrics() -> Dict[str, Any]:
+    """Get Claude service metrics.
+    
+    Returns:
+        Dict containing long-lived CLI session and admission statistics, context token savings
+        history compaction, conversation store, CLAUDE.md write, streaming, MCP server, job and cancellation statistics
+    """
+    return {
+        "sessions": claude_session_manager.get_stats(),
+        "admission": claude_admission.get_stats(),
+        "context": claude_service.get_context_stats(),
+        "history": claude_service.history.get_stats(),
+        "store": conversation_store.get_stats(),
+        "claude_md": claude_md_writer.get_stats(),
+        "streaming": {
+            **claude_service.get_stream_stats(),
+            "event_logs": turn_event_logs.get_stats(),
+            "transport": sse_transport.get_stats(),
+        },
+        "mcp": mcp_supervisor.get_stats(),
+        "jobs": claude_jobs.get_stats(),
+        "cancellation": turn_canceller.get_stats(),
+    }
+
+
+@router.get("/conversations/{conversation_id}/context")
+async def conversation_context_size(conversation_id: str) -> Dict[str, Any]:
+    """Get the size of a conversation's history and replayed context.
+    
+    Args:
+        conversation_id: The conversation ID
+        
+    Returns:
+        Dict with verbatim and summarized turn counts and token estimates
+        
+    Raises:
+        HTTPException: If the conversation has no history
+    """
+    sizes = await claude_service.get_context_size(conversation_id)
+    if sizes is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No history for conversation {conversation_id}"
+        )
+    return sizes
+
+
 @router.get("/health")
 async def claude_health_check() -> Dict[str, Any]:
     """Health check for Claude Code SDK service.
@@ -0,0 +1,69 @@
+"""Conversation workspace routes.
+
+Exposes metrics for the workspace subsystems (template store, pools, eviction)
+that back the isolated Claude Code conversation workspaces, and per-turn
+checkpoint listing and rollback.
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.services.workspace_manager import workspace_manager
+
+router = APIRouter(prefix="/workspaces", tags=["workspaces"])
+
+
+@router.get("/metrics")
+async def workspace_metrics() -> Dict[str, Any]:
+    """Get workspace subsystem metrics.
+
+    Returns:
+        Dict containing workspace counts and per-subsystem statistics
+    """
+    return workspace_manager.get_metrics()
+
+
+@router.get("/{conversation_id}/checkpoints")
+async def list_workspace_checkpoints(conversation_id: str) -> List[Dict[str, Any]]:
+    """List the checkpoints taken before each turn of a conversation.
+
+    Args:
+        conversation_id: The conversation ID
+
+    Returns:
+        List of checkpoint summaries, oldest first
+    """
+    return await asyncio.to_thread(workspace_manager.list_checkpoints, conversation_id)
+
+
+@router.post("/{conversation_id}/checkpoints/{checkpoint_id}/restore")
+async def restore_workspace_checkpoint(conversation_id: str, checkpoint_id: int) -> Dict[str, Any]:
+    """Roll a conversation workspace back to a checkpoint.
+
+    Args:
+        conversation_id: The conversation ID
+        checkpoint_id: Checkpoint to restore
+
+    Returns:
+        Dict with the number of files written and deleted
+
+    Raises:
+        HTTPException: If a turn is running or the checkpoint does not exist
+    """
+    if workspace_manager.is_in_use(conversation_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A turn is in progress for this conversation",
+        )
+    with workspace_manager.using_workspace(conversation_id):
+        try:
+            return await asyncio.to_thread(
+                workspace_manager.restore_checkpoint, conversation_id, checkpoint_id
+            )
+        except KeyError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Checkpoint {checkpoint_id} not found for conversation {conversation_id}",
+            )
@@ -91,6 +91,94 @@ class Settings(BaseSettings):
     # Anthropic/Claude API settings
     ANTHOPIC_API_KEY: str | None = None
 
+    # Workspace template store
+    # Templates are fetched once into a local versioned store and copied into new
+    # conversation workspaces. "auto" uses reflinks where supported, else a plain copy;
+    # "hardlink" shares inodes with the store, so only use it for read-only templates.
+    WORKSPACE_TEMPLATE_STORE_DIR: str | None = None
+    WORKSPACE_TEMPLATE_LINK_MODE: Literal["auto", "reflink", "hardlink", "copy"] = "auto"
+    WORKSPACE_TEMPLATE_REFRESH_SECONDS: int = 6 * 60 * 60
+    # Number of pre-provisioned workspaces kept ready for new conversations (0 disables)
+    WORKSPACE_POOL_SIZE: int = 2
+    # How often buffered workspace registry updates are written to disk
+    WORKSPACE_REGISTRY_FLUSH_SECONDS: float = 2.0
+    # Workspace eviction: LRU within an overall disk budget, per-workspace quota and
+    # idle TTL (0 disables each limit). Deletes run off the event loop in parallel.
+    # Idle workspaces are archived first and only deleted once the idle TTL passes.
+    WORKSPACE_DISK_BUDGET_BYTES: int = 20 * 1024**3
+    WORKSPACE_QUOTA_BYTES: int = 0
+    WORKSPACE_ARCHIVE_AFTER_HOURS: float = 6
+    WORKSPACE_IDLE_TTL_HOURS: float = 30 * 24
+    WORKSPACE_EVICTION_INTERVAL_SECONDS: float = 300
+    WORKSPACE_EVICTION_PARALLELISM: int = 2
+    # Cross-workspace dedup of dependency trees into a reflinked content store; skipped on
+    # filesystems without reflinks (interval 0 disables the offline pass)
+    WORKSPACE_DEDUP_INTERVAL_SECONDS: float = 60 * 60
+    WORKSPACE_DEDUP_MIN_BYTES: int = 4096
+    # Incremental checkpoints taken before each turn, per conversation (0 disables)
+    WORKSPACE_CHECKPOINT_KEEP: int = 20
+
+    # Long-lived Claude Code CLI sessions, one per active conversation. Sessions are
+    # closed when idle past the TTL or when their process tree exceeds the memory
+    # limit (0 disables); the oldest idle session makes room at the session limit.
+    CLAUDE_PERSISTENT_SESSIONS: bool = True
+    CLAUDE_SESSION_IDLE_TTL_SECONDS: float = 10 * 60
+    CLAUDE_SESSION_MAX_SESSIONS: int = 32
+    CLAUDE_SESSION_MAX_RSS_MB: int = 1536
+    # Turns allowed to run at once; further turns queue in arrival order, and are
+    # rejected with 429 when the queue is full or they waited past the timeout
+    CLAUDE_MAX_CONCURRENT_TURNS: int = 8
+    CLAUDE_MAX_QUEUED_TURNS: int = 32
+    CLAUDE_QUEUE_TIMEOUT_SECONDS: float = 120
+    # Events kept per streamed turn for Last-Event-ID replay, and how long a
+    # finished turn can still be resumed
+    CLAUDE_STREAM_LOG_MAX_EVENTS: int = 5000
+    CLAUDE_STREAM_LOG_RETENTION_SECONDS: float = 10 * 60
+    # Events a stream follower may fall behind before its backlog is coalesced
+    # and, if that is not enough, it is dropped (0 disables)
+    CLAUDE_STREAM_FOLLOWER_MAX_BACKLOG: int = 256
+    # SSE events arriving within the window after a write are sent together in
+    # one write (up to the size limit); idle streams get a keepalive comment
+    CLAUDE_SSE_COALESCE_MS: float = 25
+    CLAUDE_SSE_MAX_WRITE_KB: int = 64
+    CLAUDE_SSE_KEEPALIVE_SECONDS: float = 15
+    # Background jobs run at once (each also takes an admission slot), jobs
+    # allowed to wait for a worker, and how long finished jobs can be looked up
+    CLAUDE_JOB_WORKERS: int = 4
+    CLAUDE_JOB_MAX_QUEUED: int = 100
+    CLAUDE_JOB_RETENTION_SECONDS: float = 60 * 60
+    # Streamed turns are cancelled, and their CLI process tree killed, once no
+    # client has followed them for the grace period; processes get the kill
+    # timeout to exit on SIGTERM before SIGKILL
+    CLAUDE_CANCEL_ON_DISCONNECT: bool = True
+    CLAUDE_DISCONNECT_GRACE_SECONDS: float = 30
+    CLAUDE_CANCEL_KILL_TIMEOUT_SECONDS: float = 5
+    # Token budget of the replayed history for turns without a live or resumed
+    # session; older turns are folded into a summary of at most the summary budget
+    CLAUDE_HISTORY_TOKEN_BUDGET: int = 8000
+    CLAUDE_HISTORY_SUMMARY_TOKENS: int = 1500
+    # Where turns are persisted; writes are buffered and flushed in batches. "database"
+    # needs the ConversationTurn table (startup fails without it); "memory" is per process
+    # and keeps the loaded turns of at most the given number of conversations
+    CLAUDE_HISTORY_STORE: Literal["database", "memory"] = "database"
+    CLAUDE_HISTORY_MEMORY_MAX_CONVERSATIONS: int = 1000
+    CLAUDE_HISTORY_FLUSH_INTERVAL_SECONDS: float = 1.0
+    CLAUDE_HISTORY_FLUSH_BATCH_SIZE: int = 100
+    # Turns loaded from the store when a conversation is first used in a process
+    CLAUDE_HISTORY_LOAD_TURNS: int = 200
+    # In-process history cache: least recently used conversations are evicted past
+    # either limit, and all but the hot ones are kept compressed
+    CLAUDE_HISTORY_CACHE_MAX_CONVERSATIONS: int = 1000
+    CLAUDE_HISTORY_CACHE_MAX_MB: int = 64
+    CLAUDE_HISTORY_CACHE_HOT_CONVERSATIONS: int = 32
+
+    # MCP servers run once as shared local HTTP/SSE processes on consecutive ports
+    # from the base port; turns fall back to per-turn stdio servers while one is down
+    MCP_SHARED_SERVERS: bool = True
+    MCP_SHARED_SERVERS_BASE_PORT: int = 18700
+    MCP_HEALTH_INTERVAL_SECONDS: float = 15
+    MCP_START_TIMEOUT_SECONDS: float = 90
+
     # Database settings - use DATABASE_URL for external database connection managed by Next.js/Prisma
     # Required in production, but has a placeholder for tests
     DATABASE_URL: str | None = None
@@ -10,6 +10,7 @@ and routers. Entry point for the backend service.
 Uses SQLModel metadata to create tables directly instead of Alembic migrations.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from typing import cast, Any
 
@@ -44,6 +45,14 @@ async def lifespan(_app: FastAPI):
     This context manager runs tasks before the application starts,
     and after it shuts down.
     """
+    from app.services.claude_jobs import claude_jobs
+    from app.services.claude_sessions import claude_session_manager
+    from app.services.conversation_store import conversation_store
+    from app.services.mcp_supervisor import mcp_supervisor
+    from app.services.template_store import template_store
+    from app.services.turn_cancellation import turn_canceller
+    from app.services.workspace_manager import workspace_manager
+
     # Pre-startup initialization task
     try:
         logger.info("FastAPI application starting up")
@@ -54,11 +63,37 @@ async def lifespan(_app: FastAPI):
 
         async with engine.connect() as conn:
             await conn.execute(text("SELECT 1"))
+        # Refuse to start without the history table rather than losing turns
+        await conversation_store.check()
+
+        # Load the workspace registry
+        await asyncio.to_thread(workspace_manager.open)
+        # Move workspaces left in the old flat layout into their shards
+        await asyncio.to_thread(workspace_manager.migrate_flat_layout)
+        # Fetch workspace templates once and keep them fresh in the background
+        template_store.start_background_refresh()
+        # Keep pre-provisioned workspaces ready for new conversations
+        workspace_manager.start_background_tasks()
+        # Close idle Claude CLI sessions
+        claude_session_manager.start()
+        # Flush conversation turns to the database in batches
+        conversation_store.start()
+        # Run the MCP servers once, shared by all conversations
+        mcp_supervisor.start()
+        # Run background Claude jobs
+        claude_jobs.start()
 
         yield
     finally:
         # Shutdown tasks
         logger.info("FastAPI application shutting down")
+        await claude_jobs.stop()
+        await turn_canceller.stop()
+        await claude_session_manager.stop()
+        await conversation_store.stop()
+        await mcp_supervisor.stop()
+        await workspace_manager.stop_background_tasks()
+        await template_store.stop_background_refresh()
     # Cleanup on shutdown is handled in the finally block above
 
 
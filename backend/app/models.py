@@ -1,6 +1,7 @@
+from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Column, Integer, PrimaryKeyConstraint, Text
+from sqlalchemy import Column, DateTime, Index, Integer, PrimaryKeyConstraint, Text
 from sqlmodel import Field, SQLModel
 
 class Page(SQLModel, table=True):
@@ -11,3 +12,20 @@ class Page(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, sa_column=Column('id', Integer, primary_key=True))
     name: str = Field(sa_column=Column('name', Text))
+
+
+class ConversationTurn(SQLModel, table=True):
+    __tablename__ = 'ConversationTurn'
+    __table_args__ = (
+        PrimaryKeyConstraint('id', name='ConversationTurn_pkey'),
+        Index('ConversationTurn_conversationId_id_idx', 'conversationId', 'id'),
+    )
+
+    id: Optional[int] = Field(default=None, sa_column=Column('id', Integer, primary_key=True))
+    conversation_id: str = Field(sa_column=Column('conversationId', Text, nullable=False))
+    user_message: str = Field(sa_column=Column('userMessage', Text, nullable=False))
+    assistant_response: str = Field(sa_column=Column('assistantResponse', Text, nullable=False))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column('createdAt', DateTime(timezone=True), nullable=False),
+    )
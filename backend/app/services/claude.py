@@ -5,15 +5,24 @@ proper error handling and configuration management.
 """
 
 import asyncio
+import dataclasses
+import hashlib
 import os
 import time
 import uuid
-from typing import AsyncGenerator, Dict, Any, Optional, List, Literal, cast
+from typing import AsyncGenerator, Dict, Any, Optional, List, Literal, Tuple, cast
 from claude_code_sdk import query, ClaudeCodeOptions
 from claude_code_sdk.types import (
     AssistantMessage, TextBlock, ToolUseBlock, ToolResultBlock, 
     ThinkingBlock, Message, ResultMessage, SystemMessage, UserMessage
 )
+from app.services.claude_events import (
+    ClaudeEvent, Content, ContentDelta, MCPToolUse, MessageInfo, ToolUse, TurnDone, TurnError
+)
+from app.services.claude_sessions import claude_session_manager
+from app.services.conversation_history import ConversationHistory
+from app.services.conversation_store import conversation_store
+from app.services.mcp_supervisor import mcp_supervisor
 from app.services.workspace_manager import workspace_manager
 from claude_code_sdk import (
     ClaudeSDKError,
@@ -23,26 +32,27 @@ from claude_code_sdk import (
     CLIJSONDecodeError,
 )
 from pydantic import BaseModel
-import json
 from pathlib import Path
 
 from app.core.config import settings
 from app.core.system_prompts.prompts import system_prompt
 from loguru import logger
 
+# Partial assistant messages (token deltas) need an SDK that has them
+try:
+    from claude_code_sdk.types import StreamEvent  # type: ignore[attr-defined]
+except ImportError:
+    StreamEvent = None
+SUPPORTS_PARTIAL_MESSAGES = StreamEvent is not None and "include_partial_messages" in {
+    f.name for f in dataclasses.fields(ClaudeCodeOptions)
+}
 
-def create_claude_md_file(workspace_path: Path) -> None:
-    """
-    Create CLAUDE.md file in workspace with full comprehensive system prompt.
-    Claude Code SDK automatically reads CLAUDE.md files at startup.
-    """
-    claude_md_path = workspace_path / "CLAUDE.md"
-    
-    # Write the full comprehensive system prompt to CLAUDE.md
-    with open(claude_md_path, 'w', encoding='utf-8') as f:
-        f.write(f"""# Claude MCP Development Assistant
 
-{system_prompt}
+CLAUDE_MD_HEADER = """# Claude MCP Development Assistant
+
+"""
+
+CLAUDE_MD_WORKSPACE_SECTION = """
 
 ---
 
@@ -50,12 +60,95 @@ def create_claude_md_file(workspace_path: Path) -> None:
 
 This is an isolated sandbox workspace for MCP development. Each conversation gets its own dedicated workspace to ensure complete isolation.
 
-**Current Workspace:** `{workspace_path.name}`
+**Current Workspace:** `{workspace_name}`
 
 You have unrestricted access to all tools within this workspace. Build, test, and deploy MCP servers following the comprehensive guidelines above.
-""")
+"""
+
+
+class ClaudeMdWriter:
+    """Keeps CLAUDE.md in each workspace up to date without rewriting it every turn.
     
-    logger.info(f"Created CLAUDE.md with full system prompt in {workspace_path}")
+    The system prompt is about 155 KB, so the shared part of CLAUDE.md is
+    rendered once per prompt version. A workspace file is rewritten only when
+    its content differs: files this process wrote and nobody touched since are
+    recognized by a stat, anything else is compared by content hash.
+    """
+    
+    MAX_TRACKED_FILES = 4096
+    
+    def __init__(self, prompt: str):
+        self.prompt_body = CLAUDE_MD_HEADER + prompt
+        self.prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        # path -> (content digest, mtime_ns, size) of files this process wrote or verified
+        self._known: Dict[str, Tuple[str, int, int]] = {}
+        self.stats: Dict[str, int] = {"written": 0, "unchanged": 0, "verified": 0}
+    
+    def render(self, workspace_path: Path) -> str:
+        """Render CLAUDE.md for a workspace."""
+        return self.prompt_body + CLAUDE_MD_WORKSPACE_SECTION.format(workspace_name=workspace_path.name)
+    
+    def ensure(self, workspace_path: Path) -> bool:
+        """Make sure the workspace's CLAUDE.md matches the current prompt.
+        
+        Args:
+            workspace_path: The workspace directory
+            
+        Returns:
+            True if the file was (re)written
+        """
+        claude_md_path = workspace_path / "CLAUDE.md"
+        content = self.render(workspace_path).encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()
+        key = str(claude_md_path)
+        
+        try:
+            st = claude_md_path.stat()
+        except FileNotFoundError:
+            st = None
+        if st is not None:
+            if self._known.get(key) == (digest, st.st_mtime_ns, st.st_size):
+                self.stats["unchanged"] += 1
+                return False
+            if st.st_size == len(content) and hashlib.sha256(claude_md_path.read_bytes()).hexdigest() == digest:
+                self._remember(key, digest, st)
+                self.stats["verified"] += 1
+                return False
+        
+        # Replace atomically so a concurrent reader never sees a partial file
+        tmp_path = claude_md_path.with_name(f".CLAUDE.md.{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, claude_md_path)
+        self._remember(key, digest, claude_md_path.stat())
+        self.stats["written"] += 1
+        logger.info(f"Wrote CLAUDE.md (prompt {self.prompt_version}) in {workspace_path}")
+        return True
+    
+    def _remember(self, key: str, digest: str, st: os.stat_result) -> None:
+        if len(self._known) >= self.MAX_TRACKED_FILES:
+            self._known.clear()
+        self._known[key] = (digest, st.st_mtime_ns, st.st_size)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get write counters and the current prompt version."""
+        return {**self.stats, "prompt_version": self.prompt_version}
+
+
+claude_md_writer = ClaudeMdWriter(system_prompt)
+
+
+def create_claude_md_file(workspace_path: Path) -> None:
+    """
+    Create CLAUDE.md file in workspace with full comprehensive system prompt.
+    Claude Code SDK automatically reads CLAUDE.md files at startup.
+    The file is only written when missing or out of date.
+    """
+    claude_md_writer.ensure(workspace_path)
+
+
+def new_conversation_id() -> str:
+    """Generate an ID for a request that did not name a conversation."""
+    return f"chat_{int(time.time())}_{str(uuid.uuid4())[:8]}"
 
 
 # Simple system prompt for SDK (CLAUDE.md provides the comprehensive instructions)
@@ -89,6 +182,9 @@ class ClaudeRequest(BaseModel):
     mcp_servers: Optional[Dict[str, MCPServerConfig]] = None
     mcp_config_file: Optional[str] = None  # Path to .mcp.json file
     permission_prompt_tool_name: Optional[str] = None  # Custom permission prompt tool
+    
+    # Streaming: also send content_delta events as text is generated
+    stream_deltas: bool = False
 
 
 class ClaudeResponse(BaseModel):
@@ -97,6 +193,7 @@ class ClaudeResponse(BaseModel):
     conversation_id: str
     workspace_path: Optional[str] = None
     workspace_stats: Optional[Dict[str, Any]] = None
+    turn_metrics: Optional[Dict[str, Any]] = None
 
 
 class ClaudeService:
@@ -110,10 +207,37 @@ class ClaudeService:
             import os
             os.environ["ANTHROPIC_API_KEY"] = settings.ANTHOPIC_API_KEY
         
-        # Store active conversation sessions
-        # Each conversation_id maps to its conversation state
-        self.conversation_history: Dict[str, List[str]] = {}
-        self.session_locks: Dict[str, asyncio.Lock] = {}
+        # Conversation history, compacted to a token budget, cached within
+        # memory limits and written behind to the durable conversation store
+        self.history = ConversationHistory(
+            token_budget=settings.CLAUDE_HISTORY_TOKEN_BUDGET,
+            summary_token_budget=settings.CLAUDE_HISTORY_SUMMARY_TOKENS,
+            store=conversation_store,
+            load_turns=settings.CLAUDE_HISTORY_LOAD_TURNS,
+            max_conversations=settings.CLAUDE_HISTORY_CACHE_MAX_CONVERSATIONS,
+            max_bytes=settings.CLAUDE_HISTORY_CACHE_MAX_MB * 1024 * 1024,
+            hot_conversations=settings.CLAUDE_HISTORY_CACHE_HOT_CONVERSATIONS,
+        )
+        
+        # How turns carried their context: a live CLI session, a resumed
+        # Claude Code session, or the replayed text history
+        self.context_stats: Dict[str, Any] = {
+            "turns_by_mode": {"live": 0, "resumed": 0, "text_context": 0},
+            "resume_failures": 0,
+            "estimated_tokens_saved": 0,
+            "input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "output_tokens": 0,
+        }
+        
+        # Time from the start of a streamed turn to its first visible text
+        self.stream_stats: Dict[str, Any] = {
+            "partial_messages_supported": SUPPORTS_PARTIAL_MESSAGES,
+            "turns_with_text": 0,
+            "delta_turns": 0,
+            "total_time_to_first_token_ms": 0.0,
+        }
         
         logger.info("Claude Code service initialized")
 
@@ -132,62 +256,51 @@ class ClaudeService:
         """
         try:
             # Always ensure unique conversation ID for complete sandbox isolation
-            conversation_id = request.conversation_id or f"chat_{int(time.time())}_{str(uuid.uuid4())[:8]}"
+            conversation_id = request.conversation_id or new_conversation_id()
             
-            # Build conversation context for memory continuity
-            full_prompt = await self.build_conversation_context(conversation_id, request.prompt)
+            # Keep the workspace from being archived or evicted from here until the turn ends
+            with workspace_manager.using_workspace(conversation_id):
+                # Ensure conversation workspace exists first
+                workspace_path = await workspace_manager.ensure_workspace_async(conversation_id)
+                logger.info(f"Conversation {conversation_id} workspace: {workspace_path}")
             
-            # Ensure conversation workspace exists first
-            workspace_path = workspace_manager.ensure_workspace_exists(conversation_id)
-            logger.info(f"Conversation {conversation_id} workspace: {workspace_path}")
+                # Create CLAUDE.md with full comprehensive system prompt
+                create_claude_md_file(Path(workspace_path))
             
-            # Create CLAUDE.md with full comprehensive system prompt
-            create_claude_md_file(Path(workspace_path))
+                # Snapshot the workspace so this turn can be rolled back
+                await self.checkpoint_workspace(conversation_id, request.prompt)
             
-            # Configure MCP servers - WORKING FIRECRAWL ONLY (deploy disabled)
-            mcp_servers = {
-                "firecrawl": {
-                    "command": "npx",
-                    "args": ["-y", "firecrawl-mcp"],
-                    "env": {"FIRECRAWL_API_KEY": os.getenv("FIRECRAWL_API_KEY", "fc-da7b4b292ba54078a3a4f8e93e9e9c9f")}                },
-                "deploy": {
-                    "command": "fastmcp",
-                    "args": ["run", "mcps/deploy.py"],
-                    "env": {
-                        "GROQ_API_KEY": os.getenv("GROQ_API_KEY"),
-                        "GITHUB_TOKEN": os.getenv("GITHUB_TOKEN"),
-                        "CHROME_WS_URL": os.getenv("CHROME_WS_URL")
-                    }
-                }
-            }
+                # Configure MCP servers - shared supervised servers by URL, stdio while one is down
+                mcp_servers = mcp_supervisor.server_configs(["firecrawl", "deploy"])
             
-            # Prepare Claude Code options with MCP servers - ALWAYS PERMISSIVE
-            # Cast to Any to bypass strict typing for now
-            options = ClaudeCodeOptions(
-                mcp_servers=cast(Any, mcp_servers),
-                # Fix type error: allowed_tools cannot be None, use empty list for all tools
-                allowed_tools=request.allowed_tools or [],
-                system_prompt=SIMPLE_SYSTEM_PROMPT,  # Simple prompt - CLAUDE.md contains full comprehensive instructions
-                max_turns=request.max_turns or 300,
-                permission_mode="bypassPermissions",  # 🚨 DANGEROUS: Skip ALL permission prompts
-                cwd=Path(workspace_path)
-            )
+                # Prepare Claude Code options with MCP servers - ALWAYS PERMISSIVE
+                # Cast to Any to bypass strict typing for now
+                options = ClaudeCodeOptions(
+                    mcp_servers=cast(Any, mcp_servers),
+                    # Fix type error: allowed_tools cannot be None, use empty list for all tools
+                    allowed_tools=request.allowed_tools or [],
+                    system_prompt=SIMPLE_SYSTEM_PROMPT,  # Simple prompt - CLAUDE.md contains full comprehensive instructions
+                    max_turns=request.max_turns or 300,
+                    permission_mode="bypassPermissions",  # 🚨 DANGEROUS: Skip ALL permission prompts
+                    cwd=Path(workspace_path)
+                )
             
-            logger.info(f"Claude Code SDK call with MCP servers: {conversation_id} - {request.prompt[:50]}...")
-            logger.info(f"MCP servers configured: mcp-server-firecrawl, deploy")
+                logger.info(f"Claude Code SDK call with MCP servers: {conversation_id} - {request.prompt[:50]}...")
+                logger.info(f"MCP servers configured: mcp-server-firecrawl, deploy")
             
-            # Call Claude Code SDK with MCP servers and conversation context
-            content_parts = []
+                # Call Claude Code SDK with MCP servers and conversation context
+                content_parts = []
+                turn_metrics: Dict[str, Any] = {}
             
-            async for message in query(prompt=full_prompt, options=options):
-                logger.info(f"Received {type(message).__name__}")
-                
-                if isinstance(message, AssistantMessage):
-                    for block in message.content:
-                        if isinstance(block, TextBlock):
-                            content_parts.append(block.text)
-                        elif isinstance(block, ToolUseBlock):
-                            logger.info(f"Using MCP tool: {block.name}")
+                async for message in self._run_turn(conversation_id, request.prompt, options, turn_metrics):
+                    logger.info(f"Received {type(message).__name__}")
+                    
+                    if isinstance(message, AssistantMessage):
+                        for block in message.content:
+                            if isinstance(block, TextBlock):
+                                content_parts.append(block.text)
+                            elif isinstance(block, ToolUseBlock):
+                                logger.info(f"Using MCP tool: {block.name}")
             
             # Combine all content parts
             final_content = '\n\n'.join(content_parts) if content_parts else "No content generated"
@@ -195,8 +308,10 @@ class ClaudeService:
             # Store this conversation turn for future context
             await self.store_conversation_turn(conversation_id, request.prompt, final_content)
             
-            # Get workspace stats for response
-            workspace_stats = workspace_manager.get_workspace_stats(conversation_id)
+            # Get workspace stats for response, refreshing the ledger off the event loop
+            workspace_stats = await asyncio.to_thread(
+                workspace_manager.refresh_workspace_stats, conversation_id
+            )
             
             logger.info(f"Claude Code SDK call completed with MCP support: {conversation_id}")
             
@@ -204,7 +319,8 @@ class ClaudeService:
                 response=final_content,
                 conversation_id=conversation_id,
                 workspace_path=workspace_stats.get("path") if workspace_stats else None,
-                workspace_stats=workspace_stats
+                workspace_stats=workspace_stats,
+                turn_metrics=turn_metrics
             )
             
         except CLINotFoundError:
@@ -217,68 +333,223 @@ class ClaudeService:
             logger.error(f"Claude Code SDK call failed: {str(e)}")
             raise
 
-    async def build_conversation_context(self, conversation_id: str, current_prompt: str) -> str:
-        """Build conversation context for Claude Code SDK.
+    async def _run_turn(
+        self,
+        conversation_id: str,
+        prompt: str,
+        options: ClaudeCodeOptions,
+        turn_metrics: Dict[str, Any],
+    ) -> AsyncGenerator[Message, None]:
+        """Run one turn, carrying the conversation over without replaying it as text.
+        
+        A live CLI session already holds the conversation; otherwise the last
+        Claude Code session is resumed from its ID. Only if there is neither, or
+        the resume fails before producing output, is the text history sent.
         
-        PURE Claude Code SDK approach: Since we can't maintain persistent sessions
-        across HTTP requests, we build conversation history and pass it as context
-        in each new query() call.
+        Args:
+            conversation_id: The conversation ID
+            prompt: The user's prompt for this turn
+            options: Claude Code options for the turn
+            turn_metrics: Filled with the context mode, token usage and savings
         """
-        if conversation_id not in self.conversation_history:
-            self.conversation_history[conversation_id] = []
-            
-        history = self.conversation_history[conversation_id]
+        resume_id = workspace_manager.get_claude_session_id(conversation_id)
+        
+        while True:
+            turn_metrics.pop("mode", None)
+            # Set once the turn produced output, after which it cannot be retried
+            started = False
+            try:
+                async for message in self._attempt_turn(
+                    conversation_id, prompt, options, resume_id, turn_metrics
+                ):
+                    if (
+                        not started
+                        and turn_metrics.get("mode") == "resumed"
+                        and isinstance(message, ResultMessage)
+                        and message.is_error
+                    ):
+                        raise RuntimeError(f"resume ended with {message.subtype}")
+                    if isinstance(message, (AssistantMessage, UserMessage)) or (
+                        StreamEvent is not None and isinstance(message, StreamEvent)
+                    ):
+                        started = True
+                    if isinstance(message, ResultMessage):
+                        self._record_result(conversation_id, message, turn_metrics)
+                    yield message
+                break
+            except Exception as e:
+                if started or turn_metrics.get("mode") != "resumed":
+                    raise
+                logger.warning(
+                    f"Could not resume Claude session {resume_id} for {conversation_id}, "
+                    f"falling back to text context: {e}"
+                )
+                self.context_stats["resume_failures"] += 1
+                if settings.CLAUDE_PERSISTENT_SESSIONS:
+                    await claude_session_manager.close_session(conversation_id, "error")
+                workspace_manager.set_claude_session_id(conversation_id, None)
+                resume_id = None
+        
+        mode = turn_metrics["mode"]
+        self.context_stats["turns_by_mode"][mode] += 1
+        if mode != "text_context":
+            # What replaying the history would have added, from the cached history
+            # only (the context is never built or loaded just to measure it)
+            sizes = self.history.context_size(conversation_id)
+            saved = sizes["context_tokens"] if sizes else 0
+            turn_metrics["estimated_tokens_saved"] = saved
+            self.context_stats["estimated_tokens_saved"] += saved
+    
+    async def _attempt_turn(
+        self,
+        conversation_id: str,
+        prompt: str,
+        options: ClaudeCodeOptions,
+        resume_id: Optional[str],
+        turn_metrics: Dict[str, Any],
+    ) -> AsyncGenerator[Message, None]:
+        """Send one turn over a long-lived session or a one-shot query.
+        
+        The text history is only built when the turn falls back to it.
+        """
+        if not settings.CLAUDE_PERSISTENT_SESSIONS:
+            turn_metrics["mode"] = "resumed" if resume_id else "text_context"
+            if resume_id:
+                options = dataclasses.replace(options, resume=resume_id)
+                turn_prompt = prompt
+            else:
+                turn_prompt = await self.build_conversation_context(conversation_id, prompt)
+            async for message in query(prompt=turn_prompt, options=options):
+                yield message
+            return
         
-        if not history:
-            # First message in conversation
-            full_prompt = current_prompt
+        session, created = await claude_session_manager.acquire(
+            conversation_id, options, resume=resume_id
+        )
+        if not created:
+            turn_metrics["mode"] = "live"
         else:
-            # Build conversation context from history
-            context_parts = ["Previous conversation context:"]
-            context_parts.extend(history)
-            context_parts.append(f"\nCurrent user message: {current_prompt}")
-            full_prompt = "\n".join(context_parts)
+            turn_metrics["mode"] = "resumed" if resume_id else "text_context"
+        try:
+            if turn_metrics["mode"] == "text_context":
+                turn_prompt = await self.build_conversation_context(conversation_id, prompt)
+            else:
+                turn_prompt = prompt
+            async for message in session.send(turn_prompt):
+                yield message
+        finally:
+            await claude_session_manager.release(session)
+    
+    def _record_result(self, conversation_id: str, message: ResultMessage, turn_metrics: Dict[str, Any]) -> None:
+        """Keep the session ID for the next turn and account the turn's token usage."""
+        if message.session_id:
+            workspace_manager.set_claude_session_id(conversation_id, message.session_id)
+        usage = message.usage or {}
+        for key in ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens"):
+            value = usage.get(key)
+            if isinstance(value, int):
+                turn_metrics[key] = turn_metrics.get(key, 0) + value
+                self.context_stats[key] += value
+
+    def get_context_stats(self) -> Dict[str, Any]:
+        """Get how turns carried their conversation context and the tokens that saved.
+        
+        Returns:
+            Dict with turns per context mode, resume failures and token totals
+        """
+        return {
+            **self.context_stats,
+            "turns_by_mode": dict(self.context_stats["turns_by_mode"]),
+        }
+
+    def get_stream_stats(self) -> Dict[str, Any]:
+        """Get time-to-first-token statistics of streamed turns.
         
-        logger.info(f"Conversation {conversation_id}: Built context with {len(history)} previous messages")
+        Returns:
+            Dict with turn counts and the average time to first visible text
+        """
+        turns = self.stream_stats["turns_with_text"]
+        return {
+            **self.stream_stats,
+            "avg_time_to_first_token_ms": (
+                round(self.stream_stats["total_time_to_first_token_ms"] / turns, 1) if turns else None
+            ),
+        }
+    
+    def _record_first_token(self, turn_started: float, turn_metrics: Dict[str, Any]) -> None:
+        """Note the time to the turn's first visible text, once per turn."""
+        if "time_to_first_token_ms" in turn_metrics:
+            return
+        elapsed_ms = round((time.perf_counter() - turn_started) * 1000, 1)
+        turn_metrics["time_to_first_token_ms"] = elapsed_ms
+        self.stream_stats["turns_with_text"] += 1
+        self.stream_stats["total_time_to_first_token_ms"] += elapsed_ms
+    
+    async def checkpoint_workspace(self, conversation_id: str, prompt: str) -> None:
+        """Take a pre-turn workspace checkpoint off the event loop; failures never block the turn."""
+        try:
+            await asyncio.to_thread(workspace_manager.create_checkpoint, conversation_id, prompt[:80])
+        except Exception as e:
+            logger.error(f"Failed to checkpoint workspace for {conversation_id}: {e}")
+
+    async def build_conversation_context(self, conversation_id: str, current_prompt: str) -> str:
+        """Build conversation context for Claude Code SDK.
+        
+        Used when the turn cannot continue a live or resumed session: the
+        summary of older turns and the most recent turns, within the history
+        token budget, are passed as context ahead of the new prompt.
+        """
+        await self.history.ensure_loaded(conversation_id)
+        full_prompt = self.history.build_context(conversation_id, current_prompt)
+        
+        sizes = self.history.context_size(conversation_id)
+        if sizes:
+            logger.info(
+                f"Conversation {conversation_id}: Built context with {sizes['context_turns']} recent turns, "
+                f"~{sizes['context_tokens']} tokens"
+            )
         return full_prompt
     
     async def store_conversation_turn(self, conversation_id: str, user_message: str, assistant_response: str):
         """Store conversation turn for future context building."""
-        if conversation_id not in self.conversation_history:
-            self.conversation_history[conversation_id] = []
-            
-        self.conversation_history[conversation_id].extend([
-            f"User: {user_message}",
-            f"Assistant: {assistant_response}"
-        ])
-        
-        # Keep only last 10 turns to avoid overwhelming context
-        if len(self.conversation_history[conversation_id]) > 20:  # 10 turns = 20 messages
-            self.conversation_history[conversation_id] = self.conversation_history[conversation_id][-20:]
+        await self.history.ensure_loaded(conversation_id)
+        self.history.add_turn(conversation_id, user_message, assistant_response)
     
-    async def execute_with_context(self, conversation_id: str, request: ClaudeRequest) -> AsyncGenerator[str, None]:
+    async def get_context_size(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get the history and context size of a conversation, None if it has no history."""
+        await self.history.ensure_loaded(conversation_id)
+        return self.history.context_size(conversation_id)
+    
+    async def execute_with_context(
+        self, conversation_id: str, request: ClaudeRequest
+    ) -> AsyncGenerator[ClaudeEvent, None]:
         """Execute Claude Code SDK query with conversation context and MCP servers.
         
         Uses ClaudeSDKClient with MCP servers for enhanced streaming responses.
+        Yields typed events; they are serialized once, by the turn's event log.
+        
+        With ``request.stream_deltas``, text is also sent as ``content_delta``
+        events while it is generated, if the SDK supports partial messages;
+        otherwise each text block is sent as a single delta. The whole-block
+        ``content`` events are always sent, for older clients.
         """
-        # Build conversation context
-        full_prompt = await self.build_conversation_context(conversation_id, request.prompt)
+        turn_started = time.perf_counter()
+        stream_deltas = request.stream_deltas
+        partial_messages = stream_deltas and SUPPORTS_PARTIAL_MESSAGES
         
         # Ensure conversation workspace exists first
-        workspace_path = workspace_manager.ensure_workspace_exists(conversation_id)
+        workspace_path = await workspace_manager.ensure_workspace_async(conversation_id)
         logger.info(f"Conversation {conversation_id} workspace: {workspace_path}")
         
         # Create CLAUDE.md with full comprehensive system prompt
         create_claude_md_file(Path(workspace_path))
         
+        # Snapshot the workspace so this turn can be rolled back
+        await self.checkpoint_workspace(conversation_id, request.prompt)
+        
         # Configure MCP servers - WORKING FIRECRAWL ONLY (deploy disabled)
-        mcp_servers = {
-            "firecrawl": {
-                "command": "npx",
-                "args": ["-y", "firecrawl-mcp"],
-                "env": {"FIRECRAWL_API_KEY": os.getenv("FIRECRAWL_API_KEY", "fc-da7b4b292ba54078a3a4f8e93e9e9c9f")}
-            }
-        }
+        # Shared supervised server by URL, stdio while it is down
+        mcp_servers = mcp_supervisor.server_configs(["firecrawl"])
         
         # Configure Claude Code options with MCP servers - ALWAYS PERMISSIVE
         # Cast to Any to bypass strict typing for now
@@ -289,37 +560,53 @@ class ClaudeService:
             system_prompt=SIMPLE_SYSTEM_PROMPT,  # Simple prompt - CLAUDE.md contains full comprehensive instructions
             max_turns=request.max_turns or 300,
             permission_mode="bypassPermissions",  # 🚨 DANGEROUS: Skip ALL permission prompts
-            cwd=Path(workspace_path)
+            cwd=Path(workspace_path),
+            **({"include_partial_messages": True} if partial_messages else {}),
         )
         
         logger.info(f"Executing Claude Code SDK query with MCP servers: {conversation_id}")
         
         assistant_response_parts: List[str] = []
+        turn_metrics: Dict[str, Any] = {}
+        # Whether the text of the next assistant message was already streamed as deltas
+        deltas_streamed = False
+        if partial_messages:
+            self.stream_stats["delta_turns"] += 1
         
         try:
             # Execute Claude Code SDK query with MCP servers
-            async for message in query(prompt=full_prompt, options=options):
+            async for message in self._run_turn(conversation_id, request.prompt, options, turn_metrics):
+                if StreamEvent is not None and isinstance(message, StreamEvent):
+                    # A reused session may send these even when this turn did not ask for deltas
+                    if not stream_deltas:
+                        continue
+                    event = message.event
+                    delta = event.get("delta") or {}
+                    if event.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+                        deltas_streamed = True
+                        self._record_first_token(turn_started, turn_metrics)
+                        yield ContentDelta(delta.get("text", ""), event.get("index", 0))
+                    continue
+                
                 message_type = type(message).__name__
                 logger.info(f"Conversation {conversation_id}: Received {message_type}")
                 
                 # Yield message info
-                yield json.dumps({
-                    "type": "message_info",
-                    "message_type": message_type
-                })
+                yield MessageInfo(message_type)
                 
                 if isinstance(message, AssistantMessage):
                     for block_idx, block in enumerate(message.content):
                         if isinstance(block, TextBlock):
                             text_content = block.text
                             assistant_response_parts.append(text_content)
+                            self._record_first_token(turn_started, turn_metrics)
+                            
+                            if stream_deltas and not deltas_streamed:
+                                # No partial messages for this block: send it as one delta
+                                yield ContentDelta(text_content, block_idx)
                             
                             # Yield content event (matches chat client expectation)
-                            yield json.dumps({
-                                "type": "content",
-                                "content": text_content,
-                                "block_index": block_idx
-                            })
+                            yield Content(text_content, block_idx)
                         
                         elif isinstance(block, ToolUseBlock):
                             # Distinguish between MCP tools and regular tools
@@ -330,55 +617,51 @@ class ClaudeService:
                                 server_name = parts[1] if len(parts) > 1 else "unknown"
                                 tool_function = parts[2] if len(parts) > 2 else "unknown"
                                 
-                                yield json.dumps({
-                                    "type": "mcp_tool_use",
-                                    "tool_name": block.name,
-                                    "server_name": server_name,
-                                    "tool_function": tool_function,
-                                    "block_index": block_idx
-                                })
+                                yield MCPToolUse(block.name, server_name, tool_function, block_idx)
                             else:
                                 logger.info(f"Using regular tool: {block.name}")
-                                yield json.dumps({
-                                    "type": "tool_use",
-                                    "tool_name": block.name,
-                                    "block_index": block_idx
-                                })
+                                yield ToolUse(block.name, block_idx)
+                    deltas_streamed = False
             
             # Store this conversation turn for future context
             full_assistant_response = " ".join(assistant_response_parts)
             await self.store_conversation_turn(conversation_id, request.prompt, full_assistant_response)
             
+            # Pick up the turn's file changes in the workspace statistics
+            workspace_manager.schedule_stats_refresh(conversation_id)
+            
             # Send completion event
-            yield json.dumps({
-                "type": "done",
-                "response": full_assistant_response,
-                "conversation_id": conversation_id,
-                "tools_used": len([p for p in assistant_response_parts if "tool" in p.lower()])
-            })
+            yield TurnDone(
+                response=full_assistant_response,
+                conversation_id=conversation_id,
+                tools_used=len([p for p in assistant_response_parts if "tool" in p.lower()]),
+                metrics=turn_metrics,
+            )
             
         except CLINotFoundError:
             logger.error("Claude Code CLI not found")
-            yield json.dumps({"error": "Claude Code CLI not installed", "type": "cli_error"})
+            yield TurnError("Claude Code CLI not installed", "cli_error")
         except ProcessError as e:
             logger.error(f"Claude Code process failed: {e}")
-            yield json.dumps({"error": str(e), "type": "process_error"})
+            yield TurnError(str(e), "process_error")
         except Exception as e:
             logger.error(f"Claude Code SDK call failed: {str(e)}")
-            yield json.dumps({"error": str(e), "type": "api_error"})
+            yield TurnError(str(e), "api_error")
     
-    async def generate_stream(self, request: ClaudeRequest) -> AsyncGenerator[str, None]:
+    async def generate_stream(self, request: ClaudeRequest) -> AsyncGenerator[ClaudeEvent, None]:
         """Generate streaming response using PURE Claude Code SDK with conversation context.
         
         KEY FIX: Maintains conversation memory by building context from previous messages
         and passing it to each new Claude Code SDK query() call.
         """
         # Always ensure unique conversation ID for complete sandbox isolation
-        conversation_id = request.conversation_id or f"chat_{int(time.time())}_{str(uuid.uuid4())[:8]}"
+        conversation_id = request.conversation_id or new_conversation_id()
         
         # Use conversation context approach for memory continuity
-        async for chunk in self.execute_with_context(conversation_id, request):
-            yield chunk
+        # (the workspace is pinned so eviction never removes it mid-turn)
+        with workspace_manager.using_workspace(conversation_id):
+            async for chunk in self.execute_with_context(conversation_id, request):
+                yield chunk
 
 
     def _message_to_dict(self, message: Message) -> Dict[str, Any]:
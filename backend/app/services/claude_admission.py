@@ -0,0 +1,234 @@
+"""
+Claude Turn Admission Control
+
+Caps the number of Claude turns running at once. Every turn runs a Claude CLI
+with its Node children, so an unbounded burst of requests starts more
+processes than the host can run and every turn slows down.
+
+Turns take a slot before they start. When all slots are busy, turns wait in a
+first-come, first-served queue; when the queue is full, or a turn has waited
+longer than the queue timeout, it is rejected with a ``Retry-After`` estimate
+so the HTTP layer can answer 429 before any response has started. Turns of
+the same conversation are serialized on top of that, so a follow-up never
+races its predecessor in the same workspace and CLI session.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.core.config import settings
+
+# Assumed turn duration until one has been measured
+DEFAULT_TURN_SECONDS = 30.0
+MAX_RETRY_AFTER_SECONDS = 300
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn cannot be admitted; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Claude is at capacity ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ConversationLock:
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class AdmissionTicket:
+    """A granted slot; release it when the turn is over."""
+
+    def __init__(self, controller: "AdmissionController", conversation_id: Optional[str]):
+        self.controller = controller
+        self.conversation_id = conversation_id
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        """Give the slot back. Safe to call more than once."""
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """FIFO slot allocator with per-conversation serialization."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout_seconds: float):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent: Turns allowed to run at once
+            max_queue: Turns allowed to wait for a slot; more are rejected immediately
+            queue_timeout_seconds: Longest wait before a queued turn is rejected
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._active = 0
+        self._queued = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._conversation_locks: Dict[str, _ConversationLock] = {}
+        self._turn_seconds = DEFAULT_TURN_SECONDS
+        self.stats: Dict[str, Any] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": {"queue_full": 0, "queue_timeout": 0},
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def retry_after(self) -> int:
+        """Estimate when a slot is likely to free up, in whole seconds."""
+        rounds = (self._queued + 1) / self.max_concurrent
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(self._turn_seconds * rounds)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.stats["rejected"][reason] += 1
+        return AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, conversation_id: Optional[str] = None) -> AdmissionTicket:
+        """
+        Wait for a slot, after any running turn of the same conversation.
+
+        Args:
+            conversation_id: The conversation ID; None for a new conversation
+
+        Returns:
+            ticket: The granted slot
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait timed out
+        """
+        if self._active + self._queued >= self.max_concurrent + self.max_queue:
+            raise self._reject("queue_full")
+
+        started = time.monotonic()
+        deadline = started + self.queue_timeout_seconds
+        self._queued += 1
+        conversation_lock = self._lock_conversation(conversation_id)
+        try:
+            if conversation_lock is not None:
+                try:
+                    await asyncio.wait_for(conversation_lock.lock.acquire(), deadline - time.monotonic())
+                except asyncio.TimeoutError as e:
+                    raise self._reject("queue_timeout") from e
+            try:
+                await self._acquire_slot(deadline)
+            except BaseException:
+                if conversation_lock is not None:
+                    conversation_lock.lock.release()
+                raise
+        except BaseException:
+            self._unlock_conversation(conversation_id)
+            raise
+        finally:
+            self._queued -= 1
+
+        waited = time.monotonic() - started
+        self.stats["admitted"] += 1
+        self.stats["total_wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        return AdmissionTicket(self, conversation_id)
+
+    async def _acquire_slot(self, deadline: float) -> None:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            return
+
+        self.stats["queued"] += 1
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("queue_timeout") from e
+            raise
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the longest waiting turn
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def _lock_conversation(self, conversation_id: Optional[str]) -> Optional[_ConversationLock]:
+        if conversation_id is None:
+            return None
+        conversation_lock = self._conversation_locks.get(conversation_id)
+        if conversation_lock is None:
+            conversation_lock = self._conversation_locks[conversation_id] = _ConversationLock()
+        conversation_lock.users += 1
+        return conversation_lock
+
+    def _unlock_conversation(self, conversation_id: Optional[str]) -> None:
+        if conversation_id is None:
+            return
+        conversation_lock = self._conversation_locks[conversation_id]
+        conversation_lock.users -= 1
+        if not conversation_lock.users:
+            del self._conversation_locks[conversation_id]
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        # Moving average of turn durations, for Retry-After estimates
+        held = time.monotonic() - ticket.admitted_at
+        self._turn_seconds = 0.8 * self._turn_seconds + 0.2 * held
+        self._release_slot()
+        if ticket.conversation_id is not None:
+            self._conversation_locks[ticket.conversation_id].lock.release()
+            self._unlock_conversation(ticket.conversation_id)
+
+    @asynccontextmanager
+    async def admit(self, conversation_id: Optional[str] = None) -> AsyncIterator[AdmissionTicket]:
+        """Hold a slot for the duration of the block."""
+        ticket = await self.acquire(conversation_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get admission statistics.
+
+        Returns:
+            stats: Running and queued turns, rejections and wait times
+        """
+        admitted = self.stats["admitted"]
+        return {
+            **self.stats,
+            "rejected": dict(self.stats["rejected"]),
+            "active": self._active,
+            "queue_depth": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "avg_wait_seconds": round(self.stats["total_wait_seconds"] / admitted, 4) if admitted else 0.0,
+            "avg_turn_seconds": round(self._turn_seconds, 2),
+        }
+
+
+# Global admission controller instance
+claude_admission = AdmissionController(
+    max_concurrent=settings.CLAUDE_MAX_CONCURRENT_TURNS,
+    max_queue=settings.CLAUDE_MAX_QUEUED_TURNS,
+    queue_timeout_seconds=settings.CLAUDE_QUEUE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,142 @@
+"""
+Claude Stream Events
+
+Typed events of a streamed Claude turn, and their wire encoding.
+
+The Claude service yields these events as objects; nothing is serialized
+until an event is added to its turn's event log, where ``encode_event``
+turns it into the JSON bytes every client receives. Encoding is driven by a
+table from event type to wire payload, and uses orjson when it is installed
+(the standard library otherwise), so each event is serialized exactly once
+however many clients follow the turn.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+@dataclass(frozen=True, slots=True)
+class MessageInfo:
+    """An SDK message arrived (sent to clients as ``progress``)."""
+
+    message_type: str
+
+
+@dataclass(frozen=True, slots=True)
+class Content:
+    """A whole text block of an assistant message."""
+
+    content: str
+    block_index: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ContentDelta:
+    """Text of a block, as it is generated."""
+
+    delta: str
+    block_index: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ToolUse:
+    """A built-in tool call."""
+
+    tool_name: str
+    block_index: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class MCPToolUse:
+    """A call to an MCP server's tool (``mcp__<server>__<function>``)."""
+
+    tool_name: str
+    server_name: str
+    tool_function: str
+    block_index: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class TurnDone:
+    """The turn finished (sent to clients as ``complete``)."""
+
+    response: str
+    conversation_id: str
+    tools_used: int = 0
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class TurnError:
+    """The turn failed; ``error_type`` is cli_error, process_error, api_error or stream_error."""
+
+    error: str
+    error_type: str
+
+
+@dataclass(frozen=True, slots=True)
+class StreamEnd:
+    """Last event of a turn that was not cancelled (sent to clients as ``done``)."""
+
+
+@dataclass(frozen=True, slots=True)
+class TurnCancelled:
+    """The turn was cancelled."""
+
+    reason: str
+
+
+ClaudeEvent = Union[
+    MessageInfo, Content, ContentDelta, ToolUse, MCPToolUse, TurnDone, TurnError, StreamEnd, TurnCancelled
+]
+
+# Wire payload of each event type
+_PAYLOADS: Dict[type, Callable[[Any], Dict[str, Any]]] = {
+    MessageInfo: lambda e: {"type": "progress", "message_type": e.message_type, "timestamp": 0},
+    Content: lambda e: {"type": "content", "content": e.content, "block_index": e.block_index},
+    ContentDelta: lambda e: {"type": "content_delta", "delta": e.delta, "block_index": e.block_index},
+    ToolUse: lambda e: {"type": "tool_use", "tool_name": e.tool_name, "block_index": e.block_index},
+    MCPToolUse: lambda e: {
+        "type": "mcp_tool_use",
+        "tool_name": e.tool_name,
+        "server_name": e.server_name,
+        "tool_function": e.tool_function,
+        "block_index": e.block_index,
+    },
+    TurnDone: lambda e: {
+        "type": "complete",
+        "final_content": e.response,
+        "conversation_id": e.conversation_id,
+        "tools_used": e.tools_used,
+        "metrics": e.metrics,
+    },
+    TurnError: lambda e: {"type": "error", "error": e.error, "error_type": e.error_type},
+    StreamEnd: lambda _: {"type": "done"},
+    TurnCancelled: lambda e: {"type": "cancelled", "reason": e.reason},
+}
+
+
+def dumps(payload: Dict[str, Any]) -> bytes:
+    """Serialize a payload to compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def encode_event(event: ClaudeEvent) -> bytes:
+    """
+    Encode an event as the JSON clients receive.
+
+    Args:
+        event: The event
+
+    Returns:
+        data: UTF-8 JSON bytes
+    """
+    return dumps(_PAYLOADS[type(event)](event))
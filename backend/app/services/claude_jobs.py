@@ -0,0 +1,249 @@
+"""
+Claude Jobs
+
+Runs Claude turns as background jobs, decoupled from any HTTP connection.
+
+Submitting a job returns its ID at once; the turn waits in a bounded queue
+for one of a fixed number of workers, which also take an admission slot so
+jobs and interactive streams share the same cap on running CLI processes.
+A job's events go to its own turn event log, so clients can subscribe to it
+(and resume with ``Last-Event-ID``) at any time, or poll for the result.
+Finished jobs are kept for a retention period.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Literal, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.claude import ClaudeRequest, new_conversation_id
+from app.services.claude_admission import AdmissionRejected, claude_admission
+from app.services.claude_events import TurnDone
+from app.services.turn_events import run_turn_into_log, turn_event_logs
+
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be queued."""
+
+
+class ClaudeJob:
+    """A submitted turn and its outcome."""
+
+    def __init__(self, request: ClaudeRequest):
+        self.job_id = uuid.uuid4().hex
+        self.request = request
+        self.conversation_id: str = request.conversation_id or new_conversation_id()
+        request.conversation_id = self.conversation_id
+        self.log = turn_event_logs.create(self.conversation_id)
+        self.status: JobStatus = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.metrics: Dict[str, Any] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "conversation_id": self.conversation_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_seconds": (
+                round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None
+            ),
+            "result": self.result,
+            "error": self.error,
+            "metrics": self.metrics,
+            "events": self.log.get_stats()["events"],
+        }
+
+
+class ClaudeJobManager:
+    """Bounded queue and worker pool for Claude jobs."""
+
+    def __init__(self, workers: int, max_queued: int, retention_seconds: float):
+        """
+        Initialize the job manager.
+
+        Args:
+            workers: Jobs run at once
+            max_queued: Jobs allowed to wait; more are rejected
+            retention_seconds: How long finished jobs can still be looked up
+        """
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, ClaudeJob] = {}
+        self._finished: Deque[ClaudeJob] = deque()
+        # Created by start() so it belongs to the running event loop
+        self._queue: "Optional[asyncio.Queue[ClaudeJob]]" = None
+        self._tasks: list = []
+        self._running = 0
+        self.stats: Dict[str, Any] = {
+            "submitted": 0,
+            "rejected": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "total_queue_seconds": 0.0,
+            "max_queue_seconds": 0.0,
+            "total_run_seconds": 0.0,
+        }
+
+    def submit(self, request: ClaudeRequest) -> ClaudeJob:
+        """
+        Queue a turn as a job.
+
+        Args:
+            request: The Claude request
+
+        Returns:
+            job: The queued job
+
+        Raises:
+            JobQueueFull: If the queue is full
+        """
+        self._prune()
+        if self._queue is None:
+            raise RuntimeError("Job workers are not running")
+        if self._queue.qsize() >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already queued")
+        job = ClaudeJob(request)
+        self._jobs[job.job_id] = job
+        self._queue.put_nowait(job)
+        self.stats["submitted"] += 1
+        logger.info(f"Queued Claude job {job.job_id} for {job.conversation_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ClaudeJob]:
+        """Get a queued, running or recently finished job."""
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: ClaudeJob) -> None:
+        # Share the cap on running CLI processes with interactive turns
+        while True:
+            try:
+                ticket = await claude_admission.acquire(job.conversation_id)
+                break
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after)
+
+        job.status = "running"
+        job.started_at = time.time()
+        queue_seconds = job.started_at - job.created_at
+        self.stats["total_queue_seconds"] += queue_seconds
+        self.stats["max_queue_seconds"] = max(self.stats["max_queue_seconds"], queue_seconds)
+        turn_event_logs.register(job.log)
+        # Its own task, so cancelling the turn does not stop the worker
+        turn = job.log.task = asyncio.create_task(run_turn_into_log(job.request, job.log))
+        try:
+            await asyncio.wait({turn})
+        finally:
+            if not turn.done():
+                turn.cancel()
+            ticket.release()
+            job.finished_at = time.time()
+            self.stats["total_run_seconds"] += job.finished_at - job.started_at
+
+        if turn.cancelled():
+            job.status = "cancelled"
+            job.error = f"Cancelled ({job.log.cancel_reason or 'cancelled'})"
+            return
+        outcome = turn.result()
+        if isinstance(outcome, TurnDone):
+            job.status = "succeeded"
+            job.result = outcome.response
+            job.metrics = outcome.metrics
+        else:
+            job.status = "failed"
+            job.error = outcome.error if outcome is not None else "Turn ended without a result"
+
+    def _finish(self, job: ClaudeJob) -> None:
+        self.stats[job.status] += 1
+        self._finished.append(job)
+
+    async def _worker(self, queue: "asyncio.Queue[ClaudeJob]") -> None:
+        while True:
+            job = await queue.get()
+            if job.status != "queued":
+                continue
+            self._running += 1
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                job.log.close()
+                raise
+            except Exception as e:
+                logger.error(f"Claude job {job.job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+                job.log.close()
+            finally:
+                self._running -= 1
+                job.finished_at = job.finished_at or time.time()
+                self._finish(job)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        while self._finished and (self._finished[0].finished_at or 0) < cutoff:
+            self._jobs.pop(self._finished.popleft().job_id, None)
+
+    def start(self) -> None:
+        """Start the worker pool."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker(self._queue)))
+
+    async def stop(self) -> None:
+        """Stop the workers; running and queued jobs are cancelled."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        queue, self._queue = self._queue, None
+        while queue is not None and not queue.empty():
+            job = queue.get_nowait()
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            job.log.close()
+            self._finish(job)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get job statistics.
+
+        Returns:
+            stats: Queue depth, running jobs, outcomes and queue/run times
+        """
+        started = self.stats["succeeded"] + self.stats["failed"] + self.stats["cancelled"]
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "avg_queue_seconds": round(self.stats["total_queue_seconds"] / started, 3) if started else 0.0,
+            "avg_run_seconds": round(self.stats["total_run_seconds"] / started, 3) if started else 0.0,
+        }
+
+
+# Global job manager instance
+claude_jobs = ClaudeJobManager(
+    workers=settings.CLAUDE_JOB_WORKERS,
+    max_queued=settings.CLAUDE_JOB_MAX_QUEUED,
+    retention_seconds=settings.CLAUDE_JOB_RETENTION_SECONDS,
+)
@@ -0,0 +1,481 @@
+"""
+Claude Session Manager
+
+Keeps one interactive Claude Code CLI process per active conversation, so
+follow-up turns are sent over the running process instead of spawning a new
+CLI (and reloading CLAUDE.md and restarting MCP servers) for every request.
+
+Each session is owned by a dedicated asyncio task: the SDK client enters an
+anyio task group on connect that must be exited from the same task, and the
+owner task also serializes turns of one conversation. Requests hand prompts to
+the owner and read the turn's messages back from a queue.
+
+Sessions are closed when idle for longer than the TTL, when the CLI process
+tree grows past the memory limit, when a request needs different options, or
+to make room once the session limit is reached.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from claude_code_sdk import ClaudeCodeOptions, ClaudeSDKClient, CLIConnectionError
+from claude_code_sdk.types import Message
+from loguru import logger
+
+from app.core.config import settings
+
+# Marks the end of a turn in a session's output queue
+_TURN_END = object()
+
+
+def process_tree_pids(pid: int) -> List[int]:
+    """
+    List a process and all of its descendants (Linux /proc).
+
+    Args:
+        pid: Root process ID
+
+    Returns:
+        pids: The root followed by its descendants, empty if /proc is unavailable
+    """
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, fields resume after its ")"
+        ppid = int(stat[stat.rfind(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids = [pid]
+    for current in pids:
+        pids.extend(children.get(current, []))
+    return pids
+
+
+def process_tree_rss_bytes(pid: int) -> int:
+    """
+    Get the resident memory of a process and its descendants (Linux /proc).
+
+    Args:
+        pid: Root process ID
+
+    Returns:
+        rss_bytes: Sum of VmRSS over the tree, 0 if unavailable
+    """
+    total = 0
+    for tree_pid in process_tree_pids(pid):
+        try:
+            with open(f"/proc/{tree_pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+# Options a live session does not need to be restarted for:
+# - resuming only matters when the process starts
+# - the MCP servers flip between a shared URL and stdio with the supervisor's
+#   health checks; both serve the same tools, so a session keeps the transport
+#   it started with
+# - partial messages only add stream events, which turns without deltas skip,
+#   and turns that want deltas fall back to whole blocks without them
+_SESSION_AGNOSTIC_OPTIONS = (
+    "resume",
+    "continue_conversation",
+    "mcp_servers",
+    "include_partial_messages",
+)
+
+
+def options_fingerprint(options: ClaudeCodeOptions) -> str:
+    """Stable digest of the options that require a new CLI process when they change."""
+    fields = dataclasses.asdict(options)
+    for name in _SESSION_AGNOSTIC_OPTIONS:
+        fields.pop(name, None)
+    encoded = json.dumps(fields, default=str, sort_keys=True)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class ClaudeSession:
+    """One long-lived CLI process for a conversation, driven by an owner task."""
+
+    def __init__(
+        self,
+        conversation_id: str,
+        options: ClaudeCodeOptions,
+        client_factory: Callable[[ClaudeCodeOptions], Any] = ClaudeSDKClient,
+    ):
+        """
+        Initialize the session (call start() to spawn the process).
+
+        Args:
+            conversation_id: The conversation ID
+            options: Options the CLI process is started with
+            client_factory: Builds the SDK client from the options
+        """
+        self.conversation_id = conversation_id
+        self.options = options
+        self.fingerprint = options_fingerprint(options)
+        self._client_factory = client_factory
+        self._commands: "asyncio.Queue[Optional[Tuple[str, asyncio.Queue[Any]]]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task[None]] = None
+        self.pid: Optional[int] = None
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.spawn_seconds: Optional[float] = None
+        self.turns = 0
+        # Held by the manager from acquire() to release()
+        self.leases = 0
+        self.closed = False
+
+    @property
+    def busy(self) -> bool:
+        """Whether a request currently holds the session."""
+        return self.leases > 0
+
+    async def start(self) -> None:
+        """Spawn the CLI process; raises if it cannot be started."""
+        ready: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        await ready
+
+    async def _run(self, ready: "asyncio.Future[None]") -> None:
+        client = self._client_factory(self.options)
+        started = time.perf_counter()
+        try:
+            await client.connect()
+        except BaseException as e:
+            self.closed = True
+            ready.set_exception(e)
+            return
+        self.spawn_seconds = time.perf_counter() - started
+        transport = getattr(client, "_transport", None)
+        process = getattr(transport, "_process", None)
+        self.pid = getattr(process, "pid", None)
+        ready.set_result(None)
+
+        try:
+            while True:
+                command = await self._commands.get()
+                if command is None:
+                    break
+                prompt, output = command
+                try:
+                    await client.query(prompt)
+                    async for message in client.receive_response():
+                        output.put_nowait(message)
+                except Exception as e:
+                    # The process is in an unknown state, do not reuse it
+                    self.closed = True
+                    output.put_nowait(e)
+                    break
+                finally:
+                    output.put_nowait(_TURN_END)
+        finally:
+            self.closed = True
+            # Fail turns queued behind a broken or closing session
+            while not self._commands.empty():
+                pending = self._commands.get_nowait()
+                if pending is not None:
+                    pending[1].put_nowait(CLIConnectionError("Claude session closed"))
+                    pending[1].put_nowait(_TURN_END)
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.warning(f"Error closing Claude session {self.conversation_id}: {e}")
+
+    async def send(self, prompt: str) -> AsyncIterator[Message]:
+        """
+        Run one turn over the session.
+
+        Turns of the same session run one after another. If the caller stops
+        reading early, the owner still drains the turn so the next one starts
+        clean.
+
+        Args:
+            prompt: User prompt for this turn
+
+        Yields:
+            message: SDK messages up to and including the ResultMessage
+        """
+        if self.closed:
+            raise CLIConnectionError("Claude session closed")
+        output: "asyncio.Queue[Any]" = asyncio.Queue()
+        self._commands.put_nowait((prompt, output))
+        try:
+            while True:
+                item = await output.get()
+                if item is _TURN_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.turns += 1
+            self.last_used = time.monotonic()
+
+    def rss_bytes(self) -> int:
+        """Resident memory of the CLI process and its children (MCP servers)."""
+        return process_tree_rss_bytes(self.pid) if self.pid else 0
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop the owner task, which disconnects the client."""
+        if self._task is None or self._task.done():
+            self.closed = True
+            return
+        self._commands.put_nowait(None)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            # Stuck mid-turn; cancelling still runs the disconnect in the owner task
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class ClaudeSessionManager:
+    """Pool of long-lived Claude sessions keyed by conversation."""
+
+    def __init__(
+        self,
+        idle_ttl_seconds: float,
+        max_sessions: int,
+        max_rss_bytes: int,
+        client_factory: Callable[[ClaudeCodeOptions], Any] = ClaudeSDKClient,
+    ):
+        """
+        Initialize the session manager.
+
+        Args:
+            idle_ttl_seconds: Idle time after which a session is closed
+            max_sessions: Sessions kept open at once (idle ones closed first)
+            max_rss_bytes: Memory limit per session process tree (0 disables)
+            client_factory: Builds the SDK client for a new session
+        """
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_rss_bytes = max_rss_bytes
+        self._client_factory = client_factory
+        self._sessions: Dict[str, ClaudeSession] = {}
+        # Serializes lookups, room making and insertion; spawns reserve a slot
+        self._lock = asyncio.Lock()
+        self._starting = 0
+        self._task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {
+            "sessions_created": 0,
+            "turns": 0,
+            "reused_turns": 0,
+            "spawn_failures": 0,
+            "total_spawn_seconds": 0.0,
+            "closed_by_reason": {
+                "idle": 0, "memory": 0, "options": 0, "capacity": 0, "error": 0, "cancelled": 0, "shutdown": 0,
+            },
+        }
+
+    async def acquire(
+        self,
+        conversation_id: str,
+        options: ClaudeCodeOptions,
+        resume: Optional[str] = None,
+    ) -> Tuple[ClaudeSession, bool]:
+        """
+        Get the live session of a conversation, starting one if needed.
+
+        The session is leased to the caller until release(), so neither the
+        idle reaper nor the session limit closes it in between.
+
+        Args:
+            conversation_id: The conversation ID
+            options: Options the session must have been started with
+            resume: SDK session ID a newly started process resumes
+
+        Returns:
+            (session, created): created is True if a new CLI process was spawned
+        """
+        async with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is not None:
+                if session.closed:
+                    self._drop(session, "error")
+                elif session.fingerprint != options_fingerprint(options):
+                    await self._close(session, "options")
+                else:
+                    session.leases += 1
+                    session.last_used = time.monotonic()
+                    self.stats["turns"] += 1
+                    self.stats["reused_turns"] += 1
+                    return session, False
+
+            await self._make_room()
+            self._starting += 1
+
+        if resume:
+            options = dataclasses.replace(options, resume=resume)
+        session = ClaudeSession(conversation_id, options, self._client_factory)
+        session.leases = 1
+        try:
+            await session.start()
+        except Exception:
+            async with self._lock:
+                self._starting -= 1
+            self.stats["spawn_failures"] += 1
+            raise
+        async with self._lock:
+            self._starting -= 1
+            self._sessions[conversation_id] = session
+        self.stats["sessions_created"] += 1
+        self.stats["turns"] += 1
+        self.stats["total_spawn_seconds"] += session.spawn_seconds or 0.0
+        logger.info(
+            f"Started Claude session for {conversation_id} (pid {session.pid}) "
+            f"in {session.spawn_seconds or 0.0:.2f}s"
+        )
+        return session, True
+
+    async def release(self, session: ClaudeSession) -> None:
+        """Return a session's lease and close it if it is over its memory limit."""
+        session.leases = max(0, session.leases - 1)
+        if session.closed:
+            self._drop(session, "error")
+            return
+        if self.max_rss_bytes and not session.busy:
+            rss = await asyncio.to_thread(session.rss_bytes)
+            if rss > self.max_rss_bytes:
+                logger.info(
+                    f"Closing Claude session {session.conversation_id}: "
+                    f"{rss // (1024 * 1024)} MiB over the memory limit"
+                )
+                await self._close(session, "memory")
+
+    def has_session(self, conversation_id: str) -> bool:
+        """Whether a conversation currently has a live session."""
+        session = self._sessions.get(conversation_id)
+        return session is not None and not session.closed
+
+    async def close_session(self, conversation_id: str, reason: str = "shutdown") -> None:
+        """Close the session of a conversation, if any."""
+        session = self._sessions.get(conversation_id)
+        if session is not None:
+            await self._close(session, reason)
+
+    def _drop(self, session: ClaudeSession, reason: str) -> None:
+        if self._sessions.get(session.conversation_id) is session:
+            del self._sessions[session.conversation_id]
+            self.stats["closed_by_reason"][reason] += 1
+
+    async def _close(self, session: ClaudeSession, reason: str) -> None:
+        self._drop(session, reason)
+        await session.close()
+
+    async def _make_room(self) -> None:
+        # Called with the lock held; sessions still starting count as open
+        excess = len(self._sessions) + self._starting - self.max_sessions + 1
+        if excess <= 0:
+            return
+        idle = sorted(
+            (s for s in self._sessions.values() if not s.busy),
+            key=lambda s: s.last_used,
+        )
+        for session in idle[:excess]:
+            await self._close(session, "capacity")
+
+    async def close_idle(self) -> int:
+        """
+        Close sessions idle for longer than the TTL.
+
+        Returns:
+            closed: Number of sessions closed
+        """
+        async with self._lock:
+            now = time.monotonic()
+            expired = [
+                s for s in self._sessions.values()
+                if not s.busy and now - s.last_used > self.idle_ttl_seconds
+            ]
+            for session in expired:
+                await self._close(session, "idle")
+        return len(expired)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, min(60.0, self.idle_ttl_seconds / 2)))
+            try:
+                await self.close_idle()
+            except Exception as e:
+                logger.error(f"Claude session reaper failed: {e}")
+
+    def start(self) -> None:
+        """Start the idle session reaper."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the reaper and close every session."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(
+            *(self._close(s, "shutdown") for s in list(self._sessions.values())),
+            return_exceptions=True,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get session statistics.
+
+        Returns:
+            stats: Session counts, reuse rate, spawn latency and per-session details
+        """
+        created = self.stats["sessions_created"]
+        turns = self.stats["turns"]
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "closed_by_reason": dict(self.stats["closed_by_reason"]),
+            "active_sessions": len(self._sessions),
+            "reuse_rate": round(self.stats["reused_turns"] / turns, 3) if turns else None,
+            "avg_spawn_seconds": (
+                round(self.stats["total_spawn_seconds"] / created, 3) if created else None
+            ),
+            "sessions": [
+                {
+                    "conversation_id": s.conversation_id,
+                    "pid": s.pid,
+                    "turns": s.turns,
+                    "busy": s.busy,
+                    "idle_seconds": round(now - s.last_used, 1),
+                }
+                for s in self._sessions.values()
+            ],
+        }
+
+
+# Global session manager instance
+claude_session_manager = ClaudeSessionManager(
+    idle_ttl_seconds=settings.CLAUDE_SESSION_IDLE_TTL_SECONDS,
+    max_sessions=settings.CLAUDE_SESSION_MAX_SESSIONS,
+    max_rss_bytes=settings.CLAUDE_SESSION_MAX_RSS_MB * 1024 * 1024,
+)
@@ -0,0 +1,154 @@
+"""
+Conversation Cache
+
+Bounded in-process cache of conversation histories.
+
+Entries are kept in least-recently-used order under both an entry cap and a
+byte cap, so a long-running worker's memory stays flat however many
+conversations it has served. Only the most recently used conversations are
+kept as objects; the rest are stored zlib-compressed, which shrinks prompt and
+response text several times over, and are inflated again on their next use.
+Evicted conversations are reloaded from the conversation store when needed.
+"""
+
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Optional, Protocol, TypeVar, Union
+
+
+class CacheableRecord(Protocol):
+    def size_bytes(self) -> int:
+        """Approximate memory used by the record."""
+
+    def to_bytes(self) -> bytes:
+        """Serialize the record."""
+
+
+R = TypeVar("R", bound=CacheableRecord)
+
+
+class ConversationCache(Generic[R]):
+    """LRU cache of conversation records with entry and byte caps."""
+
+    def __init__(
+        self,
+        from_bytes: Callable[[bytes], R],
+        max_entries: int,
+        max_bytes: int,
+        hot_entries: int,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            from_bytes: Inverse of the records' ``to_bytes``
+            max_entries: Maximum number of cached conversations
+            max_bytes: Maximum approximate memory of all entries
+            hot_entries: Most recently used conversations kept uncompressed
+        """
+        self.from_bytes = from_bytes
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hot_entries = max(1, hot_entries)
+        # LRU order, oldest first; hot entries are records, cold ones compressed bytes
+        self._entries: "OrderedDict[str, Union[R, bytes]]" = OrderedDict()
+        self._hot: "OrderedDict[str, None]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._resident_bytes = 0
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "compressions": 0,
+            "decompressions": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._entries
+
+    def get(self, conversation_id: str) -> Optional[R]:
+        """
+        Get a conversation record, inflating it if it was compressed.
+
+        Args:
+            conversation_id: The conversation ID
+
+        Returns:
+            record: The cached record, None on a miss
+        """
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if isinstance(entry, bytes):
+            entry = self.from_bytes(zlib.decompress(entry))
+            self.stats["decompressions"] += 1
+        self.put(conversation_id, entry)
+        return entry
+
+    def put(self, conversation_id: str, record: R) -> None:
+        """
+        Cache a record as most recently used, then enforce the caps.
+
+        Call again after growing a record to update its accounted size.
+
+        Args:
+            conversation_id: The conversation ID
+            record: The conversation record
+        """
+        self._set(conversation_id, record, record.size_bytes())
+        self._hot[conversation_id] = None
+        self._hot.move_to_end(conversation_id)
+        self._entries.move_to_end(conversation_id)
+        self._enforce()
+
+    def pop(self, conversation_id: str) -> None:
+        """Drop a conversation from the cache."""
+        self._entries.pop(conversation_id, None)
+        self._hot.pop(conversation_id, None)
+        self._resident_bytes -= self._sizes.pop(conversation_id, 0)
+
+    def _set(self, conversation_id: str, entry: Union[R, bytes], size: int) -> None:
+        self._resident_bytes += size - self._sizes.get(conversation_id, 0)
+        self._sizes[conversation_id] = size
+        self._entries[conversation_id] = entry
+
+    def _enforce(self) -> None:
+        # Compress conversations that fell out of the hot set
+        while len(self._hot) > self.hot_entries:
+            conversation_id, _ = self._hot.popitem(last=False)
+            record = self._entries[conversation_id]
+            if not isinstance(record, bytes):
+                data = zlib.compress(record.to_bytes())
+                self._set(conversation_id, data, len(data))
+                self.stats["compressions"] += 1
+
+        # Evict least recently used conversations, but never the one just used
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._resident_bytes > self.max_bytes
+        ):
+            conversation_id = next(iter(self._entries))
+            self.pop(conversation_id)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            stats: Hit rate, resident size and eviction counters
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "hot_entries": len(self._hot),
+            "resident_bytes": self._resident_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,378 @@
+"""
+Conversation History
+
+Token-budgeted memory of past turns, used to build the text context for turns
+that cannot carry the conversation in a live or resumed Claude session.
+
+Token counts are estimated at about four characters per token, which is cheap
+and close enough for budgeting. Recent turns are kept verbatim; once they
+outgrow the budget, the oldest ones are folded into a running summary by a
+background task, off the request path. Until that task has run, building the
+context simply leaves out what does not fit, so the budget always holds. A
+single oversized message is clipped in the middle rather than crowding out
+every other turn.
+
+History is kept in memory per process, in a bounded cache that compresses
+conversations that are not in use and evicts the least recently used ones.
+With a store attached, every turn is also handed to the store, and a
+conversation not in memory is loaded from it on first use, so memory survives
+restarts and evictions and is shared across workers.
+"""
+
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.services.conversation_cache import ConversationCache
+
+if TYPE_CHECKING:
+    from app.services.conversation_store import WriteBehindConversationStore
+
+# Rough characters per token for English text and code
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting (about four characters per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class HistoryTurn:
+    """One user prompt and the assistant's response."""
+
+    user: str
+    assistant: str
+    tokens: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.tokens:
+            self.tokens = estimate_tokens(self.user) + estimate_tokens(self.assistant)
+
+
+@dataclass
+class ConversationRecord:
+    """Verbatim recent turns plus a summary of everything older."""
+
+    turns: List[HistoryTurn] = field(default_factory=list)
+    summary: str = ""
+    summary_tokens: int = 0
+    summarized_turns: int = 0
+
+    @property
+    def verbatim_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    def size_bytes(self) -> int:
+        """Approximate memory used by the record (text plus per-turn overhead)."""
+        text = sum(len(turn.user) + len(turn.assistant) for turn in self.turns) + len(self.summary)
+        return text + 200 * (len(self.turns) + 1)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the record for the compressed cache tier."""
+        return json.dumps({
+            "turns": [[turn.user, turn.assistant, turn.tokens] for turn in self.turns],
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
+            "summarized_turns": self.summarized_turns,
+        }).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ConversationRecord":
+        """Inverse of ``to_bytes``."""
+        payload = json.loads(data)
+        return cls(
+            turns=[HistoryTurn(user, assistant, tokens) for user, assistant, tokens in payload["turns"]],
+            summary=payload["summary"],
+            summary_tokens=payload["summary_tokens"],
+            summarized_turns=payload["summarized_turns"],
+        )
+
+
+def _gist(text: str, max_chars: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= max_chars else text[: max_chars - 3] + "..."
+
+
+def extractive_summary(previous: str, turns: List[HistoryTurn], max_tokens: int) -> str:
+    """
+    Fold turns into a running summary without calling a model.
+
+    Keeps the gist of each prompt and response, newest last, and drops the
+    oldest lines once the summary is over its budget.
+
+    Args:
+        previous: Summary so far (may be empty)
+        turns: Turns to fold in, oldest first
+        max_tokens: Token budget of the summary
+
+    Returns:
+        summary: Updated summary text
+    """
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        lines.append(f"- User: {_gist(turn.user, 200)} | Assistant: {_gist(turn.assistant, 300)}")
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)[-max_chars:]
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    keep = max_chars // 2
+    return f"{text[:keep]}\n[... {len(text) - 2 * keep} characters omitted ...]\n{text[-keep:]}"
+
+
+class ConversationHistory:
+    """Per-conversation history compacted to a token budget."""
+
+    def __init__(
+        self,
+        token_budget: int,
+        summary_token_budget: int,
+        summarizer: Callable[[str, List[HistoryTurn], int], str] = extractive_summary,
+        store: Optional["WriteBehindConversationStore"] = None,
+        load_turns: int = 200,
+        max_conversations: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        hot_conversations: int = 32,
+    ):
+        """
+        Initialize the history.
+
+        Args:
+            token_budget: Tokens of history included in a prompt (summary + verbatim turns)
+            summary_token_budget: Share of the budget reserved for the summary
+            summarizer: Folds old turns into the summary; runs in a worker thread
+            store: Durable store turns are written behind to and loaded from
+            load_turns: Newest turns loaded from the store for a conversation
+            max_conversations: Conversations kept in memory
+            max_bytes: Approximate memory limit of the cached conversations
+            hot_conversations: Most recently used conversations kept uncompressed
+        """
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.summarizer = summarizer
+        self.store = store
+        self.load_turns = load_turns
+        self.cache: ConversationCache[ConversationRecord] = ConversationCache(
+            ConversationRecord.from_bytes, max_conversations, max_bytes, hot_conversations,
+        )
+        self._compactions: Dict[str, "asyncio.Task[None]"] = {}
+        self.stats: Dict[str, Any] = {
+            "compactions": 0,
+            "compaction_failures": 0,
+            "turns_summarized": 0,
+            "tokens_summarized": 0,
+            "last_compaction_seconds": None,
+            "conversations_loaded": 0,
+        }
+
+    @property
+    def verbatim_budget(self) -> int:
+        return max(1, self.token_budget - self.summary_token_budget)
+
+    def get_record(self, conversation_id: str) -> ConversationRecord:
+        """Get the history of a conversation, creating an empty one if needed."""
+        record = self.cache.get(conversation_id)
+        if record is None:
+            record = ConversationRecord()
+            self.cache.put(conversation_id, record)
+        return record
+
+    async def ensure_loaded(self, conversation_id: str) -> ConversationRecord:
+        """
+        Load a conversation from the store unless it is already in memory.
+
+        Args:
+            conversation_id: The conversation ID
+
+        Returns:
+            record: The conversation's history
+        """
+        record = self.cache.get(conversation_id)
+        if record is not None:
+            return record
+        if self.store is None:
+            return self.get_record(conversation_id)
+
+        turns = await self.store.load_turns(conversation_id, self.load_turns)
+        # A turn may have been added while loading; it is already among the loaded ones
+        record = ConversationRecord(turns=[HistoryTurn(user, assistant) for user, assistant in turns])
+        self.cache.put(conversation_id, record)
+        self.stats["conversations_loaded"] += 1
+        if record.verbatim_tokens > self.verbatim_budget:
+            self._schedule_compaction(conversation_id)
+        return record
+
+    def add_turn(self, conversation_id: str, user_message: str, assistant_response: str) -> None:
+        """
+        Append a turn and schedule compaction if the verbatim turns are over budget.
+
+        Args:
+            conversation_id: The conversation ID
+            user_message: The user's prompt
+            assistant_response: The assistant's response
+        """
+        record = self.get_record(conversation_id)
+        record.turns.append(HistoryTurn(user_message, assistant_response))
+        # Account for the new turn
+        self.cache.put(conversation_id, record)
+        if self.store is not None:
+            self.store.append(conversation_id, user_message, assistant_response)
+        if record.verbatim_tokens > self.verbatim_budget:
+            self._schedule_compaction(conversation_id)
+
+    def _schedule_compaction(self, conversation_id: str) -> None:
+        task = self._compactions.get(conversation_id)
+        if task is not None and not task.done():
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self.compact(conversation_id))
+        except RuntimeError:
+            # No event loop (e.g. a script): the context builder still trims to budget
+            return
+        self._compactions[conversation_id] = task
+        task.add_done_callback(lambda _: self._compactions.pop(conversation_id, None))
+
+    async def compact(self, conversation_id: str) -> int:
+        """
+        Fold the oldest turns that do not fit the verbatim budget into the summary.
+
+        Args:
+            conversation_id: The conversation ID
+
+        Returns:
+            folded: Number of turns moved into the summary
+        """
+        record = self.cache.get(conversation_id)
+        if record is None:
+            return 0
+
+        # Keep the newest turns that fit, fold everything older
+        kept_tokens = 0
+        keep = 0
+        for turn in reversed(record.turns):
+            if kept_tokens + turn.tokens > self.verbatim_budget and keep:
+                break
+            kept_tokens += turn.tokens
+            keep += 1
+        old = record.turns[: len(record.turns) - keep]
+        if not old:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            summary = await asyncio.to_thread(
+                self.summarizer, record.summary, old, self.summary_token_budget
+            )
+        except Exception as e:
+            self.stats["compaction_failures"] += 1
+            logger.error(f"Failed to compact history of {conversation_id}: {e}")
+            return 0
+
+        # The record may have been compressed or evicted and reloaded meanwhile,
+        # so apply the result to the current one if it still starts with the folded turns
+        record = self.cache.get(conversation_id)
+        folded = [(turn.user, turn.assistant) for turn in old]
+        if record is None or [(t.user, t.assistant) for t in record.turns[: len(old)]] != folded:
+            return 0
+        del record.turns[: len(old)]
+        record.summary = summary
+        record.summary_tokens = estimate_tokens(summary)
+        record.summarized_turns += len(old)
+        self.cache.put(conversation_id, record)
+
+        self.stats["compactions"] += 1
+        self.stats["turns_summarized"] += len(old)
+        self.stats["tokens_summarized"] += sum(turn.tokens for turn in old)
+        self.stats["last_compaction_seconds"] = round(time.perf_counter() - started, 4)
+        return len(old)
+
+    def _context_turns(self, record: ConversationRecord) -> List[HistoryTurn]:
+        """Newest turns that fit the budget left after the summary, oldest first."""
+        budget = self.token_budget - record.summary_tokens
+        # No single message may take more than a quarter of the budget
+        per_message = max(1, self.token_budget // 4)
+        selected: List[HistoryTurn] = []
+        for turn in reversed(record.turns):
+            clipped = HistoryTurn(_clip(turn.user, per_message), _clip(turn.assistant, per_message))
+            if clipped.tokens > budget and selected:
+                break
+            selected.append(clipped)
+            budget -= clipped.tokens
+        selected.reverse()
+        return selected
+
+    def build_context(self, conversation_id: str, current_prompt: str) -> str:
+        """
+        Build the prompt for a turn from the history and the new message.
+
+        Args:
+            conversation_id: The conversation ID
+            current_prompt: The user's new message
+
+        Returns:
+            prompt: The new message, preceded by the summary and recent turns if any
+        """
+        record = self.cache.get(conversation_id)
+        if record is None or (not record.turns and not record.summary):
+            return current_prompt
+
+        context_parts = ["Previous conversation context:"]
+        if record.summary:
+            context_parts.append(f"Summary of earlier conversation:\n{record.summary}")
+        for turn in self._context_turns(record):
+            context_parts.append(f"User: {turn.user}")
+            context_parts.append(f"Assistant: {turn.assistant}")
+        context_parts.append(f"\nCurrent user message: {current_prompt}")
+        return "\n".join(context_parts)
+
+    def context_size(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the size of a conversation's history and of the context built from it.
+
+        Args:
+            conversation_id: The conversation ID
+
+        Returns:
+            sizes: Turn counts and token estimates, None if the conversation is unknown
+        """
+        record = self.cache.get(conversation_id)
+        if record is None or (not record.turns and not record.summary):
+            return None
+        context_turns = self._context_turns(record)
+        return {
+            "conversation_id": conversation_id,
+            "verbatim_turns": len(record.turns),
+            "summarized_turns": record.summarized_turns,
+            "verbatim_tokens": record.verbatim_tokens,
+            "summary_tokens": record.summary_tokens,
+            "context_turns": len(context_turns),
+            "context_tokens": record.summary_tokens + sum(t.tokens for t in context_turns),
+            "token_budget": self.token_budget,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get compaction statistics.
+
+        Returns:
+            stats: Compaction counters plus totals over all conversations
+        """
+        return {
+            **self.stats,
+            "conversations": len(self.cache),
+            "cache": self.cache.get_stats(),
+            "pending_compactions": len(self._compactions),
+            "token_budget": self.token_budget,
+            "summary_token_budget": self.summary_token_budget,
+        }
@@ -0,0 +1,309 @@
+"""
+Conversation Store
+
+Durable storage for conversation turns, so conversation memory survives a
+restart and is shared by every worker process.
+
+Turns are written behind: storing a turn only appends it to an in-process
+buffer, and a background task flushes the buffer to the database in batches,
+so the stream never waits on a database round-trip. Reads go through the
+conversation history, which loads a conversation once and keeps it in memory;
+turns still waiting in the buffer are merged into loads, so a conversation
+read back before its flush is not missing its latest turns.
+
+The SQL store uses the app's async engine (SQLite in tests). In production the
+``ConversationTurn`` table is owned by the Prisma schema like every other table;
+startup fails if it is selected and the table is missing, rather than quietly
+losing history. The process-local memory store is bounded per conversation and
+in the number of conversations.
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_session_maker
+from app.models import ConversationTurn
+
+# (conversation_id, user_message, assistant_response)
+TurnRow = Tuple[str, str, str]
+
+
+class ConversationStore(ABC):
+    """Interface of a conversation store."""
+
+    @abstractmethod
+    async def load_turns(self, conversation_id: str, limit: int) -> List[Tuple[str, str]]:
+        """
+        Load the newest turns of a conversation.
+
+        Args:
+            conversation_id: The conversation ID
+            limit: Maximum number of turns to load
+
+        Returns:
+            turns: (user_message, assistant_response) pairs, oldest first
+        """
+
+    @abstractmethod
+    async def save_turns(self, rows: List[TurnRow]) -> None:
+        """
+        Persist a batch of turns, in order.
+
+        Args:
+            rows: Turns to persist
+        """
+
+    async def check(self) -> None:
+        """
+        Verify at startup that the store can be used.
+
+        Raises:
+            RuntimeError: If the store is not usable
+        """
+
+
+class MemoryConversationStore(ConversationStore):
+    """Process-local store, for single-worker development setups."""
+
+    def __init__(self, max_turns: int = 200, max_conversations: int = 1000) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            max_turns: Newest turns kept per conversation
+            max_conversations: Conversations kept; the least recently used go first
+        """
+        self.max_turns = max_turns
+        self.max_conversations = max_conversations
+        self._turns: "OrderedDict[str, Deque[Tuple[str, str]]]" = OrderedDict()
+
+    async def load_turns(self, conversation_id: str, limit: int) -> List[Tuple[str, str]]:
+        turns = self._turns.get(conversation_id)
+        if turns is None:
+            return []
+        self._turns.move_to_end(conversation_id)
+        return list(turns)[-limit:]
+
+    async def save_turns(self, rows: List[TurnRow]) -> None:
+        for conversation_id, user_message, assistant_response in rows:
+            turns = self._turns.get(conversation_id)
+            if turns is None:
+                turns = self._turns[conversation_id] = deque(maxlen=self.max_turns)
+            else:
+                self._turns.move_to_end(conversation_id)
+            turns.append((user_message, assistant_response))
+        while len(self._turns) > self.max_conversations:
+            self._turns.popitem(last=False)
+
+
+class SQLConversationStore(ConversationStore):
+    """Store backed by the ``ConversationTurn`` table."""
+
+    def __init__(self, session_maker: "async_sessionmaker[AsyncSession]"):
+        self.session_maker = session_maker
+
+    async def check(self) -> None:
+        try:
+            async with self.session_maker() as session:
+                await session.exec(select(ConversationTurn.id).limit(1))
+        except SQLAlchemyError as e:
+            raise RuntimeError(
+                "CLAUDE_HISTORY_STORE is \"database\" but the ConversationTurn table cannot be "
+                "read; apply the Prisma migration that adds it, or set "
+                f"CLAUDE_HISTORY_STORE=memory to run without durable history: {e}"
+            ) from e
+
+    async def load_turns(self, conversation_id: str, limit: int) -> List[Tuple[str, str]]:
+        statement = (
+            select(ConversationTurn)
+            .where(ConversationTurn.conversation_id == conversation_id)
+            .order_by(col(ConversationTurn.id).desc())
+            .limit(limit)
+        )
+        async with self.session_maker() as session:
+            result = await session.exec(statement)
+            rows = list(result.all())
+        rows.reverse()
+        return [(row.user_message, row.assistant_response) for row in rows]
+
+    async def save_turns(self, rows: List[TurnRow]) -> None:
+        async with self.session_maker() as session:
+            session.add_all([
+                ConversationTurn(
+                    conversation_id=conversation_id,
+                    user_message=user_message,
+                    assistant_response=assistant_response,
+                )
+                for conversation_id, user_message, assistant_response in rows
+            ])
+            await session.commit()
+
+
+class WriteBehindConversationStore(ConversationStore):
+    """Buffers writes to another store and flushes them in batches."""
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        flush_interval_seconds: float,
+        batch_size: int,
+        max_pending: int = 10000,
+    ):
+        """
+        Initialize the write-behind buffer.
+
+        Args:
+            store: Store the batches are written to
+            flush_interval_seconds: Longest time a turn waits in the buffer
+            batch_size: Buffered turns that trigger an early flush
+            max_pending: Buffer limit while the store is failing; the oldest turns are dropped
+        """
+        self.store = store
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: List[TurnRow] = []
+        self._flushing: List[TurnRow] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Any] = {
+            "turns_buffered": 0,
+            "turns_flushed": 0,
+            "turns_dropped": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "load_failures": 0,
+            "last_flush_seconds": None,
+        }
+
+    def append(self, conversation_id: str, user_message: str, assistant_response: str) -> None:
+        """
+        Buffer a turn for the next flush. Never blocks.
+
+        Args:
+            conversation_id: The conversation ID
+            user_message: The user's prompt
+            assistant_response: The assistant's response
+        """
+        self._pending.append((conversation_id, user_message, assistant_response))
+        self.stats["turns_buffered"] += 1
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def load_turns(self, conversation_id: str, limit: int) -> List[Tuple[str, str]]:
+        try:
+            turns = await self.store.load_turns(conversation_id, limit)
+        except Exception as e:
+            self.stats["load_failures"] += 1
+            logger.error(f"Failed to load conversation {conversation_id}: {e}")
+            turns = []
+        pending = [
+            (user, assistant)
+            for cid, user, assistant in self._flushing + self._pending
+            if cid == conversation_id
+        ]
+        return (turns + pending)[-limit:]
+
+    async def save_turns(self, rows: List[TurnRow]) -> None:
+        for row in rows:
+            self.append(*row)
+
+    async def check(self) -> None:
+        await self.store.check()
+
+    async def flush(self) -> int:
+        """
+        Write all buffered turns to the store.
+
+        Returns:
+            flushed: Number of turns written
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            # Still visible to loads until committed
+            self._flushing = batch
+            started = time.perf_counter()
+            try:
+                await self.store.save_turns(batch)
+            except Exception as e:
+                # Keep the batch ahead of newer turns and retry on the next flush
+                self._pending = batch + self._pending
+                overflow = len(self._pending) - self.max_pending
+                if overflow > 0:
+                    del self._pending[:overflow]
+                    self.stats["turns_dropped"] += overflow
+                self.stats["flush_failures"] += 1
+                logger.error(f"Failed to flush {len(batch)} conversation turns: {e}")
+                return 0
+            finally:
+                self._flushing = []
+            self.stats["flushes"] += 1
+            self.stats["turns_flushed"] += len(batch)
+            self.stats["last_flush_seconds"] = round(time.perf_counter() - started, 4)
+            return len(batch)
+
+    async def _loop(self, wakeup: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flush task."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(self._wakeup))
+
+    async def stop(self) -> None:
+        """Stop the background flush task and flush what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get write-behind statistics.
+
+        Returns:
+            stats: Buffer and flush counters
+        """
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "backend": type(self.store).__name__,
+        }
+
+
+# Global store instance
+conversation_store = WriteBehindConversationStore(
+    SQLConversationStore(async_session_maker)
+    if settings.CLAUDE_HISTORY_STORE == "database"
+    else MemoryConversationStore(
+        max_turns=settings.CLAUDE_HISTORY_LOAD_TURNS,
+        max_conversations=settings.CLAUDE_HISTORY_MEMORY_MAX_CONVERSATIONS,
+    ),
+    flush_interval_seconds=settings.CLAUDE_HISTORY_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.CLAUDE_HISTORY_FLUSH_BATCH_SIZE,
+)
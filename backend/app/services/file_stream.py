@@ -18,6 +18,7 @@ from sse_starlette import EventSourceResponse
 
 from app.core.config import settings
 from app.core.log_config import logger
+from app.services.workspace_manager import workspace_manager
 
 # Get the project root directory (parent of backend directory)
 # This ensures it works on any machine regardless of absolute path
@@ -46,6 +47,14 @@ class FileChangeHandler(FileSystemEventHandler):
         # Convert paths to string for consistent handling
         src_path = str(event.src_path)
         
+        # Keep workspace statistics current, including for ignored paths
+        workspace_manager.record_file_event(
+            event.event_type,
+            src_path,
+            event.is_directory,
+            str(event.dest_path) if getattr(event, 'dest_path', None) else None,
+        )
+        
         # Skip directory events and hidden files
         if event.is_directory or self._is_hidden_file(src_path):
             return
@@ -0,0 +1,300 @@
+"""
+MCP Server Supervisor
+
+Runs the MCP servers used by Claude turns as long-lived processes shared by
+every conversation, instead of letting each Claude CLI spawn its own stdio
+copy per turn (``npx -y firecrawl-mcp`` resolves the package and boots Node,
+``fastmcp run`` imports the whole deploy toolchain).
+
+Each server is started once on a local port with an HTTP or SSE transport and
+handed to ``ClaudeCodeOptions.mcp_servers`` by URL. A background task checks
+that every process is alive and accepting connections, and restarts it with
+backoff when it is not. While a server is down or has not started yet, turns
+get its stdio configuration, so a failing shared server never breaks a turn.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+# Longest wait between restarts of a server that keeps failing
+MAX_RESTART_BACKOFF_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class MCPServerSpec:
+    """How to run an MCP server, shared and as a per-turn stdio fallback.
+
+    ``shared_args`` and ``shared_env`` are added to the command when it runs
+    as a shared server; ``{port}`` in them is replaced by the server's port.
+    """
+
+    name: str
+    command: str
+    args: List[str]
+    env: Dict[str, Optional[str]] = field(default_factory=dict)
+    port: int = 0
+    transport: Literal["http", "sse"] = "http"
+    path: str = "/mcp"
+    shared_args: List[str] = field(default_factory=list)
+    shared_env: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}{self.path}"
+
+    def stdio_config(self) -> Dict[str, Any]:
+        return {"command": self.command, "args": list(self.args), "env": dict(self.env)}
+
+
+class _ServerState:
+    def __init__(self, spec: MCPServerSpec):
+        self.spec = spec
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.healthy = False
+        self.next_start_at = 0.0
+        self.backoff = 1.0
+        self.stats: Dict[str, Any] = {
+            "spawns": 0,
+            "start_failures": 0,
+            "restarts": 0,
+            "health_failures": 0,
+            "last_spawn_seconds": None,
+            "last_health_check_ms": None,
+            "turns_shared": 0,
+            "turns_stdio": 0,
+        }
+
+
+class MCPSupervisor:
+    """Starts, health-checks and restarts the shared MCP servers."""
+
+    def __init__(
+        self,
+        specs: List[MCPServerSpec],
+        health_interval_seconds: float,
+        start_timeout_seconds: float,
+        enabled: bool = True,
+    ):
+        """
+        Initialize the supervisor.
+
+        Args:
+            specs: Servers to supervise
+            health_interval_seconds: Time between health checks
+            start_timeout_seconds: Time a server gets to accept connections after spawning
+            enabled: If False, every turn gets the stdio configurations
+        """
+        self.health_interval_seconds = health_interval_seconds
+        self.start_timeout_seconds = start_timeout_seconds
+        self.enabled = enabled
+        self._servers: Dict[str, _ServerState] = {spec.name: _ServerState(spec) for spec in specs}
+        self._task: Optional[asyncio.Task] = None
+
+    def server_configs(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the ``mcp_servers`` option for a turn.
+
+        Args:
+            names: Servers the turn uses
+
+        Returns:
+            configs: URL configurations for healthy shared servers, stdio ones otherwise
+        """
+        configs: Dict[str, Dict[str, Any]] = {}
+        for name in names:
+            server = self._servers[name]
+            if self.enabled and server.healthy:
+                configs[name] = {"type": server.spec.transport, "url": server.spec.url}
+                server.stats["turns_shared"] += 1
+            else:
+                configs[name] = server.spec.stdio_config()
+                server.stats["turns_stdio"] += 1
+        return configs
+
+    async def _is_accepting(self, server: _ServerState) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection("127.0.0.1", server.spec.port), timeout=2,
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    async def _spawn(self, server: _ServerState) -> bool:
+        spec = server.spec
+        env = {**os.environ, **{k: v for k, v in spec.env.items() if v is not None}}
+        env.update({k: v.format(port=spec.port) for k, v in spec.shared_env.items()})
+        args = [*spec.args, *(arg.format(port=spec.port) for arg in spec.shared_args)]
+
+        started = time.perf_counter()
+        try:
+            server.process = await asyncio.create_subprocess_exec(
+                spec.command, *args,
+                env=env,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                # Own process group, so the whole tree (npx -> node) is stopped together
+                start_new_session=True,
+            )
+        except OSError as e:
+            logger.error(f"Failed to start MCP server {spec.name}: {e}")
+            return False
+        server.stats["spawns"] += 1
+
+        deadline = started + self.start_timeout_seconds
+        while time.perf_counter() < deadline:
+            if server.process.returncode is not None:
+                break
+            if await self._is_accepting(server):
+                server.stats["last_spawn_seconds"] = round(time.perf_counter() - started, 3)
+                logger.info(f"MCP server {spec.name} ready at {spec.url} in {server.stats['last_spawn_seconds']}s")
+                return True
+            await asyncio.sleep(0.25)
+
+        logger.error(f"MCP server {spec.name} did not start (exit code {server.process.returncode})")
+        await self._terminate(server)
+        return False
+
+    async def _terminate(self, server: _ServerState) -> None:
+        process, server.process = server.process, None
+        server.healthy = False
+        if process is None or process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except ProcessLookupError:
+            return
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    async def check(self, server: _ServerState) -> None:
+        """Health-check one server and (re)start it when due."""
+        if server.process is not None and server.process.returncode is None:
+            started = time.perf_counter()
+            healthy = await self._is_accepting(server)
+            server.stats["last_health_check_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            if healthy:
+                server.healthy = True
+                server.backoff = 1.0
+                return
+            server.stats["health_failures"] += 1
+
+        if server.stats["spawns"]:
+            logger.warning(f"MCP server {server.spec.name} is down, restarting")
+        await self._terminate(server)
+        if time.monotonic() < server.next_start_at:
+            return
+        if server.stats["spawns"]:
+            server.stats["restarts"] += 1
+        if await self._spawn(server):
+            server.healthy = True
+            server.backoff = 1.0
+        else:
+            server.stats["start_failures"] += 1
+            server.next_start_at = time.monotonic() + server.backoff
+            server.backoff = min(server.backoff * 2, MAX_RESTART_BACKOFF_SECONDS)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.gather(
+                *(self.check(server) for server in self._servers.values()),
+                return_exceptions=True,
+            )
+            await asyncio.sleep(self.health_interval_seconds)
+
+    def start(self) -> None:
+        """Start the shared servers and the health-check task."""
+        if not self.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the health-check task and the shared servers."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*(self._terminate(server) for server in self._servers.values()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get supervisor statistics.
+
+        Returns:
+            stats: Health, spawn counts and latencies per server
+        """
+        return {
+            "enabled": self.enabled,
+            "servers": {
+                name: {
+                    **server.stats,
+                    "healthy": server.healthy,
+                    "url": server.spec.url,
+                    "pid": server.process.pid if server.process else None,
+                }
+                for name, server in self._servers.items()
+            },
+        }
+
+
+def default_mcp_servers(base_port: int) -> List[MCPServerSpec]:
+    """The MCP servers Claude turns use, on consecutive ports from ``base_port``."""
+    return [
+        MCPServerSpec(
+            name="firecrawl",
+            command="npx",
+            args=["-y", "firecrawl-mcp"],
+            env={"FIRECRAWL_API_KEY": os.getenv("FIRECRAWL_API_KEY", "fc-da7b4b292ba54078a3a4f8e93e9e9c9f")},
+            port=base_port,
+            transport="sse",
+            path="/sse",
+            # firecrawl-mcp serves SSE on localhost:$PORT instead of stdio
+            shared_env={"SSE_LOCAL": "true", "PORT": "{port}"},
+        ),
+        MCPServerSpec(
+            name="deploy",
+            command="fastmcp",
+            args=["run", "mcps/deploy.py"],
+            env={
+                "GROQ_API_KEY": os.getenv("GROQ_API_KEY"),
+                "GITHUB_TOKEN": os.getenv("GITHUB_TOKEN"),
+                "CHROME_WS_URL": os.getenv("CHROME_WS_URL"),
+            },
+            port=base_port + 1,
+            transport="http",
+            path="/mcp/",
+            shared_args=["--transport", "http", "--host", "127.0.0.1", "--port", "{port}"],
+        ),
+    ]
+
+
+# Global supervisor instance
+mcp_supervisor = MCPSupervisor(
+    default_mcp_servers(settings.MCP_SHARED_SERVERS_BASE_PORT),
+    health_interval_seconds=settings.MCP_HEALTH_INTERVAL_SECONDS,
+    start_timeout_seconds=settings.MCP_START_TIMEOUT_SECONDS,
+    enabled=settings.MCP_SHARED_SERVERS,
+)
@@ -0,0 +1,162 @@
+"""
+SSE Transport
+
+Turns a stream of encoded events into Server-Sent Events writes.
+
+A streamed turn produces bursts of small events (text deltas, progress,
+tool calls) and then, while a tool runs, nothing for minutes. Writing each
+event as soon as it arrives means one socket write per event in a burst, and
+writing nothing while idle gets the connection closed by proxies.
+
+Coalescing is adaptive: an event that arrives after a quiet period is
+written at once, and events following it within the coalescing window are
+gathered into a single write, so latency stays below the window while bursts
+cost one write per window. After the keepalive interval without any write, a
+comment line is sent.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def sse_frame(event_id: Optional[str], data: bytes) -> bytes:
+    """Build the SSE frame of an encoded event, with its ID if it has one."""
+    if event_id:
+        return b"id: %s\ndata: %s\n\n" % (event_id.encode(), data)
+    return b"data: %s\n\n" % data
+
+
+class SSETransport:
+    """Coalesces event frames into writes and keeps idle streams alive."""
+
+    def __init__(self, coalesce_seconds: float, keepalive_seconds: float, max_write_bytes: int):
+        """
+        Initialize the transport.
+
+        Args:
+            coalesce_seconds: Window in which events are gathered into one write (0 disables)
+            keepalive_seconds: Idle time after which a keepalive comment is sent (0 disables)
+            max_write_bytes: Size at which a write is sent without waiting for the window
+        """
+        self.coalesce_seconds = coalesce_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.max_write_bytes = max_write_bytes
+        self.stats: Dict[str, int] = {"streams": 0, "events": 0, "writes": 0, "bytes": 0, "keepalives": 0}
+
+    def _account(self, stats: Optional[Dict[str, Any]], events: int, chunk: bytes, keepalive: bool = False) -> None:
+        counts = {"events": events, "writes": 1, "bytes": len(chunk), "keepalives": int(keepalive)}
+        for key, value in counts.items():
+            self.stats[key] += value
+            if stats is not None:
+                stats[f"sse_{key}"] = stats.get(f"sse_{key}", 0) + value
+
+    async def stream(
+        self,
+        events: AsyncIterator[Tuple[Optional[str], bytes]],
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Write events as SSE frames, coalesced, with keepalives while idle.
+
+        Args:
+            events: (event_id, encoded event) pairs
+            stats: Per-turn counters (``sse_events``, ``sse_writes``, ``sse_bytes``,
+                ``sse_keepalives``) to update, if any
+
+        Yields:
+            chunk: Bytes to write to the response
+        """
+        self.stats["streams"] += 1
+        buffer: List[bytes] = []
+        buffered_bytes = 0
+        flush_at = 0.0
+        # Opening the response counts as a write: events replayed right away share one
+        last_write = time.monotonic()
+        next_event: Optional["asyncio.Future[Tuple[Optional[str], bytes]]"] = None
+        try:
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(anext(events))
+                now = time.monotonic()
+                if buffer:
+                    timeout: Optional[float] = max(0.0, flush_at - now)
+                elif self.keepalive_seconds > 0:
+                    timeout = max(0.0, last_write + self.keepalive_seconds - now)
+                else:
+                    timeout = None
+                # Waiting does not cancel the pending read, it is picked up on the next round
+                done, _ = await asyncio.wait({next_event}, timeout=timeout)
+
+                if not done:
+                    if buffer:
+                        chunk = b"".join(buffer)
+                        self._account(stats, len(buffer), chunk)
+                        buffer, buffered_bytes = [], 0
+                    else:
+                        chunk = KEEPALIVE_FRAME
+                        self._account(stats, 0, chunk, keepalive=True)
+                    last_write = time.monotonic()
+                    yield chunk
+                    continue
+
+                try:
+                    event_id, data = next_event.result()
+                except StopAsyncIteration:
+                    break
+                next_event = None
+                frame = sse_frame(event_id, data)
+                now = time.monotonic()
+                if not buffer and now - last_write >= self.coalesce_seconds:
+                    # First event after a quiet period: no reason to wait
+                    self._account(stats, 1, frame)
+                    last_write = now
+                    yield frame
+                    continue
+                if not buffer:
+                    flush_at = last_write + self.coalesce_seconds
+                buffer.append(frame)
+                buffered_bytes += len(frame)
+                if buffered_bytes >= self.max_write_bytes:
+                    chunk = b"".join(buffer)
+                    self._account(stats, len(buffer), chunk)
+                    buffer, buffered_bytes = [], 0
+                    last_write = time.monotonic()
+                    yield chunk
+
+            if buffer:
+                chunk = b"".join(buffer)
+                self._account(stats, len(buffer), chunk)
+                yield chunk
+        finally:
+            if next_event is not None and not next_event.done():
+                # Let the pending read finish unwinding before the events are closed
+                next_event.cancel()
+                await asyncio.gather(next_event, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get transport statistics.
+
+        Returns:
+            stats: Streams, events, writes, bytes and keepalives, and events per write
+        """
+        writes = self.stats["writes"] - self.stats["keepalives"]
+        return {
+            **self.stats,
+            "coalesce_ms": round(self.coalesce_seconds * 1000, 1),
+            "keepalive_seconds": self.keepalive_seconds,
+            "events_per_write": round(self.stats["events"] / writes, 2) if writes else None,
+        }
+
+
+# Global SSE transport instance
+sse_transport = SSETransport(
+    coalesce_seconds=settings.CLAUDE_SSE_COALESCE_MS / 1000,
+    keepalive_seconds=settings.CLAUDE_SSE_KEEPALIVE_SECONDS,
+    max_write_bytes=settings.CLAUDE_SSE_MAX_WRITE_KB * 1024,
+)
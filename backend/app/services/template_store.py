@@ -0,0 +1,389 @@
+"""
+Workspace Template Store
+
+Keeps a local, versioned mirror of the project templates that get copied into
+new conversation workspaces. Each template is fetched once (from a bundled
+tarball or a shallow git clone) into ``<store>/<name>/<version>/`` and then
+materialized into workspaces with reflinks or hardlinks where the filesystem
+supports them, falling back to a plain copy. A background task refreshes the
+mirror without ever blocking a request.
+"""
+
+import asyncio
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+
+# Get the backend directory (where this file is located)
+BACKEND_DIR = Path(__file__).parent.parent.parent
+DEFAULT_TEMPLATE_STORE_DIR = BACKEND_DIR / ".template_store"
+BUNDLED_TEMPLATES_DIR = BACKEND_DIR / "templates"
+
+# File holding the active version of a template, swapped atomically on refresh
+CURRENT_POINTER = "CURRENT"
+# Number of old versions kept next to the current one
+KEEP_OLD_VERSIONS = 1
+
+# ioctl request for FICLONE (copy-on-write clone on btrfs, xfs, bcachefs, ...)
+FICLONE = 0x40049409
+REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}
+
+
+@dataclass(frozen=True)
+class TemplateSpec:
+    """Where a named template comes from.
+
+    A bundled tarball (looked up under ``backend/templates/``) takes precedence
+    over the git repository so deployments can ship templates without network.
+    """
+
+    name: str
+    repo: Optional[str] = None
+    ref: Optional[str] = None
+    tarball: Optional[str] = None
+
+
+class TemplateStore:
+    """Versioned local mirror of workspace templates."""
+
+    def __init__(
+        self,
+        store_dir: Optional[str] = None,
+        link_mode: str = "auto",
+        bundled_dir: Optional[Path] = None,
+    ):
+        """
+        Initialize the template store.
+
+        Args:
+            store_dir: Directory holding template versions. If None, uses
+                       ./.template_store relative to backend directory.
+            link_mode: How files are materialized: "auto", "reflink", "hardlink" or "copy".
+            bundled_dir: Directory searched for bundled template tarballs.
+        """
+        if store_dir is None:
+            self.store_dir = DEFAULT_TEMPLATE_STORE_DIR
+        elif not Path(store_dir).is_absolute():
+            self.store_dir = BACKEND_DIR / store_dir
+        else:
+            self.store_dir = Path(store_dir)
+
+        self.bundled_dir = bundled_dir or BUNDLED_TEMPLATES_DIR
+        self.link_mode = link_mode
+        self.templates: Dict[str, TemplateSpec] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._reflink_supported = link_mode in ("auto", "reflink")
+        self._refresh_task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {
+            "fetches": 0,
+            "fetch_failures": 0,
+            "last_fetch_seconds": None,
+            "materializations": 0,
+            "reflinked_files": 0,
+            "hardlinked_files": 0,
+            "copied_files": 0,
+        }
+
+    def register(self, spec: TemplateSpec) -> None:
+        """Register a named template source."""
+        self.templates[spec.name] = spec
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def current_version(self, name: str) -> Optional[str]:
+        """
+        Get the active version of a template.
+
+        Returns:
+            version: Version identifier, None if the template was never fetched
+        """
+        pointer = self.store_dir / name / CURRENT_POINTER
+        try:
+            version = pointer.read_text().strip()
+        except FileNotFoundError:
+            return None
+        if not (self.store_dir / name / version).is_dir():
+            return None
+        return version
+
+    def ensure(self, name: str) -> str:
+        """
+        Make sure a template version is available locally, fetching it if needed.
+
+        Only the very first use of a template ever waits on a fetch; afterwards
+        the mirror is reused and refreshed in the background.
+
+        Returns:
+            version: The active version of the template
+        """
+        version = self.current_version(name)
+        if version:
+            return version
+        with self._lock_for(name):
+            # Another caller may have fetched it while we waited for the lock
+            version = self.current_version(name)
+            if version:
+                return version
+            return self._fetch_locked(name)
+
+    def fetch(self, name: str) -> str:
+        """
+        Fetch the latest version of a template and make it the active one.
+
+        Returns:
+            version: The active version after the fetch
+        """
+        with self._lock_for(name):
+            return self._fetch_locked(name)
+
+    def _fetch_locked(self, name: str) -> str:
+        spec = self.templates.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown workspace template: {name}")
+
+        template_dir = self.store_dir / name
+        template_dir.mkdir(parents=True, exist_ok=True)
+        staging = template_dir / f".staging-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+
+        try:
+            current = self.current_version(name)
+            tarball = self.bundled_dir / spec.tarball if spec.tarball else None
+            if tarball is not None and tarball.is_file():
+                version = self._tarball_version(tarball)
+                if version == current:
+                    return current
+                self._extract_tarball(tarball, staging)
+            elif spec.repo:
+                remote_head = self._remote_head(spec)
+                if current and remote_head and remote_head.startswith(current):
+                    logger.info(f"Template {name} already at {current}, skipping fetch")
+                    return current
+                version = self._clone_repo(spec, staging)
+            else:
+                raise RuntimeError(f"Template {name} has neither a bundled tarball nor a repo")
+
+            self._init_git(staging)
+
+            version_dir = template_dir / version
+            if version_dir.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+            else:
+                staging.rename(version_dir)
+
+            # Swap the pointer atomically so readers never see a partial version
+            tmp_pointer = template_dir / f".{CURRENT_POINTER}.{uuid.uuid4().hex[:8]}"
+            tmp_pointer.write_text(version)
+            os.replace(tmp_pointer, template_dir / CURRENT_POINTER)
+
+            self._prune_versions(name, version)
+        except Exception:
+            self.stats["fetch_failures"] += 1
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        elapsed = time.perf_counter() - started
+        self.stats["fetches"] += 1
+        self.stats["last_fetch_seconds"] = round(elapsed, 3)
+        logger.info(f"Template {name} version {version} ready in {elapsed:.2f}s")
+        return version
+
+    def _tarball_version(self, tarball: Path) -> str:
+        digest = hashlib.sha256()
+        with open(tarball, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return f"tar-{digest.hexdigest()[:12]}"
+
+    def _extract_tarball(self, tarball: Path, staging: Path) -> None:
+        staging.mkdir(parents=True)
+        with tarfile.open(tarball) as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(staging, filter="data")
+            else:
+                tar.extractall(staging)  # noqa: S202 - bundled, trusted archive
+
+        # Hoist a single top-level directory (the usual "repo-main/" layout)
+        entries = list(staging.iterdir())
+        if len(entries) == 1 and entries[0].is_dir():
+            inner = entries[0]
+            hoisted = staging.with_name(staging.name + "-inner")
+            inner.rename(hoisted)
+            staging.rmdir()
+            hoisted.rename(staging)
+
+        logger.info(f"Extracted bundled template {tarball.name}")
+
+    def _remote_head(self, spec: TemplateSpec) -> Optional[str]:
+        if not spec.repo:
+            raise RuntimeError(f"Template {spec.name} has no repo")
+        result = subprocess.run(
+            ["git", "ls-remote", spec.repo, spec.ref or "HEAD"],
+            capture_output=True, text=True, timeout=30,
+        )
+        if result.returncode != 0 or not result.stdout:
+            return None
+        return result.stdout.split()[0]
+
+    def _clone_repo(self, spec: TemplateSpec, staging: Path) -> str:
+        if not spec.repo:
+            raise RuntimeError(f"Template {spec.name} has no repo")
+        logger.info(f"Cloning template {spec.name} from {spec.repo}")
+        command = ["git", "clone", "--depth", "1"]
+        if spec.ref:
+            command += ["--branch", spec.ref]
+        result = subprocess.run(
+            [*command, spec.repo, str(staging)], capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to clone template {spec.name}: {result.stderr}")
+
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=staging,
+        )
+        version = result.stdout.strip()[:12] or uuid.uuid4().hex[:12]
+
+        # Drop the upstream history, workspaces start with a fresh repository
+        shutil.rmtree(staging / ".git", ignore_errors=True)
+        return version
+
+    def _init_git(self, path: Path) -> None:
+        # Initializing the repository once here means every workspace copy
+        # already contains an empty repo on branch main, with no git subprocess.
+        shutil.rmtree(path / ".git", ignore_errors=True)
+        result = subprocess.run(
+            ["git", "init", "--initial-branch=main"], capture_output=True, text=True, cwd=path,
+        )
+        if result.returncode != 0:
+            # Older git without --initial-branch
+            subprocess.run(["git", "init"], capture_output=True, text=True, cwd=path)
+            subprocess.run(
+                ["git", "symbolic-ref", "HEAD", "refs/heads/main"],
+                capture_output=True, text=True, cwd=path,
+            )
+
+    def _prune_versions(self, name: str, current: str) -> None:
+        template_dir = self.store_dir / name
+        versions: List[Path] = sorted(
+            (p for p in template_dir.iterdir()
+             if p.is_dir() and not p.name.startswith(".") and p.name != current),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+        for old in versions[KEEP_OLD_VERSIONS:]:
+            shutil.rmtree(old, ignore_errors=True)
+            logger.info(f"Pruned template {name} version {old.name}")
+
+    def _link_file(self, src: str, dst: str) -> str:
+        """Copy one file, sharing storage with the store where possible."""
+        if self.link_mode == "hardlink":
+            try:
+                os.link(src, dst)
+                self.stats["hardlinked_files"] += 1
+                return dst
+            except OSError:
+                pass
+        elif self._reflink_supported:
+            try:
+                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                shutil.copystat(src, dst)
+                self.stats["reflinked_files"] += 1
+                return dst
+            except OSError as e:
+                if e.errno not in REFLINK_UNSUPPORTED:
+                    raise
+                # Remember it, so later copies skip the failing ioctl
+                self._reflink_supported = False
+                logger.info(f"Reflinks not supported in {self.store_dir}, falling back to copies")
+
+        shutil.copy2(src, dst)
+        self.stats["copied_files"] += 1
+        return dst
+
+    def materialize(self, name: str, dest: Path) -> str:
+        """
+        Copy the active version of a template into a workspace.
+
+        Args:
+            name: Registered template name
+            dest: Destination directory, must not exist yet
+
+        Returns:
+            version: The template version that was copied
+        """
+        version = self.ensure(name)
+        source = self.store_dir / name / version
+        shutil.copytree(source, dest, symlinks=True, copy_function=self._link_file)
+        self.stats["materializations"] += 1
+        return version
+
+    async def refresh_all(self) -> None:
+        """Fetch the latest version of every registered template off the event loop."""
+        for name in list(self.templates):
+            try:
+                await asyncio.to_thread(self.fetch, name)
+            except Exception as e:
+                logger.warning(f"Background refresh of template {name} failed: {e}")
+
+    async def _refresh_loop(self, interval_seconds: int) -> None:
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(interval_seconds)
+
+    def start_background_refresh(self, interval_seconds: Optional[int] = None) -> None:
+        """Start the periodic refresh task (the first run also warms the store)."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        interval = interval_seconds or settings.WORKSPACE_TEMPLATE_REFRESH_SECONDS
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop_background_refresh(self) -> None:
+        """Stop the periodic refresh task."""
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get template store statistics.
+
+        Returns:
+            stats: Counters plus the active version of each template
+        """
+        return {
+            **self.stats,
+            "link_mode": self.link_mode,
+            "reflink_supported": self._reflink_supported,
+            "versions": {name: self.current_version(name) for name in self.templates},
+        }
+
+
+# Global template store instance
+template_store = TemplateStore(
+    settings.WORKSPACE_TEMPLATE_STORE_DIR,
+    link_mode=settings.WORKSPACE_TEMPLATE_LINK_MODE,
+)
@@ -0,0 +1,235 @@
+"""
+Turn Cancellation
+
+Stops Claude turns nobody is waiting for, and the processes running them.
+
+Streamed turns run in the background so a client can reconnect, which also
+means a closed tab no longer stops anything: the CLI, its Node children and
+per-turn MCP servers would keep working until ``max_turns`` runs out. When
+the last response following a turn goes away, the turn gets a grace period
+to be resumed; after that it is cancelled. Turns can also be cancelled
+explicitly.
+
+Cancelling a turn cancels its task and kills the CLI's process tree. The CLI
+shares the server's process group, so the tree is found through /proc (the
+processes of this server working in the conversation's workspace, and their
+descendants) instead of signalling the group.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.claude_sessions import claude_session_manager, process_tree_pids
+from app.services.turn_events import TurnEventLog, turn_event_logs
+from app.services.workspace_manager import workspace_manager
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return False
+    # Zombies are gone, they only wait to be reaped
+    return stat[stat.rfind(b")") + 2:][:1] != b"Z"
+
+
+def workspace_process_pids(workspace_path: str) -> List[int]:
+    """
+    List this server's descendants working in a workspace, and their descendants.
+
+    Args:
+        workspace_path: The conversation's workspace directory
+
+    Returns:
+        pids: Processes to stop, empty if there are none or /proc is unavailable
+    """
+    root = os.path.realpath(workspace_path)
+    pids: List[int] = []
+    for pid in process_tree_pids(os.getpid())[1:]:
+        if pid in pids:
+            continue
+        try:
+            cwd = os.readlink(f"/proc/{pid}/cwd")
+        except OSError:
+            continue
+        if cwd == root or cwd.startswith(root + os.sep):
+            pids.extend(p for p in process_tree_pids(pid) if p not in pids)
+    return pids
+
+
+def terminate_processes(pids: List[int], timeout: float) -> List[int]:
+    """
+    Send SIGTERM to processes, then SIGKILL to those still alive after the timeout.
+
+    Args:
+        pids: Processes to stop
+        timeout: Seconds to wait for them to exit
+
+    Returns:
+        stopped: The processes that were signalled
+    """
+    stopped = []
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            stopped.append(pid)
+        except OSError:
+            continue
+
+    deadline = time.monotonic() + timeout
+    alive = stopped
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.05)
+        alive = [pid for pid in alive if _is_alive(pid)]
+    for pid in alive:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            continue
+    return stopped
+
+
+class TurnCanceller:
+    """Cancels abandoned or unwanted turns and kills their processes."""
+
+    def __init__(self, disconnect_grace_seconds: float, kill_timeout_seconds: float):
+        """
+        Initialize the canceller.
+
+        Args:
+            disconnect_grace_seconds: How long an abandoned turn waits for a client to resume it
+            kill_timeout_seconds: How long processes get to exit before SIGKILL
+        """
+        self.disconnect_grace_seconds = disconnect_grace_seconds
+        self.kill_timeout_seconds = kill_timeout_seconds
+        self._watchers: Dict[str, "asyncio.Task[None]"] = {}
+        self.stats: Dict[str, Any] = {
+            "disconnects": 0,
+            "resumed_within_grace": 0,
+            "cancelled_by_reason": {"disconnect": 0, "request": 0},
+            "killed_processes": 0,
+            "reclaimed_process_seconds": 0.0,
+        }
+
+    def follower_left(self, log: TurnEventLog) -> None:
+        """Start the grace period if a running turn has no followers left."""
+        if not log.cancel_on_disconnect or log.closed or log.followers > 0:
+            return
+        watcher = self._watchers.get(log.turn_id)
+        if watcher is not None and not watcher.done():
+            return
+        self.stats["disconnects"] += 1
+        self._watchers[log.turn_id] = asyncio.create_task(self._cancel_if_abandoned(log))
+
+    async def _cancel_if_abandoned(self, log: TurnEventLog) -> None:
+        try:
+            await asyncio.sleep(self.disconnect_grace_seconds)
+            if log.closed:
+                return
+            if log.followers > 0:
+                self.stats["resumed_within_grace"] += 1
+                return
+            logger.info(
+                f"No client for turn {log.turn_id} of {log.conversation_id} "
+                f"after {self.disconnect_grace_seconds}s, cancelling it"
+            )
+            await self.cancel_turn(log, "disconnect")
+        except Exception as e:
+            logger.error(f"Cancelling abandoned turn {log.turn_id} failed: {e}")
+        finally:
+            self._watchers.pop(log.turn_id, None)
+
+    async def cancel(self, conversation_id: str, reason: str = "request") -> Optional[Dict[str, Any]]:
+        """
+        Cancel the running turn of a conversation.
+
+        Args:
+            conversation_id: The conversation ID
+            reason: Why the turn is cancelled
+
+        Returns:
+            result: What was stopped, None if the conversation has no running turn
+        """
+        log = turn_event_logs.get(conversation_id)
+        if log is None or log.closed or log.task is None or log.task.done():
+            return None
+        return await self.cancel_turn(log, reason)
+
+    async def cancel_turn(self, log: TurnEventLog, reason: str) -> Dict[str, Any]:
+        """
+        Cancel a turn's task and kill its processes.
+
+        The reclaimed process-seconds are an estimate: each killed process is
+        credited with the time an average completed turn still had to run.
+
+        Args:
+            log: The turn's event log
+            reason: Why the turn is cancelled
+
+        Returns:
+            result: The turn, the processes killed and the estimated seconds reclaimed
+        """
+        log.cancel_reason = reason
+        workspace_path = await asyncio.to_thread(workspace_manager.get_workspace_path, log.conversation_id)
+        pids = await asyncio.to_thread(workspace_process_pids, workspace_path) if workspace_path else []
+
+        if log.task is not None and not log.task.done():
+            log.task.cancel()
+        killed = await asyncio.to_thread(terminate_processes, pids, self.kill_timeout_seconds)
+        if settings.CLAUDE_PERSISTENT_SESSIONS:
+            # Its process is gone, do not hand the session to the next turn
+            await claude_session_manager.close_session(log.conversation_id, "cancelled")
+
+        elapsed = time.time() - log.created_at
+        avg_turn_seconds = turn_event_logs.avg_turn_seconds()
+        reclaimed = len(killed) * max(0.0, avg_turn_seconds - elapsed) if avg_turn_seconds else 0.0
+        self.stats["cancelled_by_reason"][reason] = self.stats["cancelled_by_reason"].get(reason, 0) + 1
+        self.stats["killed_processes"] += len(killed)
+        self.stats["reclaimed_process_seconds"] += reclaimed
+        logger.info(
+            f"Cancelled turn {log.turn_id} of {log.conversation_id} ({reason}) after {elapsed:.1f}s, "
+            f"killed {len(killed)} processes"
+        )
+        return {
+            "conversation_id": log.conversation_id,
+            "turn_id": log.turn_id,
+            "reason": reason,
+            "killed_processes": len(killed),
+            "reclaimed_process_seconds": round(reclaimed, 1),
+        }
+
+    async def stop(self) -> None:
+        """Stop pending grace periods."""
+        watchers = list(self._watchers.values())
+        for watcher in watchers:
+            watcher.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+        self._watchers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cancellation statistics.
+
+        Returns:
+            stats: Disconnects, cancellations by reason, killed processes and reclaimed process-seconds
+        """
+        return {
+            **self.stats,
+            "cancelled_by_reason": dict(self.stats["cancelled_by_reason"]),
+            "reclaimed_process_seconds": round(self.stats["reclaimed_process_seconds"], 1),
+            "pending_grace_periods": len(self._watchers),
+        }
+
+
+# Global turn canceller instance
+turn_canceller = TurnCanceller(
+    disconnect_grace_seconds=settings.CLAUDE_DISCONNECT_GRACE_SECONDS,
+    kill_timeout_seconds=settings.CLAUDE_CANCEL_KILL_TIMEOUT_SECONDS,
+)
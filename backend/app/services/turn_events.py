@@ -0,0 +1,444 @@
+"""
+Turn Event Logs
+
+Bounded, in-memory logs of the events a streamed Claude turn produces, so a
+client that lost its connection can pick up where it left off instead of
+re-running the turn.
+
+A turn runs independently of the HTTP response that started it and appends
+each event to its log under a monotonic ID (``<turn id>-<sequence>``).
+Responses follow the log: they replay everything after a given ID and then
+wait for new events until the turn is over. Logs keep the most recent events
+of a turn, so replay after a long outage may skip the oldest ones, and are
+kept for a while after the turn ends.
+
+Any number of responses can follow a turn. Each may fall a bounded number of
+events behind before its backlog is coalesced (progress dropped, text deltas
+merged) and, if still too long, it is dropped with a ``lagged`` event, so a
+slow client never holds events for the others or grows without bound.
+Observers can also watch a conversation across turns without starting one.
+
+Events are stored encoded, once, as the bytes every follower receives
+(alongside the typed event, for coalescing). ``run_turn_into_log`` runs a
+turn into its log; streams and background jobs both use it.
+"""
+
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.claude import ClaudeRequest, claude_service
+from app.services.claude_events import (
+    ClaudeEvent,
+    ContentDelta,
+    MessageInfo,
+    StreamEnd,
+    TurnCancelled,
+    TurnDone,
+    TurnError,
+    dumps,
+    encode_event,
+)
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Split an event ID into its turn ID and sequence number.
+
+    Args:
+        event_id: A ``Last-Event-ID`` value
+
+    Returns:
+        parts: (turn_id, sequence), None if the ID is missing or malformed
+    """
+    if not event_id:
+        return None
+    turn_id, _, seq = event_id.strip().rpartition("-")
+    if not turn_id or not seq.isdigit():
+        return None
+    return turn_id, int(seq)
+
+
+class TurnEventLog:
+    """Events of one turn, with live followers."""
+
+    def __init__(self, conversation_id: str, max_events: int, max_backlog: int = 0):
+        """
+        Initialize the log.
+
+        Args:
+            conversation_id: The conversation ID
+            max_events: Events kept for replay
+            max_backlog: Events a follower may fall behind before its backlog is
+                coalesced, and dropped if that is not enough (0 disables)
+        """
+        self.conversation_id = conversation_id
+        self.max_backlog = max_backlog
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.created_at = time.time()
+        self.closed_at: Optional[float] = None
+        # (sequence, event, encoded event)
+        self._events: Deque[Tuple[int, ClaudeEvent, bytes]] = deque(maxlen=max_events)
+        self._last_seq = 0
+        self._changed = asyncio.Event()
+        # Task producing the events, kept here so it is not garbage collected
+        # and so the turn can be cancelled
+        self.task: Optional["asyncio.Task[Any]"] = None
+        # Responses currently following the log
+        self.followers = 0
+        # Whether the turn is cancelled once no client has followed it for a while
+        self.cancel_on_disconnect = False
+        self.cancel_reason: Optional[str] = None
+        self.stats: Dict[str, int] = {"peak_followers": 0, "coalesced_events": 0, "lagged_followers": 0}
+        # What the SSE responses following the turn wrote (see sse_transport)
+        self.stats.update({"sse_events": 0, "sse_writes": 0, "sse_bytes": 0, "sse_keepalives": 0})
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.turn_id}-{seq}"
+
+    def append(self, event: ClaudeEvent) -> str:
+        """
+        Encode an event, add it and wake the followers.
+
+        Args:
+            event: The event
+
+        Returns:
+            event_id: ID of the new event
+        """
+        self._last_seq += 1
+        self._events.append((self._last_seq, event, encode_event(event)))
+        self._wake()
+        return self.event_id(self._last_seq)
+
+    def close(self) -> None:
+        """Mark the turn as over; followers stop once they are caught up."""
+        if self.closed_at is None:
+            self.closed_at = time.time()
+            self._wake()
+
+    def _wake(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self, after_seq: int = 0) -> AsyncIterator[Tuple[Optional[str], bytes]]:
+        """
+        Replay the events after a sequence number, then follow new ones.
+
+        The replay of what was buffered when the follower joined is streamed
+        in full (the buffer is already bounded by ``max_events``). Once it has
+        caught up, a follower that falls more than ``max_backlog`` events
+        behind the turn gets its backlog coalesced; if it is still too far
+        behind, it receives a ``lagged`` event and is dropped, and can resume
+        from the last ID it got.
+
+        Args:
+            after_seq: Last sequence number the client has seen
+
+        Yields:
+            event: (event_id, encoded event); ``replay_gap`` and ``lagged``
+                events have no ID
+        """
+        last = after_seq
+        # Lag is only counted against events appended after this point
+        replay_end = self._last_seq
+        self.followers += 1
+        self.stats["peak_followers"] = max(self.stats["peak_followers"], self.followers)
+        try:
+            while True:
+                changed = self._changed
+                first = self._events[0][0] if self._events else self._last_seq + 1
+                if last + 1 < first:
+                    yield None, dumps({"type": "replay_gap", "missed": first - last - 1})
+                    last = first - 1
+                start = last + 1 - first
+                backlog = list(itertools.islice(self._events, max(0, start), None))
+                if self.max_backlog and last >= replay_end and len(backlog) > self.max_backlog:
+                    coalesced = coalesce_events(backlog)
+                    self.stats["coalesced_events"] += len(backlog) - len(coalesced)
+                    if len(coalesced) > self.max_backlog:
+                        self.stats["lagged_followers"] += 1
+                        yield None, dumps({"type": "lagged", "last_event_id": self.event_id(last)})
+                        return
+                    backlog = coalesced
+                for seq, _, data in backlog:
+                    yield self.event_id(seq), data
+                    last = seq
+                if last < self._last_seq:
+                    continue
+                if self.closed:
+                    return
+                await changed.wait()
+        finally:
+            self.followers -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "turn_id": self.turn_id,
+            "events": self._last_seq,
+            "buffered_events": len(self._events),
+            "closed": self.closed,
+            "followers": self.followers,
+            **self.stats,
+        }
+
+
+def coalesce_events(
+    events: List[Tuple[int, ClaudeEvent, bytes]],
+) -> List[Tuple[int, ClaudeEvent, bytes]]:
+    """
+    Shrink a follower's backlog without losing content.
+
+    Progress events are dropped and runs of ``content_delta`` events of the
+    same block are merged. Each kept event takes the sequence number of the
+    last event it replaces, so resuming after it skips what it covers.
+
+    Args:
+        events: (sequence, event, encoded event) in order
+
+    Returns:
+        events: The coalesced entries
+    """
+    coalesced: List[Tuple[int, ClaudeEvent, bytes]] = []
+    for seq, event, data in events:
+        if isinstance(event, MessageInfo):
+            continue
+        if isinstance(event, ContentDelta) and coalesced:
+            previous = coalesced[-1][1]
+            if isinstance(previous, ContentDelta) and previous.block_index == event.block_index:
+                merged = ContentDelta(previous.delta + event.delta, event.block_index)
+                coalesced[-1] = (seq, merged, encode_event(merged))
+                continue
+        coalesced.append((seq, event, data))
+    return coalesced
+
+
+class TurnEventLogRegistry:
+    """The latest turn event log of each conversation."""
+
+    def __init__(self, max_events: int, retention_seconds: float, max_backlog: int = 0):
+        """
+        Initialize the registry.
+
+        Args:
+            max_events: Events kept per turn
+            retention_seconds: How long a finished turn can still be resumed
+            max_backlog: Events a follower may fall behind (see ``TurnEventLog``)
+        """
+        self.max_events = max_events
+        self.retention_seconds = retention_seconds
+        self.max_backlog = max_backlog
+        self._logs: Dict[str, TurnEventLog] = {}
+        # Set (and replaced) when a turn is registered, created by the first watcher
+        self._registered: Optional[asyncio.Event] = None
+        self.stats: Dict[str, Any] = {"turns": 0, "resumes": 0, "completed_turns": 0, "total_turn_seconds": 0.0}
+        # Follower and SSE counters of logs that are no longer retained
+        self._retired = {
+            "coalesced_events": 0, "lagged_followers": 0,
+            "sse_events": 0, "sse_writes": 0, "sse_bytes": 0, "sse_keepalives": 0,
+        }
+
+    def create(self, conversation_id: str) -> TurnEventLog:
+        """Create a log for a turn of the conversation, without registering it yet."""
+        return TurnEventLog(conversation_id, self.max_events, self.max_backlog)
+
+    def start(self, conversation_id: str) -> TurnEventLog:
+        """Create the log of a new turn, replacing the conversation's previous one."""
+        log = self.create(conversation_id)
+        self.register(log)
+        return log
+
+    def register(self, log: TurnEventLog) -> None:
+        """Make an existing log its conversation's latest turn."""
+        self._prune()
+        previous = self._logs.get(log.conversation_id)
+        if previous is not None and previous is not log:
+            self._retire(previous)
+        self._logs[log.conversation_id] = log
+        self.stats["turns"] += 1
+        if self._registered is not None:
+            self._registered.set()
+            self._registered = None
+
+    def get(self, conversation_id: str) -> Optional[TurnEventLog]:
+        """Get the conversation's latest turn log, if it is running or recent."""
+        self._prune()
+        return self._logs.get(conversation_id)
+
+    def find(
+        self,
+        conversation_id: str,
+        last_event_id: Optional[str],
+        same_turn_only: bool = False,
+    ) -> Optional[Tuple[TurnEventLog, int]]:
+        """
+        Find where to resume a conversation's stream.
+
+        Args:
+            conversation_id: The conversation ID
+            last_event_id: The client's ``Last-Event-ID``, if any
+            same_turn_only: Only resume if the ID belongs to the current turn
+
+        Returns:
+            resume: (log, sequence to resume after), None if there is nothing to resume.
+                Otherwise an ID from an earlier turn resumes the current turn from its start.
+        """
+        log = self.get(conversation_id)
+        if log is None:
+            return None
+        parsed = parse_event_id(last_event_id)
+        same_turn = parsed is not None and parsed[0] == log.turn_id
+        if same_turn_only and not same_turn:
+            return None
+        after_seq = parsed[1] if parsed and same_turn else 0
+        self.stats["resumes"] += 1
+        return log, after_seq
+
+    def record_completed(self, log: TurnEventLog) -> None:
+        """Account the duration of a turn that ran to its end."""
+        self.stats["completed_turns"] += 1
+        self.stats["total_turn_seconds"] += time.time() - log.created_at
+
+    def avg_turn_seconds(self) -> Optional[float]:
+        """Average duration of the turns that ran to their end, None before the first."""
+        completed = self.stats["completed_turns"]
+        return self.stats["total_turn_seconds"] / completed if completed else None
+
+    async def watch(
+        self,
+        conversation_id: str,
+        last_event_id: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[Optional[str], bytes]]:
+        """
+        Follow a conversation's turns as they come, without starting any.
+
+        Replays the current turn (after ``last_event_id`` if it belongs to
+        it), then follows it and every later turn of the conversation until
+        the caller stops.
+
+        Args:
+            conversation_id: The conversation ID
+            last_event_id: The client's ``Last-Event-ID``, if any
+
+        Yields:
+            event: (event_id, data) as from ``TurnEventLog.follow``
+        """
+        parsed = parse_event_id(last_event_id)
+        seen: Optional[str] = None
+        while True:
+            if self._registered is None:
+                self._registered = asyncio.Event()
+            registered = self._registered
+            log = self.get(conversation_id)
+            if log is None or log.turn_id == seen:
+                await registered.wait()
+                continue
+            after_seq = parsed[1] if parsed and parsed[0] == log.turn_id else 0
+            async with aclosing(log.follow(after_seq)) as events:
+                async for event in events:
+                    yield event
+            if not log.closed:
+                # Dropped as too slow, the client resumes from its last ID
+                return
+            seen = log.turn_id
+
+    def _retire(self, log: TurnEventLog) -> None:
+        for key in self._retired:
+            self._retired[key] += log.stats[key]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for conversation_id, log in list(self._logs.items()):
+            if log.closed_at is not None and log.closed_at < cutoff:
+                del self._logs[conversation_id]
+                self._retire(log)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get event log statistics.
+
+        Returns:
+            stats: Turn and resume counters, turn durations, followers, slow-follower
+                counters, SSE frames and bytes per turn plus running and retained logs
+        """
+        self._prune()
+        avg_turn_seconds = self.avg_turn_seconds()
+        counters = {
+            key: total + sum(log.stats[key] for log in self._logs.values())
+            for key, total in self._retired.items()
+        }
+        turns = self.stats["turns"]
+        return {
+            **self.stats,
+            **counters,
+            "sse_writes_per_turn": round(counters["sse_writes"] / turns, 1) if turns else None,
+            "sse_bytes_per_turn": round(counters["sse_bytes"] / turns) if turns else None,
+            "followers": sum(log.followers for log in self._logs.values()),
+            "avg_turn_seconds": round(avg_turn_seconds, 3) if avg_turn_seconds is not None else None,
+            "running": sum(1 for log in self._logs.values() if not log.closed),
+            "retained": len(self._logs),
+        }
+
+
+async def run_turn_into_log(request: ClaudeRequest, log: TurnEventLog) -> Union[TurnDone, TurnError, None]:
+    """
+    Run a turn and append its events to a log, then close the log.
+
+    Args:
+        request: The Claude request; its conversation ID must be set
+        log: The turn's event log
+
+    Returns:
+        outcome: The ``TurnDone`` or ``TurnError`` event that ended the turn
+
+    Raises:
+        asyncio.CancelledError: If the turn was cancelled, after a ``TurnCancelled``
+            event was added
+    """
+    outcome: Optional[TurnDone] = None
+    try:
+        # Leaving early (on an error event) must still unwind the service's stream
+        # (session release, workspace pin) right away, not whenever it is collected
+        async with aclosing(claude_service.generate_stream(request)) as events:
+            async for event in events:
+                log.append(event)
+                if isinstance(event, TurnDone):
+                    outcome = event
+                elif isinstance(event, TurnError):
+                    return event
+
+        # Send completion event
+        log.append(StreamEnd())
+        turn_event_logs.record_completed(log)
+        return outcome
+
+    except asyncio.CancelledError:
+        log.append(TurnCancelled(log.cancel_reason or "cancelled"))
+        raise
+    except Exception as e:
+        # Send error event
+        logger.error(f"Claude Code SDK streaming failed: {str(e)}")
+        error = TurnError(str(e), "stream_error")
+        log.append(error)
+        return error
+    finally:
+        log.close()
+
+
+# Global event log registry
+turn_event_logs = TurnEventLogRegistry(
+    max_events=settings.CLAUDE_STREAM_LOG_MAX_EVENTS,
+    retention_seconds=settings.CLAUDE_STREAM_LOG_RETENTION_SECONDS,
+    max_backlog=settings.CLAUDE_STREAM_FOLLOWER_MAX_BACKLOG,
+)
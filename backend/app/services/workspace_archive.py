@@ -0,0 +1,168 @@
+"""
+Workspace Archive
+
+Packs idle conversation workspaces into compressed tarballs so they stop
+costing disk space and inodes, and restores them on the next access. Archives
+are streamed (never held in memory) and written atomically under
+``<workspaces>/.archive/``. zstd is used when the ``zstandard`` package is
+installed, gzip otherwise.
+"""
+
+import os
+import shutil
+import tarfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+ARCHIVE_DIR_NAME = ".archive"
+
+
+class WorkspaceArchiver:
+    """Streams workspaces to and from compressed tar archives."""
+
+    def __init__(self, archive_dir: Path, zstd_level: int = 3):
+        """
+        Initialize the archiver.
+
+        Args:
+            archive_dir: Directory holding the archives
+            zstd_level: zstd compression level (ignored for gzip)
+        """
+        self.archive_dir = archive_dir
+        self.zstd_level = zstd_level
+        self.suffix = ".tar.zst" if zstandard is not None else ".tar.gz"
+        self.stats: Dict[str, Any] = {
+            "archived": 0,
+            "restored": 0,
+            "archive_failures": 0,
+            "restore_failures": 0,
+            "last_archive_seconds": None,
+            "total_archive_seconds": 0.0,
+            "last_restore_seconds": None,
+            "total_restore_seconds": 0.0,
+            "archive_bytes_written": 0,
+        }
+
+    def archive_path_for(self, conversation_id: str) -> Path:
+        """Get the archive location of a conversation workspace."""
+        return self.archive_dir / f"{conversation_id}{self.suffix}"
+
+    def archive(self, conversation_id: str, workspace_path: Path) -> Path:
+        """
+        Pack a workspace into a compressed archive. Blocking.
+
+        The workspace directory is left in place; the caller removes it once
+        the archive has been recorded.
+
+        Args:
+            conversation_id: The conversation ID
+            workspace_path: Workspace directory to pack
+
+        Returns:
+            archive_path: Path of the written archive
+        """
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_path = self.archive_path_for(conversation_id)
+        tmp_path = archive_path.with_name(f".{archive_path.name}.{uuid.uuid4().hex[:8]}")
+        started = time.perf_counter()
+        try:
+            with open(tmp_path, "wb") as raw:
+                if zstandard is not None:
+                    compressor = zstandard.ZstdCompressor(level=self.zstd_level)
+                    with compressor.stream_writer(raw, closefd=False) as stream, \
+                            tarfile.open(fileobj=stream, mode="w|") as tar:
+                        tar.add(workspace_path, arcname=".")
+                else:
+                    with tarfile.open(fileobj=raw, mode="w|gz") as tar:
+                        tar.add(workspace_path, arcname=".")
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, archive_path)
+        except Exception:
+            self.stats["archive_failures"] += 1
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        elapsed = time.perf_counter() - started
+        self.stats["archived"] += 1
+        self.stats["last_archive_seconds"] = round(elapsed, 3)
+        self.stats["total_archive_seconds"] += elapsed
+        self.stats["archive_bytes_written"] += archive_path.stat().st_size
+        logger.info(f"Archived workspace {conversation_id} in {elapsed:.2f}s")
+        return archive_path
+
+    def restore(self, conversation_id: str, archive_path: Path, dest: Path) -> None:
+        """
+        Unpack an archive back into a workspace directory and delete the archive. Blocking.
+
+        Extraction goes to a staging directory that is renamed into place, so
+        a failed restore never leaves a half-populated workspace.
+
+        Args:
+            conversation_id: The conversation ID
+            archive_path: Archive written by archive()
+            dest: Workspace directory to restore, must not exist
+        """
+        staging = dest.with_name(f".restoring-{dest.name}-{uuid.uuid4().hex[:8]}")
+        started = time.perf_counter()
+        try:
+            staging.mkdir(parents=True)
+            with open(archive_path, "rb") as raw:
+                if archive_path.name.endswith(".tar.zst"):
+                    if zstandard is None:
+                        raise RuntimeError("zstandard is required to restore .tar.zst archives")
+                    decompressor = zstandard.ZstdDecompressor()
+                    with decompressor.stream_reader(raw) as stream, \
+                            tarfile.open(fileobj=stream, mode="r|") as tar:
+                        self._extract(tar, staging)
+                else:
+                    with tarfile.open(fileobj=raw, mode="r|gz") as tar:
+                        self._extract(tar, staging)
+            os.rename(staging, dest)
+        except Exception:
+            self.stats["restore_failures"] += 1
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        archive_path.unlink(missing_ok=True)
+        elapsed = time.perf_counter() - started
+        self.stats["restored"] += 1
+        self.stats["last_restore_seconds"] = round(elapsed, 3)
+        self.stats["total_restore_seconds"] += elapsed
+        logger.info(f"Restored workspace {conversation_id} from archive in {elapsed:.2f}s")
+
+    @staticmethod
+    def _extract(tar: tarfile.TarFile, dest: Path) -> None:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+        else:
+            tar.extractall(dest)  # noqa: S202 - archives are written by this service
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get archive statistics.
+
+        Returns:
+            stats: Archive/restore counts and timings
+        """
+        archived = self.stats["archived"]
+        restored = self.stats["restored"]
+        return {
+            **self.stats,
+            "format": self.suffix.lstrip("."),
+            "avg_archive_seconds": (
+                round(self.stats["total_archive_seconds"] / archived, 3) if archived else None
+            ),
+            "avg_restore_seconds": (
+                round(self.stats["total_restore_seconds"] / restored, 3) if restored else None
+            ),
+        }
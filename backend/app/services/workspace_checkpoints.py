@@ -0,0 +1,369 @@
+"""
+Workspace Checkpoints
+
+Incremental snapshots of a conversation workspace taken before each turn, so a
+turn that wrecks the workspace can be rolled back instead of starting over.
+
+Each checkpoint is a JSON manifest mapping relative paths to (size, mtime,
+SHA-256, mode). Files whose size and mtime match the previous manifest reuse
+its hash without being read; only changed files are hashed and copied into a
+per-conversation blob directory keyed by hash. Restoring compares the workspace
+against the target manifest the same way and only rewrites or deletes the files
+that differ, so its cost follows the size of the diff rather than the size of
+the workspace.
+
+Dependency trees (``node_modules``, ``.venv``) and caches are not captured:
+they are rebuildable, large, and already shared across workspaces.
+
+Layout::
+
+    <workspaces>/.checkpoints/<conversation_id>/
+        manifests/000001.json
+        objects/<sha[:2]>/<sha[2:]>
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+CHECKPOINT_DIR_NAME = ".checkpoints"
+
+# Rebuildable subtrees left out of checkpoints (and untouched by restores)
+EXCLUDED_DIR_NAMES = {"node_modules", ".venv", "__pycache__", ".pytest_cache"}
+
+# Manifest entry: [size, mtime_ns, sha256, mode] for files, {"symlink": target} for links
+_Entry = Any
+
+
+class CheckpointStore:
+    """Per-conversation incremental checkpoints with diff-sized restores."""
+
+    def __init__(self, checkpoint_dir: Path, keep: int = 20):
+        """
+        Initialize the store.
+
+        Args:
+            checkpoint_dir: Root directory for all conversations' checkpoints
+            keep: Checkpoints retained per conversation (oldest pruned first)
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.keep = keep
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            "created": 0,
+            "restored": 0,
+            "files_copied": 0,
+            "bytes_copied": 0,
+            "files_restored": 0,
+            "files_deleted": 0,
+            "last_checkpoint_seconds": None,
+            "last_restore_seconds": None,
+        }
+
+    def _lock(self, conversation_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(conversation_id, threading.Lock())
+
+    def _root(self, conversation_id: str) -> Path:
+        return self.checkpoint_dir / conversation_id
+
+    def _manifest_path(self, conversation_id: str, checkpoint_id: int) -> Path:
+        return self._root(conversation_id) / "manifests" / f"{checkpoint_id:06d}.json"
+
+    def _object_path(self, conversation_id: str, digest: str) -> Path:
+        return self._root(conversation_id) / "objects" / digest[:2] / digest[2:]
+
+    def _checkpoint_ids(self, conversation_id: str) -> List[int]:
+        manifests = self._root(conversation_id) / "manifests"
+        if not manifests.exists():
+            return []
+        return sorted(int(p.stem) for p in manifests.glob("*.json"))
+
+    def _load(self, conversation_id: str, checkpoint_id: int) -> Dict[str, Any]:
+        with open(self._manifest_path(conversation_id, checkpoint_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _walk(root: Path) -> Tuple[Dict[str, os.stat_result], Set[str]]:
+        """Stat every file, symlink and directory outside the excluded subtrees."""
+        files: Dict[str, os.stat_result] = {}
+        dirs: Set[str] = set()
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(root / rel_dir if rel_dir else root) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in EXCLUDED_DIR_NAMES:
+                            dirs.add(rel)
+                            stack.append(rel)
+                    else:
+                        files[rel] = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+        return files, dirs
+
+    @staticmethod
+    def _unchanged(entry: Optional[_Entry], st: os.stat_result) -> bool:
+        return (
+            isinstance(entry, list)
+            and entry[0] == st.st_size
+            and entry[1] == st.st_mtime_ns
+        )
+
+    def _store_file(self, conversation_id: str, path: Path) -> Tuple[str, int]:
+        """Hash a file while copying it into the object store; returns (digest, new bytes)."""
+        objects = self._root(conversation_id) / "objects"
+        objects.mkdir(parents=True, exist_ok=True)
+        tmp_path = objects / f".incoming-{uuid.uuid4().hex[:8]}"
+        digest = hashlib.sha256()
+        new_bytes = 0
+        try:
+            with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            object_path = self._object_path(conversation_id, digest.hexdigest())
+            if object_path.exists():
+                tmp_path.unlink()
+            else:
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, object_path)
+                new_bytes = object_path.stat().st_size
+                self.stats["files_copied"] += 1
+                self.stats["bytes_copied"] += new_bytes
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return digest.hexdigest(), new_bytes
+
+    def create(self, conversation_id: str, workspace_path: Path, label: str = "") -> Dict[str, Any]:
+        """
+        Take a checkpoint of a workspace. Blocking.
+
+        Args:
+            conversation_id: The conversation ID
+            workspace_path: Workspace directory
+            label: Short description, e.g. the prompt of the upcoming turn
+
+        Returns:
+            checkpoint: Summary of the new checkpoint
+        """
+        started = time.perf_counter()
+        with self._lock(conversation_id):
+            ids = self._checkpoint_ids(conversation_id)
+            previous = self._load(conversation_id, ids[-1])["files"] if ids else {}
+            new_bytes = 0
+
+            stats, dirs = self._walk(workspace_path)
+            files: Dict[str, _Entry] = {}
+            for rel, st in stats.items():
+                if stat.S_ISLNK(st.st_mode):
+                    files[rel] = {"symlink": os.readlink(workspace_path / rel)}
+                elif not stat.S_ISREG(st.st_mode):
+                    continue
+                elif self._unchanged(previous.get(rel), st):
+                    files[rel] = previous[rel]
+                else:
+                    try:
+                        digest, copied = self._store_file(conversation_id, workspace_path / rel)
+                    except FileNotFoundError:
+                        continue
+                    new_bytes += copied
+                    files[rel] = [st.st_size, st.st_mtime_ns, digest, stat.S_IMODE(st.st_mode)]
+
+            checkpoint_id = (ids[-1] + 1) if ids else 1
+            manifest = {
+                "id": checkpoint_id,
+                "created_at": datetime.now().isoformat(),
+                "label": label,
+                "dirs": sorted(dirs),
+                "files": files,
+                "new_bytes": new_bytes,
+            }
+            manifest_path = self._manifest_path(conversation_id, checkpoint_id)
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = manifest_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+            os.replace(tmp_path, manifest_path)
+
+            self._prune(conversation_id, ids + [checkpoint_id])
+
+        elapsed = time.perf_counter() - started
+        self.stats["created"] += 1
+        self.stats["last_checkpoint_seconds"] = round(elapsed, 3)
+        logger.info(
+            f"Checkpoint {checkpoint_id} for {conversation_id}: {len(files)} files, "
+            f"{manifest['new_bytes']} new bytes in {elapsed:.2f}s"
+        )
+        return self._summary(manifest)
+
+    def _prune(self, conversation_id: str, ids: List[int]) -> None:
+        """Drop checkpoints beyond the retention limit and the objects only they used."""
+        if len(ids) <= self.keep:
+            return
+        for checkpoint_id in ids[:-self.keep]:
+            self._manifest_path(conversation_id, checkpoint_id).unlink(missing_ok=True)
+
+        referenced: Set[str] = set()
+        for checkpoint_id in ids[-self.keep:]:
+            for entry in self._load(conversation_id, checkpoint_id)["files"].values():
+                if isinstance(entry, list):
+                    referenced.add(entry[2])
+        objects = self._root(conversation_id) / "objects"
+        for shard in os.scandir(objects):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if shard.name + entry.name not in referenced:
+                    os.unlink(entry.path)
+
+    @staticmethod
+    def _summary(manifest: Dict[str, Any]) -> Dict[str, Any]:
+        files = manifest["files"].values()
+        return {
+            "id": manifest["id"],
+            "created_at": manifest["created_at"],
+            "label": manifest["label"],
+            "file_count": len(manifest["files"]),
+            "size_bytes": sum(e[0] for e in files if isinstance(e, list)),
+            "new_bytes": manifest["new_bytes"],
+        }
+
+    def list_checkpoints(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """
+        List the checkpoints of a conversation, oldest first.
+
+        Args:
+            conversation_id: The conversation ID
+
+        Returns:
+            checkpoints: Checkpoint summaries
+        """
+        return [
+            self._summary(self._load(conversation_id, checkpoint_id))
+            for checkpoint_id in self._checkpoint_ids(conversation_id)
+        ]
+
+    def restore(self, conversation_id: str, checkpoint_id: int, workspace_path: Path) -> Dict[str, Any]:
+        """
+        Roll a workspace back to a checkpoint. Blocking.
+
+        Args:
+            conversation_id: The conversation ID
+            checkpoint_id: Checkpoint to restore
+            workspace_path: Workspace directory
+
+        Returns:
+            result: Number of files written and deleted and the elapsed time
+
+        Raises:
+            KeyError: If the checkpoint does not exist
+        """
+        started = time.perf_counter()
+        with self._lock(conversation_id):
+            ids = self._checkpoint_ids(conversation_id)
+            if checkpoint_id not in ids:
+                raise KeyError(checkpoint_id)
+            target = self._load(conversation_id, checkpoint_id)
+            # The newest manifest doubles as a hash cache for unchanged files
+            latest = target if ids[-1] == checkpoint_id else self._load(conversation_id, ids[-1])
+            wanted: Dict[str, _Entry] = target["files"]
+            known: Dict[str, _Entry] = latest["files"]
+
+            current, current_dirs = self._walk(workspace_path)
+            written = deleted = 0
+
+            for rel in current.keys() - wanted.keys():
+                (workspace_path / rel).unlink(missing_ok=True)
+                deleted += 1
+            for rel in sorted(current_dirs - set(target["dirs"]), reverse=True):
+                shutil.rmtree(workspace_path / rel, ignore_errors=True)
+            for rel in target["dirs"]:
+                (workspace_path / rel).mkdir(parents=True, exist_ok=True)
+
+            for rel, entry in wanted.items():
+                st = current.get(rel)
+                if st is not None and self._matches(workspace_path / rel, st, entry, known.get(rel)):
+                    continue
+                self._write(conversation_id, workspace_path / rel, entry)
+                written += 1
+
+        elapsed = time.perf_counter() - started
+        self.stats["restored"] += 1
+        self.stats["files_restored"] += written
+        self.stats["files_deleted"] += deleted
+        self.stats["last_restore_seconds"] = round(elapsed, 3)
+        logger.info(
+            f"Restored {conversation_id} to checkpoint {checkpoint_id}: "
+            f"{written} written, {deleted} deleted in {elapsed:.2f}s"
+        )
+        return {
+            "checkpoint_id": checkpoint_id,
+            "files_written": written,
+            "files_deleted": deleted,
+            "seconds": round(elapsed, 3),
+        }
+
+    def _matches(self, path: Path, st: os.stat_result, entry: _Entry, known: Optional[_Entry]) -> bool:
+        if isinstance(entry, dict):
+            return stat.S_ISLNK(st.st_mode) and os.readlink(path) == entry["symlink"]
+        if not stat.S_ISREG(st.st_mode) or st.st_size != entry[0]:
+            return False
+        if st.st_mtime_ns == entry[1]:
+            return True
+        # Only files changed since a checkpoint are read
+        if self._unchanged(known, st):
+            return known[2] == entry[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == entry[2]
+
+    def _write(self, conversation_id: str, path: Path, entry: _Entry) -> None:
+        tmp_path = path.with_name(f".{path.name}.restore-{uuid.uuid4().hex[:8]}")
+        if isinstance(entry, dict):
+            os.symlink(entry["symlink"], tmp_path)
+        else:
+            shutil.copyfile(self._object_path(conversation_id, entry[2]), tmp_path)
+            os.chmod(tmp_path, entry[3])
+            # Restore the mtime so the next checkpoint does not re-read the file
+            os.utime(tmp_path, ns=(entry[1], entry[1]))
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    def discard(self, conversation_id: str, trash_dir: Path) -> None:
+        """Move all checkpoints of a conversation into the trash area."""
+        root = self._root(conversation_id)
+        if not root.exists():
+            return
+        trash_dir.mkdir(parents=True, exist_ok=True)
+        os.rename(root, trash_dir / f"{conversation_id}-checkpoints-{uuid.uuid4().hex[:8]}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get checkpoint statistics.
+
+        Returns:
+            stats: Checkpoint/restore counts, copied bytes and timings
+        """
+        return dict(self.stats)
@@ -0,0 +1,402 @@
+"""
+Workspace Content Deduplication
+
+Content-addressed store that lets workspaces share one copy of identical
+dependency files. Every workspace carries the MCP template's dependency tree
+and its own ``node_modules``/``.venv``, so the same bytes are repeated once per
+conversation and crowd each other out of the page cache.
+
+Files are keyed by their SHA-256 under ``<workspaces>/.cas/`` and the copies in
+each workspace are replaced by reflinks (``FICLONE``) of that blob: they share
+storage on disk but are still separate files, so an in-place write through one
+workspace (``npm install``, ``pip``, ``git gc``, the agent editing a file)
+copies the touched extents instead of changing the file in every other
+workspace. Hardlinks would not give that guarantee (the agent runs as root, so
+file modes cannot stop writes), so on filesystems without reflinks
+deduplication is skipped. Only dependency trees and git object databases are
+considered.
+
+Deduplicated files are tagged with an extended attribute recording the blob
+and the size and mtime they had when linked. Later passes skip tagged files
+that are unchanged, and the workspace ledger does not count their bytes (they
+are accounted to the store once) so disk budgets are not charged for the same
+bytes by every workspace.
+
+Existing workspaces are deduplicated by a periodic offline pass that skips
+workspaces with a turn in progress. Blobs no file referenced during a pass are
+dropped by the same pass; clones keep their data, so this only affects
+sharing with files deduplicated later.
+"""
+
+import asyncio
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+from loguru import logger
+
+from app.services.template_store import FICLONE, REFLINK_UNSUPPORTED
+
+if TYPE_CHECKING:
+    from app.services.workspace_manager import ConversationWorkspaceManager
+
+CAS_DIR_NAME = ".cas"
+
+# Subtrees whose files are only ever replaced, never edited in place
+DEDUP_DIR_NAMES = {"node_modules", ".venv"}
+
+# Extended attribute tagging a deduplicated file: "<digest>:<size>:<mtime_ns>"
+SHARED_XATTR = "user.workspace_cas"
+
+
+def _is_dedup_root(path: str, name: str) -> bool:
+    if name in DEDUP_DIR_NAMES:
+        return True
+    # Git objects are content-addressed and written read-only by git itself
+    return name == "objects" and os.path.basename(os.path.dirname(path)) == ".git"
+
+
+def _shared_digest(path: str, st: os.stat_result) -> Optional[str]:
+    """Blob digest of a file deduplicated by the content store, if it is unchanged since."""
+    try:
+        tag = os.getxattr(path, SHARED_XATTR, follow_symlinks=False).decode()
+    except OSError:
+        return None
+    digest, _, rest = tag.partition(":")
+    if rest != f"{st.st_size}:{st.st_mtime_ns}":
+        return None
+    return digest
+
+
+def is_shared(path: str, st: os.stat_result) -> bool:
+    """
+    Check whether a file's bytes are held by the content store rather than its workspace.
+
+    Args:
+        path: File path
+        st: Result of lstat on the file
+
+    Returns:
+        shared: True for deduplicated files not modified since they were linked
+    """
+    return _shared_digest(path, st) is not None
+
+
+class ContentStore:
+    """SHA-256 keyed blob store shared by reflink across workspaces."""
+
+    def __init__(self, cas_dir: Path, min_size: int = 4096):
+        """
+        Initialize the store.
+
+        Args:
+            cas_dir: Blob directory, on the same filesystem as the workspaces
+            min_size: Files smaller than this are not worth a link
+        """
+        self.cas_dir = cas_dir
+        self.min_size = min_size
+        # Unknown until the first clone is attempted
+        self.reflink_supported: Optional[bool] = None
+        self._references: Dict[str, int] = {}
+        self.stats: Dict[str, Any] = {
+            "files_scanned": 0,
+            "files_linked": 0,
+            "bytes_saved": 0,
+            "blobs_collected": 0,
+            "store_blobs": 0,
+            "store_bytes": 0,
+            "linked_bytes": 0,
+        }
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.cas_dir / digest[:2] / digest[2:]
+
+    @staticmethod
+    def _hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _clone(src: str, dst: str) -> None:
+        """Create dst as a copy-on-write clone of src."""
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+    def _try_clone(self, src: str, dst: str) -> bool:
+        """Clone a file, turning deduplication off if the filesystem cannot."""
+        try:
+            self._clone(src, dst)
+        except OSError as e:
+            if os.path.exists(dst):
+                os.unlink(dst)
+            if e.errno not in REFLINK_UNSUPPORTED:
+                raise
+            self.reflink_supported = False
+            logger.info(f"Reflinks not supported in {self.cas_dir}, workspace deduplication is off")
+            return False
+        self.reflink_supported = True
+        return True
+
+    def _tag(self, path: str, digest: str) -> bool:
+        """Mark a file as deduplicated, turning deduplication off if xattrs are unsupported."""
+        st = os.lstat(path)
+        try:
+            os.setxattr(
+                path, SHARED_XATTR, f"{digest}:{st.st_size}:{st.st_mtime_ns}".encode(),
+                follow_symlinks=False,
+            )
+        except OSError as e:
+            if e.errno not in (errno.ENOTSUP, errno.EOPNOTSUPP):
+                raise
+            self.reflink_supported = False
+            logger.info(f"Extended attributes not supported in {self.cas_dir}, workspace deduplication is off")
+            return False
+        return True
+
+    def _add_blob(self, path: str, blob: Path) -> bool:
+        """Make a file's content a blob of the store."""
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_blob = f"{blob}.tmp-{uuid.uuid4().hex[:8]}"
+        if not self._try_clone(path, tmp_blob):
+            return False
+        os.replace(tmp_blob, blob)
+        return True
+
+    def _reference(self, digest: str) -> None:
+        self._references[digest] = self._references.get(digest, 0) + 1
+
+    def ingest(self, path: str) -> bool:
+        """
+        Replace a file with a reflink of its blob, adding the blob if new. Blocking.
+
+        Args:
+            path: Regular file inside a deduplicated subtree
+
+        Returns:
+            linked: True if the file now shares an existing blob
+        """
+        if self.reflink_supported is False:
+            return False
+        try:
+            before = os.lstat(path)
+            if not stat.S_ISREG(before.st_mode) or before.st_size < self.min_size:
+                return False
+            shared = _shared_digest(path, before)
+            if shared is not None:
+                blob = self._blob_path(shared)
+                # A blob collected while this workspace was busy is restored from it
+                if blob.exists() or self._add_blob(path, blob):
+                    self._reference(shared)
+                return False
+            self.stats["files_scanned"] += 1
+            digest = self._hash(path)
+            after = os.lstat(path)
+        except (FileNotFoundError, PermissionError):
+            return False
+        if (after.st_ino, after.st_size, after.st_mtime_ns) != (
+            before.st_ino, before.st_size, before.st_mtime_ns
+        ):
+            # Changed while hashing, try again next pass
+            return False
+
+        blob = self._blob_path(digest)
+        try:
+            blob_stat = blob.stat()
+        except FileNotFoundError:
+            # First copy of this content becomes the blob
+            if not self._add_blob(path, blob):
+                return False
+            if self._tag(path, digest):
+                self._reference(digest)
+            return False
+        if blob_stat.st_size != after.st_size:
+            logger.warning(f"Content store blob {blob} does not match its size, skipping")
+            return False
+
+        tmp_path = f"{path}.dedup-{uuid.uuid4().hex[:8]}"
+        if not self._try_clone(str(blob), tmp_path):
+            return False
+        try:
+            shutil.copystat(path, tmp_path)
+            if not self._tag(tmp_path, digest):
+                os.unlink(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._reference(digest)
+        self.stats["files_linked"] += 1
+        self.stats["bytes_saved"] += after.st_size
+        return True
+
+    def dedup_tree(self, root: Path) -> int:
+        """
+        Deduplicate the dependency subtrees of a workspace. Blocking.
+
+        Args:
+            root: Workspace directory
+
+        Returns:
+            linked: Number of files replaced by links
+        """
+        linked = 0
+        for path in self._immutable_files(str(root)):
+            try:
+                linked += self.ingest(path)
+            except OSError as e:
+                logger.warning(f"Failed to deduplicate {path}: {e}")
+            if self.reflink_supported is False:
+                break
+        return linked
+
+    def _immutable_files(self, root: str) -> Iterator[str]:
+        stack = [(root, False)]
+        while stack:
+            current, inside = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, inside or _is_dedup_root(entry.path, entry.name)))
+                elif inside and entry.is_file(follow_symlinks=False):
+                    yield entry.path
+
+    def collect(self) -> int:
+        """
+        Drop blobs no file referenced since the last collection and recompute
+        the store totals. Blocking.
+
+        Returns:
+            collected: Number of blobs removed
+        """
+        references, self._references = self._references, {}
+        collected = blobs = store_bytes = linked_bytes = 0
+        if self.cas_dir.exists():
+            for shard in os.scandir(self.cas_dir):
+                if not shard.is_dir(follow_symlinks=False):
+                    continue
+                for entry in os.scandir(shard.path):
+                    count = references.get(shard.name + entry.name, 0)
+                    if not count:
+                        os.unlink(entry.path)
+                        collected += 1
+                        continue
+                    size = entry.stat(follow_symlinks=False).st_size
+                    blobs += 1
+                    store_bytes += size
+                    linked_bytes += size * count
+        self.stats["blobs_collected"] += collected
+        self.stats["store_blobs"] = blobs
+        self.stats["store_bytes"] = store_bytes
+        self.stats["linked_bytes"] = linked_bytes
+        return collected
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get store statistics as of the last collection.
+
+        Returns:
+            stats: Link counters, store size and dedup ratio
+        """
+        store_bytes = self.stats["store_bytes"]
+        return {
+            **self.stats,
+            "reflink_supported": self.reflink_supported,
+            "dedup_ratio": (
+                round(self.stats["linked_bytes"] / store_bytes, 2) if store_bytes else None
+            ),
+        }
+
+
+class WorkspaceDeduplicator:
+    """Periodic offline deduplication pass over all workspaces."""
+
+    def __init__(
+        self,
+        manager: "ConversationWorkspaceManager",
+        store: ContentStore,
+        interval_seconds: float,
+    ):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            manager: Workspace manager owning the workspaces
+            store: Content store the workspaces link into
+            interval_seconds: Time between passes (0 disables the background task)
+        """
+        self.manager = manager
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {"passes": 0, "last_pass_seconds": None}
+
+    async def run_once(self) -> int:
+        """
+        Deduplicate every idle workspace, then collect unreferenced blobs.
+
+        Returns:
+            linked: Number of files replaced by links
+        """
+        started = time.perf_counter()
+        linked = 0
+        for conversation_id, info in self.manager.list_active_workspaces().items():
+            if info.get("archived") or self.manager.is_in_use(conversation_id):
+                continue
+            linked += await asyncio.to_thread(self.store.dedup_tree, Path(info["path"]))
+        await asyncio.to_thread(self.store.collect)
+        self.stats["passes"] += 1
+        self.stats["last_pass_seconds"] = round(time.perf_counter() - started, 3)
+        if linked:
+            logger.info(f"Deduplicated {linked} workspace files into the content store")
+        return linked
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Workspace dedup pass failed: {e}")
+
+    def start(self) -> None:
+        """Start the background dedup task."""
+        if not self.interval_seconds:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the background dedup task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get dedup statistics.
+
+        Returns:
+            stats: Pass counters plus the content store statistics
+        """
+        return {**self.stats, **self.store.get_stats()}
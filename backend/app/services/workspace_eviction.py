@@ -0,0 +1,271 @@
+"""
+Workspace Eviction Scheduler
+
+Background service that keeps conversation workspaces within their disk
+limits. Each pass looks at tracked last-access times and ledger sizes and
+evicts, least recently used first:
+
+- workspaces idle for longer than the idle TTL (archived ones included),
+- workspaces over the per-workspace quota,
+- as many more as needed to bring the total under the overall disk budget.
+
+Before that, workspaces idle past the archive threshold are packed into
+compressed archives, which keeps the user's work while freeing the disk.
+
+Workspaces with a turn in progress are never evicted. Eviction renames the
+directory into a trash area (instant, atomic) and the trash is deleted off the
+event loop with bounded parallelism.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from app.services.workspace_manager import ConversationWorkspaceManager
+
+TRASH_DIR_NAME = ".trash"
+
+
+class WorkspaceEvictor:
+    """Disk-budget aware LRU eviction of conversation workspaces."""
+
+    def __init__(
+        self,
+        manager: "ConversationWorkspaceManager",
+        trash_dir: Path,
+        disk_budget_bytes: int,
+        quota_bytes: int,
+        archive_after_seconds: float,
+        idle_ttl_seconds: float,
+        interval_seconds: float,
+        parallelism: int,
+    ):
+        """
+        Initialize the evictor.
+
+        Args:
+            manager: Workspace manager owning the workspaces
+            trash_dir: Directory evicted workspaces are renamed into, on the
+                       same filesystem as the workspaces
+            disk_budget_bytes: Budget for all workspaces together (0 disables)
+            quota_bytes: Limit for a single workspace (0 disables)
+            archive_after_seconds: Idle time after which a workspace is archived (0 disables)
+            idle_ttl_seconds: Idle time after which a workspace is evicted (0 disables)
+            interval_seconds: Time between eviction passes
+            parallelism: Maximum number of trash deletions running at once
+        """
+        self.manager = manager
+        self.trash_dir = trash_dir
+        self.disk_budget_bytes = disk_budget_bytes
+        self.quota_bytes = quota_bytes
+        self.archive_after_seconds = archive_after_seconds
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.interval_seconds = interval_seconds
+        self._delete_slots = asyncio.Semaphore(max(1, parallelism))
+        self._task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {
+            "passes": 0,
+            "archived": 0,
+            "evictions": 0,
+            "evictions_by_reason": {"idle": 0, "quota": 0, "budget": 0},
+            "evicted_bytes": 0,
+            "last_pass_seconds": None,
+            "last_eviction_seconds": None,
+            "total_eviction_seconds": 0.0,
+            "trash_deleted": 0,
+            "trash_delete_failures": 0,
+        }
+
+    def select_victims(self, now: Optional[float] = None) -> List[Tuple[str, str, int]]:
+        """
+        Choose the workspaces to evict.
+
+        Args:
+            now: Current time as a UNIX timestamp (defaults to time.time())
+
+        Returns:
+            victims: (conversation_id, reason, size_bytes) in eviction order
+        """
+        now = time.time() if now is None else now
+        candidates: List[Tuple[float, str, int]] = []
+        total_bytes = 0
+        for conversation_id, info in self.manager.list_active_workspaces().items():
+            size = info.get("size_bytes") or 0
+            total_bytes += size
+            if self.manager.is_in_use(conversation_id):
+                continue
+            try:
+                last_accessed = datetime.fromisoformat(info["last_accessed"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                last_accessed = 0.0
+            candidates.append((last_accessed, conversation_id, size))
+
+        # Least recently used first
+        candidates.sort()
+        victims: List[Tuple[str, str, int]] = []
+        remaining: List[Tuple[float, str, int]] = []
+        for last_accessed, conversation_id, size in candidates:
+            if self.idle_ttl_seconds and now - last_accessed > self.idle_ttl_seconds:
+                victims.append((conversation_id, "idle", size))
+            elif self.manager.active_workspaces[conversation_id].get("archived"):
+                # Archived workspaces hold no tree on disk, only the idle TTL applies
+                continue
+            elif self.quota_bytes and size > self.quota_bytes:
+                victims.append((conversation_id, "quota", size))
+            else:
+                remaining.append((last_accessed, conversation_id, size))
+                continue
+            total_bytes -= size
+
+        if self.disk_budget_bytes:
+            for _, conversation_id, size in remaining:
+                if total_bytes <= self.disk_budget_bytes:
+                    break
+                victims.append((conversation_id, "budget", size))
+                total_bytes -= size
+
+        return victims
+
+    def select_archivable(self, now: Optional[float] = None) -> List[str]:
+        """
+        Choose the workspaces idle long enough to be archived.
+
+        Args:
+            now: Current time as a UNIX timestamp (defaults to time.time())
+
+        Returns:
+            conversation_ids: Workspaces to archive, least recently used first
+        """
+        if not self.archive_after_seconds:
+            return []
+        now = time.time() if now is None else now
+        idle: List[Tuple[float, str]] = []
+        for conversation_id, info in self.manager.list_active_workspaces().items():
+            if info.get("archived") or self.manager.is_in_use(conversation_id):
+                continue
+            try:
+                last_accessed = datetime.fromisoformat(info["last_accessed"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            if now - last_accessed > self.archive_after_seconds:
+                idle.append((last_accessed, conversation_id))
+        return [conversation_id for _, conversation_id in sorted(idle)]
+
+    async def _delete(self, trash_path: Path) -> None:
+        async with self._delete_slots:
+            try:
+                await asyncio.to_thread(shutil.rmtree, trash_path)
+                self.stats["trash_deleted"] += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.stats["trash_delete_failures"] += 1
+                logger.error(f"Failed to delete evicted workspace {trash_path}: {e}")
+
+    async def purge_trash(self) -> None:
+        """Delete everything in the trash area with bounded parallelism."""
+        if not self.trash_dir.exists():
+            return
+        entries = [Path(e.path) for e in os.scandir(self.trash_dir)]
+        await asyncio.gather(*(self._delete(path) for path in entries))
+
+    async def run_once(self) -> int:
+        """
+        Run one eviction pass.
+
+        Returns:
+            evicted: Number of workspaces evicted
+        """
+        started = time.perf_counter()
+
+        # Archive idle workspaces first, their trees then leave the disk budget
+        for conversation_id in self.select_archivable():
+            try:
+                if await asyncio.to_thread(self.manager.archive_workspace, conversation_id):
+                    self.stats["archived"] += 1
+            except Exception as e:
+                logger.error(f"Failed to archive workspace {conversation_id}: {e}")
+
+        # Sizes are only known once a workspace's ledger exists
+        for conversation_id, info in self.manager.list_active_workspaces().items():
+            if info.get("size_bytes") is None and not info.get("archived"):
+                await asyncio.to_thread(self.manager.refresh_workspace_stats, conversation_id)
+
+        deletions = []
+        for conversation_id, reason, size in self.select_victims():
+            evict_started = time.perf_counter()
+            trash_path = self.manager.evict_workspace(conversation_id)
+            if trash_path is None:
+                continue
+            deletions.append(self._timed_delete(trash_path, evict_started, reason, size))
+            logger.info(f"Evicting workspace {conversation_id} ({reason}, {size} bytes)")
+        await asyncio.gather(*deletions)
+
+        self.stats["passes"] += 1
+        self.stats["last_pass_seconds"] = round(time.perf_counter() - started, 3)
+        return len(deletions)
+
+    async def _timed_delete(self, trash_path: Path, started: float, reason: str, size: int) -> None:
+        await self._delete(trash_path)
+        elapsed = time.perf_counter() - started
+        self.stats["evictions"] += 1
+        self.stats["evictions_by_reason"][reason] += 1
+        self.stats["evicted_bytes"] += size
+        self.stats["last_eviction_seconds"] = round(elapsed, 3)
+        self.stats["total_eviction_seconds"] += elapsed
+
+    async def _loop(self) -> None:
+        # Leftovers from a previous run (e.g. a crash mid-delete)
+        await self.purge_trash()
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run_once()
+                await self.purge_trash()
+            except Exception as e:
+                logger.error(f"Workspace eviction pass failed: {e}")
+
+    def start(self) -> None:
+        """Start the background eviction task."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the background eviction task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get eviction statistics.
+
+        Returns:
+            stats: Eviction counts, evicted bytes and eviction latency
+        """
+        evictions = self.stats["evictions"]
+        trash_pending = (
+            sum(1 for _ in os.scandir(self.trash_dir)) if self.trash_dir.exists() else 0
+        )
+        return {
+            **self.stats,
+            "evictions_by_reason": dict(self.stats["evictions_by_reason"]),
+            "avg_eviction_seconds": (
+                round(self.stats["total_eviction_seconds"] / evictions, 3) if evictions else None
+            ),
+            "trash_pending": trash_pending,
+            "disk_budget_bytes": self.disk_budget_bytes,
+            "quota_bytes": self.quota_bytes,
+        }
@@ -6,16 +6,30 @@ Creates, tracks, and manages conversation-specific folders where Claude Code
 tools operate, ensuring complete isolation between different chat sessions.
 """
 
+import asyncio
+import fcntl
+import hashlib
 import os
 import shutil
-import subprocess
+import threading
 import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from loguru import logger
 
+from app.core.config import settings
+from app.services.template_store import TemplateSpec, template_store
+from app.services.workspace_archive import ARCHIVE_DIR_NAME, WorkspaceArchiver
+from app.services.workspace_checkpoints import CHECKPOINT_DIR_NAME, CheckpointStore
+from app.services.workspace_dedup import CAS_DIR_NAME, ContentStore, WorkspaceDeduplicator
+from app.services.workspace_eviction import TRASH_DIR_NAME, WorkspaceEvictor
+from app.services.workspace_pool import POOL_DIR_NAME, WorkspacePool
+from app.services.workspace_registry import REGISTRY_FILE_NAME, WorkspaceRegistry
+from app.services.workspace_stats import WorkspaceLedger
+
 # Get the backend directory (where this file is located)
 BACKEND_DIR = Path(__file__).parent.parent.parent
 DEFAULT_WORKSPACE_DIR = BACKEND_DIR / "workspaces"
@@ -23,6 +37,23 @@ DEFAULT_WORKSPACE_DIR = BACKEND_DIR / "workspaces"
 # MCP Template Configuration
 MCP_TEMPLATE_REPO = "https://github.com/dedalus-labs/brave-search-mcp.git"
 MCP_TEMPLATE_DIR = "mcp-server"
+MCP_TEMPLATE_NAME = "brave-search-mcp"
+
+# Workspaces live under two levels of hash-prefix shards, <base>/ab/cd/<conversation_id>,
+# so no single directory grows with the number of conversations
+SHARD_WIDTH = 2
+SHARD_DEPTH = 2
+
+# Lock files serializing workspace creation across worker processes, striped by
+# hash prefix so their number stays bounded
+LOCK_DIR_NAME = ".locks"
+LOCK_STRIPE_WIDTH = 4
+
+template_store.register(TemplateSpec(
+    name=MCP_TEMPLATE_NAME,
+    repo=MCP_TEMPLATE_REPO,
+    tarball=f"{MCP_TEMPLATE_NAME}.tar.gz",
+))
 
 
 class ConversationWorkspaceManager:
@@ -45,77 +76,186 @@ class ConversationWorkspaceManager:
             else:
                 self.base_dir = Path(base_workspace_dir)
         
-        self.active_workspaces: Dict[str, Dict] = {}
-        
         # Ensure base directory exists
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Durable registry, loaded in bulk by open() so lookups never rescan the disk
+        self.registry = WorkspaceRegistry(
+            self.base_dir / REGISTRY_FILE_NAME,
+            settings.WORKSPACE_REGISTRY_FLUSH_SECONDS,
+        )
+        self.active_workspaces: Dict[str, Dict] = {}
+        
+        # Incremental size/count ledgers, built on first stats lookup
+        self._ledgers: Dict[str, WorkspaceLedger] = {}
+        self._ledgers_lock = threading.Lock()
+        self._stats_refreshes: Dict[str, "asyncio.Task[Optional[Dict]]"] = {}
+        
+        # Pre-provisioned workspaces, claimed by rename on first use
+        self.pool = WorkspacePool(
+            self.base_dir / POOL_DIR_NAME,
+            self._build_workspace_tree,
+            settings.WORKSPACE_POOL_SIZE,
+        )
+        
+        # Single-flight workspace provisioning
+        self._provisioning: Dict[str, "asyncio.Future[str]"] = {}
+        self._creation_locks: Dict[str, threading.Lock] = {}
+        self._creation_locks_guard = threading.Lock()
+        self.provisioning_stats = {
+            "created": 0,
+            "created_elsewhere": 0,
+            "rehydrated": 0,
+            "coalesced": 0,
+            "lock_wait_seconds": 0.0,
+        }
+        
+        # Workspaces with a turn in progress, never evicted or archived. The lock
+        # makes claiming a workspace and archiving or evicting it mutually exclusive.
+        self._in_use: Dict[str, int] = {}
+        self._in_use_lock = threading.Lock()
+        self.archiver = WorkspaceArchiver(self.base_dir / ARCHIVE_DIR_NAME)
+        self.evictor = WorkspaceEvictor(
+            self,
+            self.base_dir / TRASH_DIR_NAME,
+            disk_budget_bytes=settings.WORKSPACE_DISK_BUDGET_BYTES,
+            quota_bytes=settings.WORKSPACE_QUOTA_BYTES,
+            archive_after_seconds=settings.WORKSPACE_ARCHIVE_AFTER_HOURS * 3600,
+            idle_ttl_seconds=settings.WORKSPACE_IDLE_TTL_HOURS * 3600,
+            interval_seconds=settings.WORKSPACE_EVICTION_INTERVAL_SECONDS,
+            parallelism=settings.WORKSPACE_EVICTION_PARALLELISM,
+        )
+        
+        # Identical dependency files shared across workspaces by reflink
+        self.content_store = ContentStore(
+            self.base_dir / CAS_DIR_NAME, settings.WORKSPACE_DEDUP_MIN_BYTES,
+        )
+        self.deduplicator = WorkspaceDeduplicator(
+            self, self.content_store, settings.WORKSPACE_DEDUP_INTERVAL_SECONDS,
+        )
+        
+        # Per-turn snapshots for rolling a workspace back
+        self.checkpoints = CheckpointStore(
+            self.base_dir / CHECKPOINT_DIR_NAME, settings.WORKSPACE_CHECKPOINT_KEEP,
+        )
         logger.info(f"Workspace manager initialized with base dir: {self.base_dir.resolve()}")
     
-    def _setup_mcp_template(self, workspace_path: Path) -> bool:
+    def open(self) -> None:
+        """
+        Open the workspace registry and load every known workspace. Blocking.
+        
+        Called once at application startup rather than on import, so importing
+        the module never touches the registry database.
+        """
+        loaded = self.registry.load_all()
+        # Entries tracked before the registry was opened are newer
+        loaded.update(self.active_workspaces)
+        self.active_workspaces = loaded
+    
+    def _workspace_dir(self, conversation_id: str) -> Path:
+        """Sharded location of a conversation workspace."""
+        digest = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+        shards = [
+            digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)
+        ]
+        return self.base_dir.joinpath(*shards, conversation_id)
+    
+    def _find_workspace_dir(self, conversation_id: str) -> Optional[Path]:
+        """Locate a workspace on disk: sharded layout first, then the legacy flat one."""
+        workspace_path = self._workspace_dir(conversation_id)
+        if workspace_path.exists():
+            return workspace_path
+        legacy_path = self.base_dir / conversation_id
+        if legacy_path.is_dir():
+            return legacy_path
+        return None
+    
+    @staticmethod
+    def _is_shard_name(name: str) -> bool:
+        return len(name) == SHARD_WIDTH and all(c in "0123456789abcdef" for c in name)
+    
+    def migrate_flat_layout(self) -> int:
         """
-        Clone and initialize MCP template in the workspace.
+        Move workspaces from the legacy flat layout into their shards. Blocking.
+        
+        Each move is a single rename within the base directory. Workspaces with
+        a turn in progress are left for the next run; until then they still
+        resolve through the flat fallback.
+        
+        Returns:
+            moved: Number of workspaces moved
+        """
+        moved = 0
+        started = time.perf_counter()
+        for entry in os.scandir(self.base_dir):
+            name = entry.name
+            if (
+                name.startswith(".")
+                or self._is_shard_name(name)
+                or not entry.is_dir(follow_symlinks=False)
+                or self.is_in_use(name)
+            ):
+                continue
+            workspace_path = self._workspace_dir(name)
+            if workspace_path.exists():
+                logger.warning(f"Not migrating {entry.path}: {workspace_path} already exists")
+                continue
+            workspace_path.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(entry.path, workspace_path)
+            moved += 1
+            
+            workspace_info = self.active_workspaces.get(name)
+            if workspace_info is not None:
+                workspace_info["path"] = str(workspace_path)
+                self._ledgers.pop(name, None)
+                self.registry.record(name, workspace_info)
+        
+        # Archived workspaces are restored to their recorded path
+        for conversation_id, workspace_info in self.active_workspaces.items():
+            if workspace_info.get("archived") and Path(workspace_info["path"]).parent == self.base_dir:
+                workspace_info["path"] = str(self._workspace_dir(conversation_id))
+                self.registry.record(conversation_id, workspace_info)
+        
+        if moved:
+            logger.info(
+                f"Migrated {moved} workspaces to the sharded layout "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        return moved
+    
+    def _setup_mcp_template(self, workspace_path: Path) -> Optional[str]:
+        """
+        Copy the MCP template into the workspace from the local template store.
+        
+        The store keeps a fetched, git-initialized mirror of the template, so this
+        is a local (reflinked where supported) copy instead of a network clone.
         
         Args:
             workspace_path: Path to the workspace directory
             
         Returns:
-            success: True if template setup succeeded, False otherwise
+            version: Template version that was set up, None if setup failed
         """
         try:
             mcp_path = workspace_path / MCP_TEMPLATE_DIR
-            
-            # Clone the MCP template repository
-            logger.info(f"Cloning MCP template from {MCP_TEMPLATE_REPO}")
-            result = subprocess.run([
-                "git", "clone", MCP_TEMPLATE_REPO, str(mcp_path)
-            ], capture_output=True, text=True, cwd=workspace_path)
-            
-            if result.returncode != 0:
-                logger.error(f"Failed to clone MCP template: {result.stderr}")
-                return False
-            
-            # Remove original .git directory
-            git_dir = mcp_path / ".git"
-            if git_dir.exists():
-                shutil.rmtree(git_dir)
-                logger.info("Removed original .git history from MCP template")
-            
-            # Initialize new git repository
-            result = subprocess.run([
-                "git", "init"
-            ], capture_output=True, text=True, cwd=mcp_path)
-            
-            if result.returncode != 0:
-                logger.warning(f"Failed to initialize git repository: {result.stderr}")
-                # Continue anyway, git init failure is not critical
-            
-            # Set initial branch to main
-            subprocess.run([
-                "git", "branch", "-m", "main"
-            ], capture_output=True, text=True, cwd=mcp_path)
-            
-            logger.info(f"MCP template successfully set up at {mcp_path}")
-            return True
+            version = template_store.materialize(MCP_TEMPLATE_NAME, mcp_path)
+            logger.info(f"MCP template {version} successfully set up at {mcp_path}")
+            return version
             
         except Exception as e:
             logger.error(f"Error setting up MCP template: {e}")
-            return False
+            return None
     
-    def create_conversation_workspace(self, conversation_id: Optional[str] = None) -> str:
+    def _build_workspace_tree(self, workspace_path: Path) -> Optional[str]:
         """
-        Create a new isolated workspace for a conversation.
+        Create the standard workspace directories and MCP template.
         
         Args:
-            conversation_id: Optional conversation ID, will generate one if not provided
+            workspace_path: Path to the workspace directory
             
         Returns:
-            conversation_id: The conversation ID for this workspace
+            version: Template version that was set up, None if template setup failed
         """
-        if not conversation_id:
-            conversation_id = f"conv_{int(time.time())}_{str(uuid.uuid4())[:8]}"
-        
-        # Create conversation-specific directory
-        workspace_path = self.base_dir / conversation_id
         workspace_path.mkdir(parents=True, exist_ok=True)
         
         # Create standard subdirectories
@@ -124,25 +264,47 @@ class ConversationWorkspaceManager:
         (workspace_path / "logs").mkdir(exist_ok=True)
         
         # Set up MCP template automatically
-        mcp_setup_success = self._setup_mcp_template(workspace_path)
+        return self._setup_mcp_template(workspace_path)
+    
+    def create_conversation_workspace(self, conversation_id: Optional[str] = None) -> str:
+        """
+        Create a new isolated workspace for a conversation.
         
-        # Track the workspace
-        workspace_info = {
-            "path": str(workspace_path),
-            "created_at": datetime.now().isoformat(),
-            "last_accessed": datetime.now().isoformat(),
-            "file_count": 0,
-            "mcp_template_setup": mcp_setup_success
-        }
+        Args:
+            conversation_id: Optional conversation ID, will generate one if not provided
+            
+        Returns:
+            conversation_id: The conversation ID for this workspace
+        """
+        if not conversation_id:
+            conversation_id = f"conv_{int(time.time())}_{str(uuid.uuid4())[:8]}"
         
-        self.active_workspaces[conversation_id] = workspace_info
+        # Create conversation-specific directory, preferring a pre-provisioned one.
+        # New workspaces are assembled next to their final path and renamed into
+        # place, so other requests and workers never see a half-built tree.
+        existing_path = self._find_workspace_dir(conversation_id)
+        workspace_path = existing_path or self._workspace_dir(conversation_id)
+        if existing_path is not None:
+            build_path = workspace_path
+        else:
+            build_path = workspace_path.with_name(
+                f".{conversation_id}.creating-{uuid.uuid4().hex[:8]}"
+            )
+        pooled = None if existing_path is not None else self.pool.claim(build_path)
+        if pooled is not None:
+            mcp_template_version = pooled["mcp_template_version"]
+            mcp_setup_success = (build_path / MCP_TEMPLATE_DIR).is_dir()
+        else:
+            mcp_template_version = self._build_workspace_tree(build_path)
+            mcp_setup_success = mcp_template_version is not None
+        created_at = datetime.now().isoformat()
         
         # Create a README for the workspace
         mcp_status = "✅ Ready" if mcp_setup_success else "❌ Failed"
         readme_content = f"""# Claude Code Conversation Workspace
 
 Conversation ID: {conversation_id}
-Created: {workspace_info['created_at']}
+Created: {created_at}
 
 ## Structure:
 - `files/` - Working files for this conversation
@@ -163,9 +325,32 @@ Navigate to `{MCP_TEMPLATE_DIR}/` to start building your MCP server.
 This workspace is isolated from other conversations.
 """
         
-        readme_path = workspace_path / "README.md"
+        readme_path = build_path / "README.md"
         readme_path.write_text(readme_content.strip())
         
+        if build_path != workspace_path:
+            try:
+                os.rename(build_path, workspace_path)
+            except OSError:
+                # Someone else finished first (without holding the creation lock)
+                shutil.rmtree(build_path, ignore_errors=True)
+                if not workspace_path.is_dir():
+                    raise
+                logger.warning(f"Workspace {conversation_id} was created concurrently, using it")
+        
+        # Track the workspace
+        workspace_info = {
+            "path": str(workspace_path),
+            "created_at": created_at,
+            "last_accessed": datetime.now().isoformat(),
+            "file_count": 0,
+            "mcp_template_setup": mcp_setup_success,
+            "mcp_template_version": mcp_template_version
+        }
+        
+        self.active_workspaces[conversation_id] = workspace_info
+        self.registry.record(conversation_id, workspace_info)
+        
         logger.info(f"Created workspace for conversation {conversation_id} at {workspace_path}")
         return conversation_id
     
@@ -178,32 +363,65 @@ This workspace is isolated from other conversations.
             
         Returns:
             workspace_path: Path to the conversation workspace, None if not found
+                or archived (ensure_workspace_async restores archived workspaces)
         """
         if conversation_id in self.active_workspaces:
+            workspace_info = self.active_workspaces[conversation_id]
+            if workspace_info.get("archived"):
+                return None
             # Update last accessed time
-            self.active_workspaces[conversation_id]["last_accessed"] = datetime.now().isoformat()
-            return self.active_workspaces[conversation_id]["path"]
+            workspace_info["last_accessed"] = datetime.now().isoformat()
+            self.registry.record(conversation_id, workspace_info)
+            return workspace_info["path"]
         
-        # Check if workspace exists on disk but not in memory
-        workspace_path = self.base_dir / conversation_id
-        if workspace_path.exists():
+        # Check if workspace exists on disk but not in the registry (created before
+        # the registry existed, or by another worker). One or two stats, no tree
+        # walk; sizes are filled in by the stats ledger later.
+        workspace_path = self._find_workspace_dir(conversation_id)
+        if workspace_path is not None:
             # Restore workspace info
             workspace_info = {
                 "path": str(workspace_path),
                 "created_at": datetime.fromtimestamp(workspace_path.stat().st_ctime).isoformat(),
                 "last_accessed": datetime.now().isoformat(),
-                "file_count": len(list(workspace_path.rglob("*")))
+                "file_count": None,
+                "mcp_template_setup": (workspace_path / MCP_TEMPLATE_DIR).is_dir(),
             }
             self.active_workspaces[conversation_id] = workspace_info
+            self.registry.record(conversation_id, workspace_info)
             logger.info(f"Restored workspace for conversation {conversation_id}")
             return str(workspace_path)
         
         return None
     
+    @contextmanager
+    def _creation_lock(self, conversation_id: str) -> Iterator[None]:
+        """Hold the in-process and on-disk creation locks of a workspace."""
+        stripe = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()[:LOCK_STRIPE_WIDTH]
+        with self._creation_locks_guard:
+            thread_lock = self._creation_locks.setdefault(stripe, threading.Lock())
+        
+        started = time.perf_counter()
+        with thread_lock:
+            lock_dir = self.base_dir / LOCK_DIR_NAME
+            lock_dir.mkdir(exist_ok=True)
+            with open(lock_dir / f"{stripe}.lock", "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self.provisioning_stats["lock_wait_seconds"] += time.perf_counter() - started
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
     def ensure_workspace_exists(self, conversation_id: str) -> str:
         """
         Ensure a workspace exists for the conversation, create if needed.
         
+        Creation and the restore of archived workspaces run under a
+        per-conversation lock shared by threads and worker processes, so a
+        workspace is only ever built or unpacked once. Blocking; async callers
+        use ensure_workspace_async.
+        
         Args:
             conversation_id: The conversation ID
             
@@ -214,49 +432,311 @@ This workspace is isolated from other conversations.
         if workspace_path:
             return workspace_path
         
-        # Create new workspace
-        self.create_conversation_workspace(conversation_id)
+        with self._creation_lock(conversation_id):
+            # Another thread or worker may have created it while we waited
+            workspace_path = self.get_workspace_path(conversation_id)
+            if workspace_path:
+                self.provisioning_stats["created_elsewhere"] += 1
+                return workspace_path
+            
+            workspace_info = self.active_workspaces.get(conversation_id)
+            if workspace_info is not None and workspace_info.get("archived"):
+                self._rehydrate_workspace(conversation_id, workspace_info)
+                self.provisioning_stats["rehydrated"] += 1
+                return workspace_info["path"]
+            
+            # Create new workspace
+            self.create_conversation_workspace(conversation_id)
+            self.provisioning_stats["created"] += 1
+        
         workspace_path = self.get_workspace_path(conversation_id)
         if workspace_path is None:
             raise RuntimeError(f"Failed to create workspace for conversation {conversation_id}")
         return workspace_path
     
+    async def ensure_workspace_async(self, conversation_id: str) -> str:
+        """
+        Ensure a workspace exists without blocking the event loop.
+        
+        Concurrent callers for the same conversation share one in-flight
+        provisioning (creation or rehydration) instead of racing.
+        
+        Args:
+            conversation_id: The conversation ID
+            
+        Returns:
+            workspace_path: Path to the conversation workspace
+        """
+        workspace_info = self.active_workspaces.get(conversation_id)
+        if workspace_info is not None and not workspace_info.get("archived"):
+            workspace_path = self.get_workspace_path(conversation_id)
+            if workspace_path:
+                return workspace_path
+        
+        task = self._provisioning.get(conversation_id)
+        if task is None:
+            task = asyncio.ensure_future(
+                asyncio.to_thread(self.ensure_workspace_exists, conversation_id)
+            )
+            self._provisioning[conversation_id] = task
+            task.add_done_callback(lambda _: self._provisioning.pop(conversation_id, None))
+        else:
+            self.provisioning_stats["coalesced"] += 1
+        # One caller going away must not cancel the others
+        return await asyncio.shield(task)
+    
+    @contextmanager
+    def using_workspace(self, conversation_id: str) -> Iterator[None]:
+        """
+        Mark a workspace as in use (e.g. for the duration of a turn) so it is not evicted.
+        
+        Args:
+            conversation_id: The conversation ID
+        """
+        with self._in_use_lock:
+            self._in_use[conversation_id] = self._in_use.get(conversation_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._in_use_lock:
+                remaining = self._in_use.get(conversation_id, 1) - 1
+                if remaining > 0:
+                    self._in_use[conversation_id] = remaining
+                else:
+                    self._in_use.pop(conversation_id, None)
+    
+    def is_in_use(self, conversation_id: str) -> bool:
+        """Check whether a workspace has a turn in progress."""
+        return conversation_id in self._in_use
+    
+    def evict_workspace(self, conversation_id: str) -> Optional[Path]:
+        """
+        Remove a workspace from service by renaming it into the trash area.
+        
+        The rename is atomic and cheap; deleting the trash is left to the
+        eviction service, off the request path.
+        
+        Args:
+            conversation_id: The conversation ID
+            
+        Returns:
+            trash_path: Where the workspace now lives, None if it was not evicted
+        """
+        with self._in_use_lock:
+            if self.is_in_use(conversation_id):
+                return None
+            workspace_info = self.active_workspaces.get(conversation_id)
+            if workspace_info is None:
+                return None
+            
+            if workspace_info.get("archived"):
+                workspace_path = Path(workspace_info["archive_path"])
+            else:
+                workspace_path = Path(workspace_info["path"])
+            trash_path = self.evictor.trash_dir / f"{conversation_id}-{uuid.uuid4().hex[:8]}"
+            try:
+                trash_path.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(workspace_path, trash_path)
+            except FileNotFoundError:
+                trash_path = None
+            except OSError as e:
+                logger.error(f"Failed to evict workspace {conversation_id}: {e}")
+                return None
+            
+            del self.active_workspaces[conversation_id]
+        self._ledgers.pop(conversation_id, None)
+        self.registry.remove(conversation_id)
+        self._discard_checkpoints(conversation_id)
+        return trash_path
+    
+    def archive_workspace(self, conversation_id: str) -> bool:
+        """
+        Pack an idle workspace into a compressed archive and free its tree.
+        
+        The next ensure_workspace_exists (or ensure_workspace_async) call
+        restores it. The tree is packed without holding any lock; the final
+        swap runs under the creation lock and the in-use lock, so it cannot
+        race a restore or a turn claiming the workspace. Blocking; call it off
+        the event loop.
+        
+        Args:
+            conversation_id: The conversation ID
+            
+        Returns:
+            archived: True if the workspace was archived
+        """
+        workspace_info = self.active_workspaces.get(conversation_id)
+        if workspace_info is None or workspace_info.get("archived") or self.is_in_use(conversation_id):
+            return False
+        workspace_path = Path(workspace_info["path"])
+        if not workspace_path.exists():
+            return False
+        
+        archive_path = self.archiver.archive(conversation_id, workspace_path)
+        with self._creation_lock(conversation_id), self._in_use_lock:
+            if workspace_info.get("archived"):
+                # Archived concurrently, to the same archive path
+                return False
+            if self.is_in_use(conversation_id) or conversation_id not in self.active_workspaces:
+                # A turn started (or the workspace was evicted) while we were packing
+                archive_path.unlink(missing_ok=True)
+                return False
+            
+            # The trash purge deletes the tree off the request path
+            trash_path = self.evictor.trash_dir / f"{conversation_id}-{uuid.uuid4().hex[:8]}"
+            trash_path.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(workspace_path, trash_path)
+            
+            workspace_info.update({
+                "archived": True,
+                "archive_path": str(archive_path),
+                "archived_at": datetime.now().isoformat(),
+                "archive_bytes": archive_path.stat().st_size,
+                "size_bytes": 0,
+                "file_count": 0,
+            })
+            self._ledgers.pop(conversation_id, None)
+            self.registry.record(conversation_id, workspace_info)
+        # The archive keeps the latest state, rollback history is not kept
+        self._discard_checkpoints(conversation_id)
+        return True
+    
+    def _rehydrate_workspace(self, conversation_id: str, workspace_info: Dict) -> None:
+        """Restore an archived workspace in place. Callers hold its creation lock."""
+        self.archiver.restore(
+            conversation_id, Path(workspace_info["archive_path"]), Path(workspace_info["path"])
+        )
+        for key in ("archived", "archive_path", "archived_at", "archive_bytes"):
+            workspace_info.pop(key, None)
+        # Unknown until the ledger is rebuilt
+        workspace_info["size_bytes"] = None
+        workspace_info["file_count"] = None
+        self.registry.record(conversation_id, workspace_info)
+    
+    def create_checkpoint(self, conversation_id: str, label: str = "") -> Optional[Dict]:
+        """
+        Snapshot a workspace so it can be rolled back later. Blocking.
+        
+        Args:
+            conversation_id: The conversation ID
+            label: Short description, e.g. the prompt of the upcoming turn
+            
+        Returns:
+            checkpoint: Summary of the new checkpoint, None if disabled or unknown
+        """
+        if not self.checkpoints.keep:
+            return None
+        workspace_info = self.active_workspaces.get(conversation_id)
+        if workspace_info is None or workspace_info.get("archived"):
+            return None
+        return self.checkpoints.create(conversation_id, Path(workspace_info["path"]), label)
+    
+    def list_checkpoints(self, conversation_id: str) -> List[Dict]:
+        """
+        List the checkpoints of a workspace, oldest first.
+        
+        Args:
+            conversation_id: The conversation ID
+            
+        Returns:
+            checkpoints: Checkpoint summaries
+        """
+        return self.checkpoints.list_checkpoints(conversation_id)
+    
+    def restore_checkpoint(self, conversation_id: str, checkpoint_id: int) -> Dict:
+        """
+        Roll a workspace back to a checkpoint. Blocking.
+        
+        Args:
+            conversation_id: The conversation ID
+            checkpoint_id: Checkpoint to restore
+            
+        Returns:
+            result: Number of files written and deleted and the elapsed time
+            
+        Raises:
+            KeyError: If the workspace or checkpoint does not exist
+        """
+        workspace_path = self.get_workspace_path(conversation_id)
+        if workspace_path is None:
+            raise KeyError(conversation_id)
+        result = self.checkpoints.restore(conversation_id, checkpoint_id, Path(workspace_path))
+        # Restored files keep their checkpoint mtimes, rebuild the ledger
+        self._ledgers.pop(conversation_id, None)
+        return result
+    
+    def _discard_checkpoints(self, conversation_id: str) -> None:
+        try:
+            self.checkpoints.discard(conversation_id, self.evictor.trash_dir)
+        except OSError as e:
+            logger.error(f"Failed to discard checkpoints of {conversation_id}: {e}")
+    
+    def get_claude_session_id(self, conversation_id: str) -> Optional[str]:
+        """Get the Claude Code session ID last used by a conversation."""
+        workspace_info = self.active_workspaces.get(conversation_id)
+        return workspace_info.get("claude_session_id") if workspace_info else None
+    
+    def set_claude_session_id(self, conversation_id: str, session_id: Optional[str]) -> None:
+        """
+        Remember the Claude Code session ID of a conversation so later turns,
+        including after a restart, can resume it.
+        
+        Args:
+            conversation_id: The conversation ID
+            session_id: Session ID from the last ResultMessage, None to forget it
+        """
+        workspace_info = self.active_workspaces.get(conversation_id)
+        if workspace_info is None or workspace_info.get("claude_session_id") == session_id:
+            return
+        workspace_info["claude_session_id"] = session_id
+        self.registry.record(conversation_id, workspace_info)
+    
     def cleanup_old_workspaces(self, max_age_hours: int = 24) -> int:
         """
-        Clean up old conversation workspaces.
+        Clean up conversation workspaces that have not been accessed recently.
+        
+        Uses the tracked last-access time (nested changes do not update the
+        directory mtime) and moves workspaces to the trash area; the eviction
+        service deletes them in the background.
         
         Args:
-            max_age_hours: Maximum age in hours before workspace is cleaned up
+            max_age_hours: Maximum idle time in hours before workspace is cleaned up
             
         Returns:
             cleaned_count: Number of workspaces cleaned up
         """
         cleaned_count = 0
-        current_time = time.time()
-        cutoff_time = current_time - (max_age_hours * 3600)
+        cutoff_time = time.time() - (max_age_hours * 3600)
         
-        for conversation_id in list(self.active_workspaces.keys()):
-            workspace_info = self.active_workspaces[conversation_id]
-            workspace_path = Path(workspace_info["path"])
-            
-            # Check if workspace is old enough to clean up
-            if workspace_path.exists():
-                last_modified = workspace_path.stat().st_mtime
-                if last_modified < cutoff_time:
-                    try:
-                        shutil.rmtree(workspace_path)
-                        del self.active_workspaces[conversation_id]
-                        cleaned_count += 1
-                        logger.info(f"Cleaned up old workspace: {conversation_id}")
-                    except Exception as e:
-                        logger.error(f"Failed to cleanup workspace {conversation_id}: {e}")
+        for conversation_id, workspace_info in list(self.active_workspaces.items()):
+            try:
+                last_accessed = datetime.fromisoformat(workspace_info["last_accessed"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            if last_accessed < cutoff_time and self.evict_workspace(conversation_id) is not None:
+                cleaned_count += 1
+                logger.info(f"Cleaned up old workspace: {conversation_id}")
         
         return cleaned_count
     
+    def _get_ledger(self, conversation_id: str, path: Path) -> WorkspaceLedger:
+        """Get the stats ledger of a workspace, building it with one walk if needed."""
+        with self._ledgers_lock:
+            ledger = self._ledgers.get(conversation_id)
+            if ledger is None:
+                ledger = WorkspaceLedger(path)
+                self._ledgers[conversation_id] = ledger
+                ledger.build()
+        return ledger
+    
     def get_workspace_stats(self, conversation_id: str) -> Optional[Dict]:
         """
         Get statistics about a conversation workspace.
         
+        Reads running totals from the workspace ledger, so the cost does not
+        depend on the size of the tree. Use refresh_workspace_stats to pick up
+        changes that were not reported through file-change events.
+        
         Args:
             conversation_id: The conversation ID
             
@@ -268,21 +748,95 @@ This workspace is isolated from other conversations.
             return None
         
         path = Path(workspace_path)
-        if not path.exists():
-            return None
+        ledger = self._ledgers.get(conversation_id)
+        if ledger is None:
+            if not path.exists():
+                return None
+            ledger = self._get_ledger(conversation_id, path)
         
         stats = {
             "conversation_id": conversation_id,
             "path": workspace_path,
-            "size_bytes": sum(f.stat().st_size for f in path.rglob("*") if f.is_file()),
-            "file_count": len([f for f in path.rglob("*") if f.is_file()]),
-            "folder_count": len([f for f in path.rglob("*") if f.is_dir()]),
+            **ledger.snapshot(),
             "created_at": self.active_workspaces[conversation_id]["created_at"],
             "last_accessed": self.active_workspaces[conversation_id]["last_accessed"]
         }
         
         return stats
     
+    def refresh_workspace_stats(self, conversation_id: str) -> Optional[Dict]:
+        """
+        Bring the workspace ledger up to date and return the statistics.
+        
+        Only directories whose mtime changed are rescanned, so this is cheap
+        compared to a full walk. Blocking; call it off the event loop.
+        
+        Args:
+            conversation_id: The conversation ID
+            
+        Returns:
+            stats: Workspace statistics, None if workspace not found
+        """
+        workspace_path = self.get_workspace_path(conversation_id)
+        if not workspace_path or not Path(workspace_path).exists():
+            return None
+        
+        ledger = self._ledgers.get(conversation_id)
+        if ledger is None:
+            self._get_ledger(conversation_id, Path(workspace_path))
+        else:
+            ledger.refresh()
+        
+        stats = self.get_workspace_stats(conversation_id)
+        if stats is not None:
+            self.active_workspaces[conversation_id]["file_count"] = stats["file_count"]
+            self.active_workspaces[conversation_id]["size_bytes"] = stats["size_bytes"]
+            self.registry.record(conversation_id, self.active_workspaces[conversation_id])
+        return stats
+    
+    def schedule_stats_refresh(self, conversation_id: str) -> None:
+        """Refresh the workspace ledger in the background, coalescing repeated calls."""
+        pending = self._stats_refreshes.get(conversation_id)
+        if pending is not None and not pending.done():
+            return
+        task = asyncio.create_task(asyncio.to_thread(self.refresh_workspace_stats, conversation_id))
+        self._stats_refreshes[conversation_id] = task
+        task.add_done_callback(lambda _: self._stats_refreshes.pop(conversation_id, None))
+    
+    def record_file_event(
+        self,
+        event_type: str,
+        src_path: str,
+        is_directory: bool,
+        dest_path: Optional[str] = None,
+    ) -> None:
+        """
+        Apply a file-change event to the ledger of the workspace it belongs to.
+        
+        Args:
+            event_type: Watchdog event type (created, modified, deleted, moved)
+            src_path: Path the event refers to
+            is_directory: Whether the path is a directory
+            dest_path: Destination for moved events
+        """
+        if event_type not in ("created", "modified", "deleted", "moved"):
+            return
+        try:
+            relative = Path(src_path).relative_to(self.base_dir)
+        except ValueError:
+            return
+        parts = relative.parts
+        if len(parts) > SHARD_DEPTH and all(self._is_shard_name(p) for p in parts[:SHARD_DEPTH]):
+            conversation_id = parts[SHARD_DEPTH]
+        elif parts:
+            # Legacy flat layout
+            conversation_id = parts[0]
+        else:
+            return
+        ledger = self._ledgers.get(conversation_id)
+        if ledger is not None:
+            ledger.apply_event(event_type, src_path, is_directory, dest_path)
+    
     def list_active_workspaces(self) -> Dict[str, Dict]:
         """
         List all active conversation workspaces.
@@ -291,6 +845,47 @@ This workspace is isolated from other conversations.
             workspaces: Dictionary of conversation_id -> workspace_info
         """
         return self.active_workspaces.copy()
+    
+    def get_metrics(self) -> Dict:
+        """
+        Get metrics for the workspace subsystems.
+        
+        Returns:
+            metrics: Workspace counts plus per-subsystem statistics
+        """
+        return {
+            "active_workspaces": len(self.active_workspaces),
+            "template_store": template_store.get_stats(),
+            "pool": self.pool.get_stats(),
+            "registry": self.registry.get_stats(),
+            "eviction": self.evictor.get_stats(),
+            "archive": self.archiver.get_stats(),
+            "dedup": self.deduplicator.get_stats(),
+            "checkpoints": self.checkpoints.get_stats(),
+            "archived_workspaces": sum(
+                1 for info in self.active_workspaces.values() if info.get("archived")
+            ),
+            "in_use": len(self._in_use),
+            "provisioning": {
+                **self.provisioning_stats,
+                "lock_wait_seconds": round(self.provisioning_stats["lock_wait_seconds"], 3),
+                "in_flight": len(self._provisioning),
+            },
+        }
+    
+    def start_background_tasks(self) -> None:
+        """Start the workspace background services (pool refill, registry flush, eviction, dedup)."""
+        self.pool.start()
+        self.registry.start()
+        self.evictor.start()
+        self.deduplicator.start()
+    
+    async def stop_background_tasks(self) -> None:
+        """Stop the workspace background services."""
+        await self.deduplicator.stop()
+        await self.evictor.stop()
+        await self.pool.stop()
+        await self.registry.stop()
 
 
 # Global workspace manager instance
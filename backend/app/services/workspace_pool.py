@@ -0,0 +1,233 @@
+"""
+Warm Workspace Pool
+
+Keeps a configurable number of fully built, anonymous workspaces ready under
+``<workspaces>/.pool/`` so a new conversation can claim one with a single
+atomic rename instead of provisioning its tree and template inside the request.
+A background task refills the pool after every claim.
+"""
+
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+from loguru import logger
+
+POOL_DIR_NAME = ".pool"
+BUILDING_DIR_NAME = ".building"
+
+
+def _build_dir_is_stale(name: str) -> bool:
+    """Whether a build directory belongs to this process or to a dead one."""
+    _, _, suffix = name.partition("-")
+    if not suffix.isdigit():
+        # Unsuffixed directory from before builds were scoped per process
+        return True
+    pid = int(suffix)
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class WorkspacePool:
+    """Pool of pre-provisioned anonymous workspaces."""
+
+    def __init__(
+        self,
+        pool_dir: Path,
+        build: Callable[[Path], Optional[str]],
+        target_size: int,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            pool_dir: Directory holding ready workspaces. Must be on the same
+                      filesystem as the workspaces so claiming is a rename.
+            build: Function building a workspace tree at the given path and
+                   returning the template version it set up (None on failure).
+            target_size: Number of ready workspaces to keep. 0 disables the pool.
+        """
+        self.pool_dir = pool_dir
+        # Per-process so sibling workers never drop each other's in-flight builds
+        self.building_dir = pool_dir / f"{BUILDING_DIR_NAME}-{os.getpid()}"
+        self.build = build
+        self.target_size = target_size
+
+        self._ready: Deque[str] = deque()
+        self._versions: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refill_needed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {
+            "hits": 0,
+            "misses": 0,
+            "refills": 0,
+            "refill_failures": 0,
+            "last_refill_seconds": None,
+            "total_refill_seconds": 0.0,
+        }
+
+    def _load_existing(self) -> None:
+        """Adopt ready workspaces left over from a previous run."""
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            adopted = set(self._ready)
+        for entry in os.scandir(self.pool_dir):
+            if entry.is_dir() and entry.name.startswith(BUILDING_DIR_NAME):
+                # Half-built entries are never renamed into the pool, drop
+                # those of this process and of processes that are gone
+                if _build_dir_is_stale(entry.name):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            elif entry.is_dir() and not entry.name.startswith(".") and entry.name not in adopted:
+                with self._lock:
+                    self._ready.append(entry.name)
+                    self._versions[entry.name] = None
+        if self._ready:
+            logger.info(f"Workspace pool adopted {len(self._ready)} ready workspaces")
+
+    @property
+    def size(self) -> int:
+        """Number of ready workspaces in the pool."""
+        return len(self._ready)
+
+    def claim(self, dest: Path) -> Optional[Dict[str, Any]]:
+        """
+        Claim a ready workspace by renaming it to ``dest``.
+
+        Args:
+            dest: Final workspace path, must not exist
+
+        Returns:
+            info: Build info of the claimed workspace, None on a pool miss
+        """
+        if self.target_size <= 0:
+            return None
+
+        while True:
+            with self._lock:
+                if not self._ready:
+                    self.stats["misses"] += 1
+                    self._signal_refill()
+                    return None
+                name = self._ready.popleft()
+                version = self._versions.pop(name, None)
+
+            try:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(self.pool_dir / name, dest)
+            except OSError as e:
+                logger.warning(f"Could not claim pooled workspace {name}: {e}")
+                shutil.rmtree(self.pool_dir / name, ignore_errors=True)
+                continue
+
+            with self._lock:
+                self.stats["hits"] += 1
+            self._signal_refill()
+            return {"mcp_template_version": version}
+
+    def fill_one(self) -> bool:
+        """
+        Build one workspace and add it to the pool.
+
+        Returns:
+            success: True if a workspace was added
+        """
+        name = f"pool_{uuid.uuid4().hex[:12]}"
+        building_path = self.building_dir / name
+        started = time.perf_counter()
+        try:
+            self.building_dir.mkdir(parents=True, exist_ok=True)
+            version = self.build(building_path)
+            if version is None:
+                raise RuntimeError("template setup failed")
+            # Only fully built workspaces become visible in the pool
+            os.rename(building_path, self.pool_dir / name)
+        except Exception as e:
+            shutil.rmtree(building_path, ignore_errors=True)
+            with self._lock:
+                self.stats["refill_failures"] += 1
+            logger.error(f"Failed to pre-provision workspace: {e}")
+            return False
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._ready.append(name)
+            self._versions[name] = version
+            self.stats["refills"] += 1
+            self.stats["last_refill_seconds"] = round(elapsed, 3)
+            self.stats["total_refill_seconds"] += elapsed
+        return True
+
+    def _signal_refill(self) -> None:
+        if self._loop is not None and self._refill_needed is not None:
+            self._loop.call_soon_threadsafe(self._refill_needed.set)
+
+    async def _refill_loop(self, refill_needed: asyncio.Event) -> None:
+        while True:
+            while self.size < self.target_size:
+                if not await asyncio.to_thread(self.fill_one):
+                    # Back off instead of spinning on a broken template
+                    await asyncio.sleep(30)
+            await refill_needed.wait()
+            refill_needed.clear()
+
+    def start(self) -> None:
+        """Adopt workspaces left over from a previous run and start the background refill task."""
+        if self.target_size <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._load_existing()
+        self._loop = asyncio.get_running_loop()
+        self._refill_needed = asyncio.Event()
+        self._task = asyncio.create_task(self._refill_loop(self._refill_needed))
+        logger.info(f"Workspace pool refilling to {self.target_size} ready workspaces")
+
+    async def stop(self) -> None:
+        """Stop the background refill task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+        self._refill_needed = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics.
+
+        Returns:
+            stats: Pool size, hit/miss counters and refill latency
+        """
+        with self._lock:
+            refills = self.stats["refills"]
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "size": len(self._ready),
+                "target_size": self.target_size,
+                "hits": self.stats["hits"],
+                "misses": self.stats["misses"],
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+                "refills": refills,
+                "refill_failures": self.stats["refill_failures"],
+                "last_refill_seconds": self.stats["last_refill_seconds"],
+                "avg_refill_seconds": (
+                    round(self.stats["total_refill_seconds"] / refills, 3) if refills else None
+                ),
+            }
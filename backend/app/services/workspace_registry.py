@@ -0,0 +1,218 @@
+"""
+Workspace Registry
+
+Durable record of conversation workspaces so a restarted worker knows every
+workspace without walking the filesystem. Entries are loaded in bulk at startup
+and updates are buffered in memory and written in batches by a background task.
+
+The registry lives in a local SQLite file next to the workspaces rather than in
+the application database: the Postgres schema is owned by Prisma, and this data
+only describes files on this host's disk.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+
+REGISTRY_FILE_NAME = ".registry.sqlite3"
+
+# Keys stored in their own columns, anything else goes to the JSON "extra" column
+_COLUMNS = (
+    "path",
+    "created_at",
+    "last_accessed",
+    "size_bytes",
+    "file_count",
+    "mcp_template_setup",
+    "mcp_template_version",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    conversation_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    created_at TEXT,
+    last_accessed TEXT,
+    size_bytes INTEGER,
+    file_count INTEGER,
+    mcp_template_setup INTEGER,
+    mcp_template_version TEXT,
+    extra TEXT
+)
+"""
+
+_UPSERT = f"""
+INSERT INTO workspaces (conversation_id, {", ".join(_COLUMNS)}, extra)
+VALUES ({", ".join("?" * (len(_COLUMNS) + 2))})
+ON CONFLICT(conversation_id) DO UPDATE SET
+    {", ".join(f"{c} = excluded.{c}" for c in _COLUMNS)},
+    extra = excluded.extra
+"""
+
+
+class WorkspaceRegistry:
+    """SQLite-backed registry of workspaces with write-behind batching."""
+
+    def __init__(self, db_path: Path, flush_interval_seconds: float = 2.0):
+        """
+        Initialize the registry. The database is not touched until open().
+
+        Args:
+            db_path: SQLite database file
+            flush_interval_seconds: How often buffered updates are written
+        """
+        self.db_path = db_path
+        self.flush_interval_seconds = flush_interval_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_deletes: Set[str] = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+        self.stats: Dict[str, Any] = {
+            "loaded": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_deleted": 0,
+            "last_flush_seconds": None,
+        }
+
+    def open(self) -> sqlite3.Connection:
+        """Open (or create) the database. Blocking; does nothing if already open."""
+        with self._db_lock:
+            if self._conn is None:
+                conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(_SCHEMA)
+                conn.commit()
+                self._conn = conn
+            return self._conn
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Load every registered workspace in one query, opening the database if needed.
+
+        Returns:
+            workspaces: Dictionary of conversation_id -> workspace_info
+        """
+        conn = self.open()
+        with self._db_lock:
+            rows = conn.execute(
+                f"SELECT conversation_id, {', '.join(_COLUMNS)}, extra FROM workspaces"
+            ).fetchall()
+
+        workspaces: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            info: Dict[str, Any] = dict(zip(_COLUMNS, row[1:-1], strict=True))
+            info["mcp_template_setup"] = bool(info["mcp_template_setup"])
+            if row[-1]:
+                info.update(json.loads(row[-1]))
+            workspaces[row[0]] = info
+
+        self.stats["loaded"] = len(workspaces)
+        logger.info(f"Workspace registry loaded {len(workspaces)} workspaces from {self.db_path}")
+        return workspaces
+
+    def record(self, conversation_id: str, info: Dict[str, Any]) -> None:
+        """Buffer the latest state of a workspace for the next flush."""
+        with self._lock:
+            self._pending[conversation_id] = dict(info)
+            self._pending_deletes.discard(conversation_id)
+
+    def remove(self, conversation_id: str) -> None:
+        """Buffer the removal of a workspace for the next flush."""
+        with self._lock:
+            self._pending.pop(conversation_id, None)
+            self._pending_deletes.add(conversation_id)
+
+    def flush(self) -> int:
+        """
+        Write all buffered updates in a single transaction. Blocking.
+
+        Updates stay buffered until the registry has been opened.
+
+        Returns:
+            written: Number of rows upserted or deleted
+        """
+        conn = self._conn
+        if conn is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            deletes, self._pending_deletes = self._pending_deletes, set()
+        if not pending and not deletes:
+            return 0
+
+        rows = []
+        for conversation_id, info in pending.items():
+            extra = {k: v for k, v in info.items() if k not in _COLUMNS}
+            rows.append((
+                conversation_id,
+                *(info.get(c) for c in _COLUMNS),
+                json.dumps(extra) if extra else None,
+            ))
+
+        started = time.perf_counter()
+        try:
+            with self._db_lock, conn:
+                if rows:
+                    conn.executemany(_UPSERT, rows)
+                if deletes:
+                    conn.executemany(
+                        "DELETE FROM workspaces WHERE conversation_id = ?",
+                        [(d,) for d in deletes],
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Workspace registry flush failed: {e}")
+            # Put the batch back, newer updates win
+            with self._lock:
+                for conversation_id, info in pending.items():
+                    self._pending.setdefault(conversation_id, info)
+                self._pending_deletes |= deletes - set(self._pending)
+            return 0
+
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+        self.stats["rows_deleted"] += len(deletes)
+        self.stats["last_flush_seconds"] = round(time.perf_counter() - started, 4)
+        return len(rows) + len(deletes)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        """Start the background flush task."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the background flush task and write what is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get registry statistics.
+
+        Returns:
+            stats: Load, flush and pending-write counters
+        """
+        with self._lock:
+            pending = len(self._pending) + len(self._pending_deletes)
+        return {**self.stats, "pending": pending}
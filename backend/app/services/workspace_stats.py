@@ -0,0 +1,257 @@
+"""
+Workspace Statistics Ledger
+
+Keeps the byte size, file count and folder count of a workspace as running
+totals so lookups are O(1) regardless of tree size. The ledger is built once
+with a single ``os.scandir`` walk and then kept current incrementally: from
+file-change events when a watcher is running, and from cheap directory mtime
+checks otherwise. Only directories whose mtime moved are rescanned.
+
+Dependency files shared through the content store count zero bytes here: their
+storage is accounted to the store once, not to every workspace linking them.
+"""
+
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from app.services.workspace_dedup import is_shared
+
+# Subtrees that only change by entries being added, removed or replaced (which
+# bumps the directory mtime). Files elsewhere are also re-stat'ed on refresh to
+# catch in-place edits, which leave the directory mtime untouched.
+STABLE_DIR_NAMES = {"node_modules", ".git", ".venv", "__pycache__"}
+
+
+def _own_size(path: str, st: os.stat_result, stable: bool) -> int:
+    """Bytes a file takes in its workspace; deduplicated files only live in stable subtrees."""
+    if stable and is_shared(path, st):
+        return 0
+    return st.st_size
+
+
+class _DirRecord:
+    """Direct children of one directory as last seen."""
+
+    __slots__ = ("mtime_ns", "files", "subdirs", "stable")
+
+    def __init__(self, mtime_ns: int, stable: bool):
+        self.mtime_ns = mtime_ns
+        self.files: Dict[str, int] = {}
+        self.subdirs: Set[str] = set()
+        self.stable = stable
+
+
+class WorkspaceLedger:
+    """Incrementally maintained size and count totals for one workspace."""
+
+    def __init__(self, root: Path):
+        """
+        Initialize an empty ledger.
+
+        Args:
+            root: Workspace root directory
+        """
+        self.root = str(root)
+        self.size_bytes = 0
+        self.file_count = 0
+        self.folder_count = 0
+        self.updated_at: Optional[str] = None
+        self._dirs: Dict[str, _DirRecord] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> None:
+        """Build the ledger from scratch with a single scandir walk."""
+        with self._lock:
+            self._dirs.clear()
+            self.size_bytes = self.file_count = self.folder_count = 0
+            self._scan_subtree(self.root, stable=False)
+            self._touch()
+
+    def _touch(self) -> None:
+        self.updated_at = datetime.now().isoformat()
+
+    def _scan_dir(self, path: str, stable: bool) -> Optional[_DirRecord]:
+        try:
+            # Stat before listing so a change during the scan is seen next time
+            record = _DirRecord(os.stat(path).st_mtime_ns, stable)
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            record.subdirs.add(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            record.files[entry.name] = _own_size(
+                                entry.path, entry.stat(follow_symlinks=False), stable,
+                            )
+                    except FileNotFoundError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+        return record
+
+    def _add(self, path: str, record: _DirRecord) -> None:
+        self._dirs[path] = record
+        self.size_bytes += sum(record.files.values())
+        self.file_count += len(record.files)
+        if path != self.root:
+            self.folder_count += 1
+
+    def _scan_subtree(self, path: str, stable: bool) -> None:
+        stack = [(path, stable)]
+        while stack:
+            current, current_stable = stack.pop()
+            record = self._scan_dir(current, current_stable)
+            if record is None:
+                continue
+            self._add(current, record)
+            for name in record.subdirs:
+                stack.append((
+                    os.path.join(current, name),
+                    current_stable or name in STABLE_DIR_NAMES,
+                ))
+
+    def _remove_subtree(self, path: str) -> None:
+        prefix = path + os.sep
+        for tracked in [p for p in self._dirs if p == path or p.startswith(prefix)]:
+            record = self._dirs.pop(tracked)
+            self.size_bytes -= sum(record.files.values())
+            self.file_count -= len(record.files)
+            if tracked != self.root:
+                self.folder_count -= 1
+
+    def _rescan_dir(self, path: str, record: _DirRecord) -> None:
+        fresh = self._scan_dir(path, record.stable)
+        if fresh is None:
+            self._remove_subtree(path)
+            return
+
+        self.size_bytes += sum(fresh.files.values()) - sum(record.files.values())
+        self.file_count += len(fresh.files) - len(record.files)
+        for name in record.subdirs - fresh.subdirs:
+            self._remove_subtree(os.path.join(path, name))
+        for name in fresh.subdirs - record.subdirs:
+            self._scan_subtree(
+                os.path.join(path, name), record.stable or name in STABLE_DIR_NAMES,
+            )
+        self._dirs[path] = fresh
+
+    def _restat_files(self, path: str, record: _DirRecord) -> None:
+        for name, size in list(record.files.items()):
+            try:
+                new_size = os.stat(os.path.join(path, name), follow_symlinks=False).st_size
+            except FileNotFoundError:
+                continue
+            if new_size != size:
+                record.files[name] = new_size
+                self.size_bytes += new_size - size
+
+    def refresh(self) -> int:
+        """
+        Bring the ledger up to date using directory mtime checks.
+
+        Directories whose mtime changed are rescanned (and new subtrees walked);
+        files outside stable subtrees are re-stat'ed to catch in-place edits.
+
+        Returns:
+            changed: Number of directories that were rescanned
+        """
+        changed = 0
+        with self._lock:
+            for path in list(self._dirs):
+                # Re-read: a parent handled earlier in this pass may have
+                # dropped or replaced this record
+                record = self._dirs.get(path)
+                if record is None:
+                    continue
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    self._remove_subtree(path)
+                    changed += 1
+                    continue
+                if mtime_ns != record.mtime_ns:
+                    self._rescan_dir(path, record)
+                    changed += 1
+                elif not record.stable:
+                    self._restat_files(path, record)
+            self._touch()
+        return changed
+
+    def apply_event(
+        self,
+        event_type: str,
+        src_path: str,
+        is_directory: bool,
+        dest_path: Optional[str] = None,
+    ) -> None:
+        """
+        Apply a single file-change event (watchdog event types).
+
+        Args:
+            event_type: created, modified, deleted, moved or closed
+            src_path: Path the event refers to
+            is_directory: Whether the path is a directory
+            dest_path: Destination for moved events
+        """
+        with self._lock:
+            if event_type == "moved":
+                self._forget(src_path, is_directory)
+                if dest_path:
+                    self._observe(dest_path, is_directory)
+            elif event_type == "deleted":
+                self._forget(src_path, is_directory)
+            else:
+                self._observe(src_path, is_directory)
+            self._touch()
+
+    def _observe(self, path: str, is_directory: bool) -> None:
+        parent, name = os.path.split(path)
+        record = self._dirs.get(parent)
+        if record is None:
+            return
+        if is_directory:
+            existing = self._dirs.get(path)
+            if existing is not None:
+                self._rescan_dir(path, existing)
+            else:
+                record.subdirs.add(name)
+                self._scan_subtree(path, record.stable or name in STABLE_DIR_NAMES)
+            return
+        try:
+            size = _own_size(path, os.stat(path, follow_symlinks=False), record.stable)
+        except FileNotFoundError:
+            return
+        previous = record.files.get(name)
+        record.files[name] = size
+        self.size_bytes += size - (previous or 0)
+        if previous is None:
+            self.file_count += 1
+
+    def _forget(self, path: str, is_directory: bool) -> None:
+        parent, name = os.path.split(path)
+        record = self._dirs.get(parent)
+        if is_directory or path in self._dirs:
+            if record is not None:
+                record.subdirs.discard(name)
+            self._remove_subtree(path)
+            return
+        if record is not None and name in record.files:
+            self.size_bytes -= record.files.pop(name)
+            self.file_count -= 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Get the current totals. O(1).
+
+        Returns:
+            totals: size_bytes, file_count, folder_count and stats_updated_at
+        """
+        return {
+            "size_bytes": self.size_bytes,
+            "file_count": self.file_count,
+            "folder_count": self.folder_count,
+            "stats_updated_at": self.updated_at,
+        }
@@ -0,0 +1,57 @@
+"""Integration tests for resumable Claude streams.
+
+Replaces the Claude service with a scripted stream to verify that events
+carry IDs and that a reconnect with ``Last-Event-ID`` replays only the missed
+events without starting another generation.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+from httpx import AsyncClient
+
+import app.api.routes.claude as claude_routes
+from app.core.config import settings
+from app.services.claude_events import ClaudeEvent, Content, TurnDone
+
+
+def _events(body: str) -> List[Dict[str, Any]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if ": " in line)
+        events.append({"id": fields.get("id"), **json.loads(fields["data"])})
+    return events
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_missed_events(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that Last-Event-ID resumes the same turn instead of running a new one."""
+    generations: List[str] = []
+
+    async def scripted_stream(request: Any) -> AsyncIterator[ClaudeEvent]:
+        generations.append(request.prompt)
+        for i in range(3):
+            yield Content(f"part {i}", i)
+        yield TurnDone("part 0 part 1 part 2", request.conversation_id)
+
+    monkeypatch.setattr(claude_routes.claude_service, "generate_stream", scripted_stream)
+    body = {"prompt": "hello", "conversation_id": "resumable"}
+
+    first = await client.post(f"{settings.API_V1_STR}/claude/stream", json=body)
+    events = _events(first.text)
+    assert [e["type"] for e in events] == ["content", "content", "content", "complete", "done"]
+    assert all(e["id"] for e in events)
+
+    # The client only saw the first event before its connection dropped
+    resumed = await client.post(
+        f"{settings.API_V1_STR}/claude/stream", json=body, headers={"Last-Event-ID": events[0]["id"]},
+    )
+    assert [e["id"] for e in _events(resumed.text)] == [e["id"] for e in events[1:]]
+
+    observed = await client.get(f"{settings.API_V1_STR}/claude/stream/resumable")
+    assert len(_events(observed.text)) == len(events)
+    assert generations == ["hello"]
+
+    missing = await client.get(f"{settings.API_V1_STR}/claude/stream/unknown")
+    assert missing.status_code == 404
@@ -0,0 +1,4 @@
+"""Service layer tests package.
+
+Contains unit tests for the workspace and Claude service subsystems.
+"""
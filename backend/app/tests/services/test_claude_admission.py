@@ -0,0 +1,76 @@
+"""Tests for Claude turn admission control.
+
+Verifies that slots are granted in arrival order, that turns of the same
+conversation run one at a time, and that overload is rejected with a
+Retry-After estimate.
+"""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from app.services.claude_admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_waiting_turns_are_admitted_in_order() -> None:
+    """Test that queued turns get freed slots first come, first served."""
+    controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout_seconds=5)
+    order: List[str] = []
+    first = await controller.acquire("a")
+
+    async def turn(name: str) -> None:
+        async with controller.admit(name):
+            order.append(name)
+
+    waiting = [asyncio.create_task(turn(name)) for name in ("b", "c", "d")]
+    await asyncio.sleep(0.01)
+    assert controller.get_stats()["queue_depth"] == 3
+
+    first.release()
+    await asyncio.gather(*waiting)
+
+    assert order == ["b", "c", "d"]
+    stats = controller.get_stats()
+    assert stats["admitted"] == 4
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_same_conversation_is_serialized() -> None:
+    """Test that a follow-up waits for the running turn even with free slots."""
+    controller = AdmissionController(max_concurrent=4, max_queue=5, queue_timeout_seconds=5)
+    running = await controller.acquire("conv")
+
+    follow_up = asyncio.create_task(controller.acquire("conv"))
+    other = await controller.acquire("other")
+    await asyncio.sleep(0.01)
+    assert not follow_up.done()
+
+    running.release()
+    (await follow_up).release()
+    other.release()
+    assert controller._conversation_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_overload_is_rejected_with_retry_after() -> None:
+    """Test that a full queue and an expired wait are rejected."""
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout_seconds=0.05)
+    held = await controller.acquire()
+
+    queued = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0.01)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.retry_after >= 1
+
+    with pytest.raises(AdmissionRejected) as timed_out:
+        await queued
+    assert timed_out.value.reason == "queue_timeout"
+
+    held.release()
+    assert controller.get_stats()["rejected"] == {"queue_full": 1, "queue_timeout": 1}
+    assert controller.get_stats()["active"] == 0
@@ -0,0 +1,153 @@
+"""Tests for carrying conversation context across turns.
+
+Uses an in-process client in place of the CLI subprocess to verify that the
+SDK session ID is recorded and resumed instead of replaying history text,
+and that a failed resume falls back to the text context. Also covers the
+optional text deltas of streamed turns.
+"""
+
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+from claude_code_sdk import ClaudeCodeOptions
+from claude_code_sdk.types import AssistantMessage, ResultMessage, TextBlock
+
+import app.services.claude as claude_module
+from app.services.claude import ClaudeService
+from app.services.claude_events import Content, ContentDelta, TurnDone
+from app.services.claude_sessions import ClaudeSessionManager
+from app.services.conversation_store import MemoryConversationStore, WriteBehindConversationStore
+from app.services.workspace_manager import ConversationWorkspaceManager
+
+
+class ResumingClient:
+    """Fake CLI that knows the sessions listed in ``known``."""
+
+    known = {"sdk-1"}
+    prompts: List[str] = []
+    resumed: List[Any] = []
+
+    def __init__(self, options: ClaudeCodeOptions):
+        self.options = options
+
+    async def connect(self) -> None:
+        ResumingClient.resumed.append(self.options.resume)
+
+    async def query(self, prompt: str) -> None:
+        ResumingClient.prompts.append(prompt)
+
+    async def receive_response(self) -> AsyncIterator[Any]:
+        if self.options.resume and self.options.resume not in self.known:
+            yield ResultMessage(
+                subtype="error_during_execution", duration_ms=1, duration_api_ms=1,
+                is_error=True, num_turns=0, session_id="",
+            )
+            return
+        yield AssistantMessage(content=[TextBlock(text="ok")], model="test")
+        yield ResultMessage(
+            subtype="success", duration_ms=1, duration_api_ms=1, is_error=False,
+            num_turns=1, session_id="sdk-1", usage={"input_tokens": 10, "output_tokens": 2},
+        )
+
+    async def disconnect(self) -> None:
+        pass
+
+
+@pytest.fixture
+def service(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ClaudeService:
+    ResumingClient.prompts = []
+    ResumingClient.resumed = []
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    manager.active_workspaces["conv"] = {"path": str(tmp_path)}
+    sessions = ClaudeSessionManager(
+        idle_ttl_seconds=60, max_sessions=4, max_rss_bytes=0, client_factory=ResumingClient,
+    )
+    monkeypatch.setattr(claude_module, "workspace_manager", manager)
+    monkeypatch.setattr(claude_module, "claude_session_manager", sessions)
+    monkeypatch.setattr(
+        claude_module, "conversation_store",
+        WriteBehindConversationStore(MemoryConversationStore(), flush_interval_seconds=1, batch_size=10),
+    )
+    return ClaudeService()
+
+
+async def _turn(service: ClaudeService, prompt: str) -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {}
+    async for _ in service._run_turn("conv", prompt, ClaudeCodeOptions(), metrics):
+        pass
+    await service.store_conversation_turn("conv", prompt, "ok")
+    return metrics
+
+
+@pytest.mark.asyncio
+async def test_new_process_resumes_instead_of_replaying(
+    service: ClaudeService, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that a restarted session resumes by ID and only sends the new prompt."""
+    built: List[str] = []
+    build_context = service.build_conversation_context
+
+    async def counting_build_context(conversation_id: str, prompt: str) -> str:
+        built.append(prompt)
+        return await build_context(conversation_id, prompt)
+
+    monkeypatch.setattr(service, "build_conversation_context", counting_build_context)
+    first = await _turn(service, "build a server")
+    assert first["mode"] == "text_context"
+    assert claude_module.workspace_manager.get_claude_session_id("conv") == "sdk-1"
+
+    # Simulate the live process going away (idle TTL, restart)
+    await claude_module.claude_session_manager.close_session("conv", "idle")
+    second = await _turn(service, "add a tool")
+
+    assert second["mode"] == "resumed"
+    assert ResumingClient.resumed[-1] == "sdk-1"
+    assert ResumingClient.prompts[-1] == "add a tool"
+    assert second["estimated_tokens_saved"] > 0
+    assert second["input_tokens"] == 10
+
+    third = await _turn(service, "and tests")
+    assert third["mode"] == "live"
+    # Only the turn without a session to carry it built the text history
+    assert built == ["build a server"]
+    assert service.get_context_stats()["turns_by_mode"] == {"live": 1, "resumed": 1, "text_context": 1}
+    await claude_module.claude_session_manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_resume_falls_back_to_text_context(service: ClaudeService) -> None:
+    """Test that an unknown session ID is dropped and the history is replayed."""
+    await service.store_conversation_turn("conv", "earlier question", "earlier answer")
+    claude_module.workspace_manager.set_claude_session_id("conv", "gone")
+
+    metrics = await _turn(service, "continue")
+
+    assert metrics["mode"] == "text_context"
+    assert "earlier question" in ResumingClient.prompts[-1]
+    assert service.get_context_stats()["resume_failures"] == 1
+    assert claude_module.workspace_manager.get_claude_session_id("conv") == "sdk-1"
+    await claude_module.claude_session_manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_deltas_and_whole_blocks(service: ClaudeService) -> None:
+    """Test that clients asking for deltas get them ahead of the whole-block event."""
+    request = claude_module.ClaudeRequest(prompt="hi", conversation_id="conv", stream_deltas=True)
+
+    events = [event async for event in service.execute_with_context("conv", request)]
+
+    types = [type(event) for event in events]
+    assert types.index(ContentDelta) < types.index(Content)
+    assert "".join(e.delta for e in events if isinstance(e, ContentDelta)) == "ok"
+    assert isinstance(events[-1], TurnDone)
+    assert events[-1].metrics["time_to_first_token_ms"] >= 0
+    assert service.get_stream_stats()["turns_with_text"] == 1
+
+    # Older clients get the stream they always did
+    request = claude_module.ClaudeRequest(prompt="again", conversation_id="conv")
+    events = [event async for event in service.execute_with_context("conv", request)]
+    assert not any(isinstance(event, ContentDelta) for event in events)
+    await claude_module.claude_session_manager.stop()
@@ -0,0 +1,59 @@
+"""Tests for Claude stream event encoding.
+
+Verifies that typed events encode to the payloads clients have always
+received, with or without orjson.
+"""
+
+import json
+
+import pytest
+
+import app.services.claude_events as claude_events
+from app.services.claude_events import (
+    Content,
+    ContentDelta,
+    MCPToolUse,
+    MessageInfo,
+    StreamEnd,
+    ToolUse,
+    TurnCancelled,
+    TurnDone,
+    TurnError,
+    encode_event,
+)
+
+EXPECTED = [
+    (MessageInfo("AssistantMessage"), {"type": "progress", "message_type": "AssistantMessage", "timestamp": 0}),
+    (Content("héllo", 1), {"type": "content", "content": "héllo", "block_index": 1}),
+    (ContentDelta("hé", 1), {"type": "content_delta", "delta": "hé", "block_index": 1}),
+    (ToolUse("Bash", 2), {"type": "tool_use", "tool_name": "Bash", "block_index": 2}),
+    (
+        MCPToolUse("mcp__firecrawl__scrape", "firecrawl", "scrape", 3),
+        {
+            "type": "mcp_tool_use",
+            "tool_name": "mcp__firecrawl__scrape",
+            "server_name": "firecrawl",
+            "tool_function": "scrape",
+            "block_index": 3,
+        },
+    ),
+    (
+        TurnDone("done", "conv", 1, {"mode": "live"}),
+        {"type": "complete", "final_content": "done", "conversation_id": "conv", "tools_used": 1, "metrics": {"mode": "live"}},
+    ),
+    (TurnError("boom", "api_error"), {"type": "error", "error": "boom", "error_type": "api_error"}),
+    (StreamEnd(), {"type": "done"}),
+    (TurnCancelled("request"), {"type": "cancelled", "reason": "request"}),
+]
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_events_encode_to_client_payloads(with_orjson: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that every event type encodes to its wire payload with either JSON backend."""
+    if not with_orjson:
+        monkeypatch.setattr(claude_events, "orjson", None)
+    elif claude_events.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    for event, payload in EXPECTED:
+        assert json.loads(encode_event(event)) == payload
@@ -0,0 +1,62 @@
+"""Tests for background Claude jobs.
+
+Replaces the Claude service with a scripted stream to verify that jobs run
+on the worker pool, record their result and timings, can be subscribed to
+while they run, and that a full queue rejects new jobs.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator
+
+import pytest
+
+import app.services.turn_events as turn_events
+from app.services.claude import ClaudeRequest
+from app.services.claude_events import ClaudeEvent, Content, TurnDone
+from app.services.claude_jobs import ClaudeJobManager, JobQueueFull
+
+
+@pytest.mark.asyncio
+async def test_job_runs_in_background_and_records_result(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a job finishes without a client and can be followed meanwhile."""
+    release = asyncio.Event()
+
+    async def scripted_stream(request: Any) -> AsyncIterator[ClaudeEvent]:
+        yield Content("working")
+        await release.wait()
+        yield TurnDone("finished", request.conversation_id)
+
+    monkeypatch.setattr(turn_events.claude_service, "generate_stream", scripted_stream)
+    jobs = ClaudeJobManager(workers=1, max_queued=1, retention_seconds=60)
+    jobs.start()
+    try:
+        job = jobs.submit(ClaudeRequest(prompt="hello"))
+        assert job.status == "queued" and job.conversation_id
+        await asyncio.sleep(0.01)
+        assert job.status == "running"
+
+        # One job runs, one waits, the next is rejected
+        second = jobs.submit(ClaudeRequest(prompt="again"))
+        with pytest.raises(JobQueueFull):
+            jobs.submit(ClaudeRequest(prompt="one too many"))
+
+        follower = asyncio.create_task(_collect(job.log))
+        release.set()
+        events = await follower
+        assert [e["type"] for e in events] == ["content", "complete", "done"]
+
+        await asyncio.sleep(0.01)
+        assert job.status == "succeeded" and job.result == "finished"
+        assert job.to_dict()["run_seconds"] is not None
+        assert second.status == "succeeded"
+        assert jobs.get(job.job_id) is job
+
+        stats = jobs.get_stats()
+        assert stats["succeeded"] == 2 and stats["rejected"] == 1 and stats["queued"] == 0
+    finally:
+        await jobs.stop()
+
+
+async def _collect(log: Any) -> list:
+    return [json.loads(data) async for _, data in log.follow()]
@@ -0,0 +1,34 @@
+"""Tests for keeping CLAUDE.md current without rewriting it every turn.
+
+Verifies that the rendered file keeps its content, that an up-to-date file
+is left alone, and that a stale or edited file is replaced.
+"""
+
+from pathlib import Path
+
+from app.services.claude import ClaudeMdWriter
+
+
+def test_claude_md_is_written_only_when_it_changes(tmp_path: Path) -> None:
+    """Test that repeated turns do not rewrite an unchanged CLAUDE.md."""
+    workspace = tmp_path / "conv"
+    workspace.mkdir()
+    writer = ClaudeMdWriter("Follow the MCP guidelines.")
+
+    assert writer.ensure(workspace) is True
+    content = (workspace / "CLAUDE.md").read_text()
+    assert content.startswith("# Claude MCP Development Assistant\n\nFollow the MCP guidelines.\n\n---")
+    assert "**Current Workspace:** `conv`" in content
+
+    assert writer.ensure(workspace) is False
+    assert writer.ensure(workspace) is False
+    assert writer.stats == {"written": 1, "unchanged": 2, "verified": 0}
+
+    # Another process (or a restart) verifies by content instead of rewriting
+    assert ClaudeMdWriter("Follow the MCP guidelines.").ensure(workspace) is False
+
+    # A new prompt version or a local edit is replaced
+    assert ClaudeMdWriter("Updated guidelines.").ensure(workspace) is True
+    (workspace / "CLAUDE.md").write_text("edited")
+    assert writer.ensure(workspace) is True
+    assert (workspace / "CLAUDE.md").read_text() == content
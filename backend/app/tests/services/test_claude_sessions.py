@@ -0,0 +1,135 @@
+"""Tests for long-lived Claude CLI sessions.
+
+Uses an in-process client in place of the CLI subprocess to verify that
+follow-up turns reuse one connection, that sessions are replaced when the
+options change, and that idle sessions are closed.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, List
+
+import pytest
+from claude_code_sdk import ClaudeCodeOptions
+from claude_code_sdk.types import AssistantMessage, ResultMessage, TextBlock
+
+from app.services.claude_sessions import ClaudeSessionManager
+
+
+class FakeClient:
+    """Answers each prompt with an echo and a result, like the CLI would."""
+
+    instances: List["FakeClient"] = []
+
+    def __init__(self, options: ClaudeCodeOptions):
+        self.options = options
+        self.prompts: List[str] = []
+        self.connected = False
+        FakeClient.instances.append(self)
+
+    async def connect(self) -> None:
+        # Yield like a real spawn, so concurrent acquires interleave
+        await asyncio.sleep(0)
+        self.connected = True
+
+    async def query(self, prompt: str) -> None:
+        self.prompts.append(prompt)
+
+    async def receive_response(self) -> AsyncIterator[Any]:
+        yield AssistantMessage(content=[TextBlock(text=f"echo: {self.prompts[-1]}")], model="test")
+        yield ResultMessage(
+            subtype="success", duration_ms=1, duration_api_ms=1, is_error=False,
+            num_turns=1, session_id="sdk-session",
+        )
+
+    async def disconnect(self) -> None:
+        self.connected = False
+
+
+@pytest.fixture
+def manager() -> ClaudeSessionManager:
+    FakeClient.instances = []
+    return ClaudeSessionManager(
+        idle_ttl_seconds=60, max_sessions=2, max_rss_bytes=0, client_factory=FakeClient,
+    )
+
+
+async def _turn(manager: ClaudeSessionManager, conversation_id: str, prompt: str, options: ClaudeCodeOptions) -> bool:
+    session, created = await manager.acquire(conversation_id, options)
+    messages = [m async for m in session.send(prompt)]
+    await manager.release(session)
+    assert isinstance(messages[-1], ResultMessage)
+    return created
+
+
+@pytest.mark.asyncio
+async def test_follow_up_turns_reuse_the_process(manager: ClaudeSessionManager) -> None:
+    """Test that a second turn goes over the same client."""
+    options = ClaudeCodeOptions(cwd="/tmp/ws")
+
+    assert await _turn(manager, "conv", "first", options) is True
+    assert await _turn(manager, "conv", "second", options) is False
+
+    assert len(FakeClient.instances) == 1
+    assert FakeClient.instances[0].prompts == ["first", "second"]
+    stats = manager.get_stats()
+    assert stats["sessions_created"] == 1
+    assert stats["reused_turns"] == 1
+    await manager.stop()
+    assert not FakeClient.instances[0].connected
+
+
+@pytest.mark.asyncio
+async def test_changed_options_and_capacity_replace_sessions(manager: ClaudeSessionManager) -> None:
+    """Test that new options restart the session and the session limit evicts the oldest."""
+    await _turn(manager, "conv", "hi", ClaudeCodeOptions(cwd="/tmp/ws"))
+    # MCP servers switching transport (supervisor health flips) keep the session
+    stdio = {"firecrawl": {"command": "npx", "args": ["firecrawl-mcp"]}}
+    assert await _turn(manager, "conv", "hi", ClaudeCodeOptions(cwd="/tmp/ws", mcp_servers=stdio)) is False
+    await _turn(manager, "conv", "hi", ClaudeCodeOptions(cwd="/tmp/ws", max_turns=5))
+    assert manager.get_stats()["closed_by_reason"]["options"] == 1
+
+    await _turn(manager, "other", "hi", ClaudeCodeOptions())
+    await _turn(manager, "third", "hi", ClaudeCodeOptions())
+    stats = manager.get_stats()
+    assert stats["active_sessions"] == 2
+    assert stats["closed_by_reason"]["capacity"] == 1
+    assert not manager.has_session("conv")
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_idle_sessions_are_closed(manager: ClaudeSessionManager) -> None:
+    """Test that the reaper closes sessions idle past the TTL."""
+    await _turn(manager, "conv", "hi", ClaudeCodeOptions())
+    manager.idle_ttl_seconds = 0
+
+    assert await manager.close_idle() == 1
+    assert not manager.has_session("conv")
+    assert not FakeClient.instances[0].connected
+    assert manager.get_stats()["closed_by_reason"]["idle"] == 1
+    await manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_acquired_sessions_are_leased_and_capped(manager: ClaudeSessionManager) -> None:
+    """Test that a leased session is never reaped and concurrent spawns respect the limit."""
+    held, _ = await manager.acquire("held", ClaudeCodeOptions())
+    manager.idle_ttl_seconds = 0
+    assert held.busy
+    assert await manager.close_idle() == 0
+    await manager.release(held)
+    assert not held.busy
+
+    first, second = await asyncio.gather(
+        manager.acquire("first", ClaudeCodeOptions()),
+        manager.acquire("second", ClaudeCodeOptions()),
+    )
+    stats = manager.get_stats()
+    assert stats["active_sessions"] == 2
+    assert stats["closed_by_reason"]["capacity"] == 1
+    assert not manager.has_session("held")
+    assert await manager.close_idle() == 0
+
+    await manager.release(first[0])
+    await manager.release(second[0])
+    await manager.stop()
@@ -0,0 +1,57 @@
+"""Tests for the bounded conversation cache.
+
+Verifies that conversations outside the hot set are kept compressed and come
+back intact, and that the entry and byte caps evict the least recently used
+conversations.
+"""
+
+from app.services.conversation_cache import ConversationCache
+from app.services.conversation_history import ConversationRecord, HistoryTurn
+
+
+def _record(text: str, turns: int = 5) -> ConversationRecord:
+    return ConversationRecord(turns=[HistoryTurn(f"{text} {i}", text * 50) for i in range(turns)])
+
+
+def _cache(max_entries: int = 100, max_bytes: int = 10**9, hot_entries: int = 1) -> ConversationCache:
+    return ConversationCache(ConversationRecord.from_bytes, max_entries, max_bytes, hot_entries)
+
+
+def test_cold_conversations_are_compressed_and_restored() -> None:
+    """Test that a conversation outside the hot set shrinks and is returned unchanged."""
+    cache = _cache(hot_entries=1)
+    original = _record("hello world")
+    cache.put("a", original)
+    size_hot = cache.get_stats()["resident_bytes"]
+
+    cache.put("b", _record("other"))
+
+    stats = cache.get_stats()
+    assert stats["compressions"] == 1
+    assert stats["resident_bytes"] - _record("other").size_bytes() < size_hot / 5
+
+    restored = cache.get("a")
+    assert restored == original
+    assert cache.get_stats()["decompressions"] == 1
+
+
+def test_caps_evict_least_recently_used() -> None:
+    """Test that the entry and byte caps drop the oldest conversations first."""
+    cache = _cache(max_entries=2)
+    cache.put("a", _record("a"))
+    cache.put("b", _record("b"))
+    cache.get("a")
+    cache.put("c", _record("c"))
+
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.get("b") is None
+
+    small = _cache(max_bytes=_record("x").size_bytes() + 100, hot_entries=10)
+    small.put("x", _record("x"))
+    small.put("y", _record("y"))
+    assert len(small) == 1 and "y" in small
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["hit_rate"] == 0.5
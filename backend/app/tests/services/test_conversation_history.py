@@ -0,0 +1,61 @@
+"""Tests for token-budgeted conversation history.
+
+Verifies that the replayed context stays within the token budget however
+long the turns are, that recent turns stay verbatim while older ones are
+folded into a summary in the background, and that context sizes are reported.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.conversation_history import ConversationHistory, estimate_tokens
+
+
+@pytest.mark.asyncio
+async def test_context_stays_within_budget() -> None:
+    """Test that a few huge turns cannot blow past the token budget."""
+    history = ConversationHistory(token_budget=1000, summary_token_budget=200)
+    for i in range(3):
+        history.add_turn("conv", f"question {i}", "x" * 20000)
+
+    context = history.build_context("conv", "next")
+
+    assert estimate_tokens(context) <= 1100
+    assert "characters omitted" in context
+    assert context.endswith("Current user message: next")
+    await asyncio.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_folded_into_summary() -> None:
+    """Test that background compaction keeps recent turns verbatim and summarizes the rest."""
+    history = ConversationHistory(token_budget=400, summary_token_budget=100)
+    for i in range(20):
+        history.add_turn("conv", f"question {i}", f"answer {i} " + "detail " * 20)
+    while history._compactions:
+        await asyncio.sleep(0.01)
+
+    record = history.get_record("conv")
+    assert record.summarized_turns > 0
+    assert record.verbatim_tokens <= history.verbatim_budget
+    assert record.turns[-1].user == "question 19"
+
+    context = history.build_context("conv", "next")
+    assert "Summary of earlier conversation:" in context
+    assert "User: question 19" in context
+    assert "User: question 0\n" not in context
+
+    sizes = history.context_size("conv")
+    assert sizes is not None
+    assert sizes["summarized_turns"] + sizes["verbatim_turns"] == 20
+    assert sizes["context_tokens"] <= history.token_budget
+    assert history.get_stats()["compactions"] >= 1
+
+
+def test_unknown_conversation_gets_the_bare_prompt() -> None:
+    """Test that a first turn is sent without any context."""
+    history = ConversationHistory(token_budget=1000, summary_token_budget=200)
+
+    assert history.build_context("new", "hello") == "hello"
+    assert history.context_size("new") is None
@@ -0,0 +1,107 @@
+"""Tests for the durable conversation store.
+
+Verifies that turns are buffered off the request path and flushed to the
+database in batches, that a fresh process reloads the conversation from the
+database, and that a failing flush keeps the turns for the next attempt.
+Also covers the bounds of the memory store and the startup check of the
+database store.
+"""
+
+import uuid
+from typing import List
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.db import async_session_maker
+from app.services.conversation_history import ConversationHistory
+from app.services.conversation_store import (
+    MemoryConversationStore,
+    SQLConversationStore,
+    TurnRow,
+    WriteBehindConversationStore,
+)
+
+
+@pytest.mark.asyncio
+async def test_turns_are_written_behind_and_reloaded() -> None:
+    """Test that storing a turn is buffered and a new history instance loads it back."""
+    conversation_id = f"conv-{uuid.uuid4().hex}"
+    sql_store = SQLConversationStore(async_session_maker)
+    store = WriteBehindConversationStore(sql_store, flush_interval_seconds=60, batch_size=100)
+    history = ConversationHistory(token_budget=1000, summary_token_budget=200, store=store)
+
+    await history.ensure_loaded(conversation_id)
+    history.add_turn(conversation_id, "first question", "first answer")
+    history.add_turn(conversation_id, "second question", "second answer")
+
+    # Nothing reached the database yet, but loads still see the buffered turns
+    assert await sql_store.load_turns(conversation_id, 10) == []
+    assert len(await store.load_turns(conversation_id, 10)) == 2
+
+    assert await store.flush() == 2
+    assert store.get_stats()["flushes"] == 1
+
+    restarted = ConversationHistory(token_budget=1000, summary_token_budget=200, store=store)
+    record = await restarted.ensure_loaded(conversation_id)
+    assert [turn.user for turn in record.turns] == ["first question", "second question"]
+    assert "User: second question" in restarted.build_context(conversation_id, "third")
+
+
+class FlakyStore(MemoryConversationStore):
+    """Store whose first save fails."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.failures = 1
+
+    async def save_turns(self, rows: List[TurnRow]) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        await super().save_turns(rows)
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried() -> None:
+    """Test that turns survive a failed flush and go out with the next one."""
+    backend = FlakyStore()
+    store = WriteBehindConversationStore(backend, flush_interval_seconds=60, batch_size=100)
+    store.append("conv", "q1", "a1")
+
+    assert await store.flush() == 0
+    store.append("conv", "q2", "a2")
+    assert await store.flush() == 2
+
+    assert await backend.load_turns("conv", 10) == [("q1", "a1"), ("q2", "a2")]
+    assert store.get_stats()["flush_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_store_is_bounded() -> None:
+    """Test that the memory store keeps the newest turns of the most recently used conversations."""
+    store = MemoryConversationStore(max_turns=2, max_conversations=2)
+    await store.save_turns([("a", f"q{i}", f"a{i}") for i in range(5)])
+    await store.save_turns([("b", "q", "a")])
+    assert await store.load_turns("a", 10) == [("q3", "a3"), ("q4", "a4")]
+
+    # "a" was used last, so "b" makes room for "c"
+    await store.save_turns([("c", "q", "a")])
+    assert await store.load_turns("b", 10) == []
+    assert await store.load_turns("a", 1) == [("q4", "a4")]
+
+
+@pytest.mark.asyncio
+async def test_database_store_check_fails_without_the_table() -> None:
+    """Test that startup is refused when the ConversationTurn table is missing."""
+    await SQLConversationStore(async_session_maker).check()
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    empty = SQLConversationStore(async_sessionmaker(engine, class_=AsyncSession))
+    store = WriteBehindConversationStore(empty, flush_interval_seconds=60, batch_size=100)
+    try:
+        with pytest.raises(RuntimeError, match="ConversationTurn"):
+            await store.check()
+    finally:
+        await engine.dispose()
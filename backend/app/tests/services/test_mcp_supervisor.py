@@ -0,0 +1,62 @@
+"""Tests for the shared MCP server supervisor.
+
+Uses a small Python TCP server in place of an MCP server to verify that turns
+get the stdio configuration until the shared server is up, then its URL, and
+that a server that dies is restarted.
+"""
+
+import os
+import signal
+import socket
+import sys
+
+import pytest
+
+from app.services.mcp_supervisor import MCPServerSpec, MCPSupervisor
+
+FAKE_SERVER = (
+    "import os, socket, time\n"
+    "s = socket.socket(); s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)\n"
+    "s.bind(('127.0.0.1', int(os.environ['PORT']))); s.listen()\n"
+    "while True:\n"
+    "    s.accept()[0].close()\n"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.asyncio
+async def test_shared_server_is_used_and_restarted() -> None:
+    """Test the stdio fallback, the URL handoff and a restart after a crash."""
+    spec = MCPServerSpec(
+        name="fake",
+        command=sys.executable,
+        args=["-c", FAKE_SERVER],
+        port=_free_port(),
+        shared_env={"PORT": "{port}"},
+    )
+    supervisor = MCPSupervisor([spec], health_interval_seconds=60, start_timeout_seconds=10)
+    server = supervisor._servers["fake"]
+
+    assert supervisor.server_configs(["fake"])["fake"]["command"] == sys.executable
+
+    await supervisor.check(server)
+    assert supervisor.server_configs(["fake"]) == {"fake": {"type": "http", "url": spec.url}}
+
+    assert server.process is not None
+    os.killpg(server.process.pid, signal.SIGKILL)
+    await server.process.wait()
+    await supervisor.check(server)
+
+    stats = supervisor.get_stats()["servers"]["fake"]
+    assert stats["healthy"] is True
+    assert stats["spawns"] == 2
+    assert stats["restarts"] == 1
+    assert stats["turns_shared"] == 1 and stats["turns_stdio"] == 1
+
+    await supervisor.stop()
+    assert supervisor.get_stats()["servers"]["fake"]["pid"] is None
@@ -0,0 +1,55 @@
+"""Tests for the SSE transport.
+
+Verifies that bursts of events share a write, that an event after a quiet
+period is written at once, that idle streams get keepalives, and that
+closing the stream early closes the events it was reading.
+"""
+
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import pytest
+
+from app.services.sse_transport import KEEPALIVE_FRAME, SSETransport, sse_frame
+
+
+async def _scripted(script: List[float], closed: Optional[List[bool]] = None) -> AsyncIterator[Tuple[Optional[str], bytes]]:
+    """Yield one event after each delay of the script."""
+    try:
+        for i, delay in enumerate(script):
+            if delay:
+                await asyncio.sleep(delay)
+            yield f"turn-{i + 1}", b'{"n":%d}' % i
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_one_write_and_quiet_event_is_immediate() -> None:
+    """Test that a burst is coalesced, keepalives fill the silence and late events are not delayed."""
+    transport = SSETransport(coalesce_seconds=0.05, keepalive_seconds=0.1, max_write_bytes=64 * 1024)
+    stats: Dict[str, int] = {}
+
+    chunks = [chunk async for chunk in transport.stream(_scripted([0] * 10 + [0.25]), stats)]
+
+    assert chunks[0] == b"".join(sse_frame(f"turn-{i + 1}", b'{"n":%d}' % i) for i in range(10))
+    assert KEEPALIVE_FRAME in chunks[1:-1]
+    assert chunks[-1] == sse_frame("turn-11", b'{"n":10}')
+    assert stats["sse_events"] == 11
+    assert stats["sse_writes"] == len(chunks)
+    assert stats["sse_keepalives"] == len(chunks) - 2
+    assert stats["sse_bytes"] == sum(len(chunk) for chunk in chunks)
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_closes_the_events() -> None:
+    """Test that a client going away mid-wait unwinds the event source."""
+    transport = SSETransport(coalesce_seconds=0.01, keepalive_seconds=0, max_write_bytes=64 * 1024)
+    closed: List[bool] = []
+
+    async with aclosing(transport.stream(_scripted([0, 10], closed))) as chunks:
+        first = await anext(chunks)
+    assert first == sse_frame("turn-1", b'{"n":0}')
+    assert closed == [True]
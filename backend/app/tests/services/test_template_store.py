@@ -0,0 +1,62 @@
+"""Tests for the workspace template store.
+
+Verifies that templates are fetched once from a bundled tarball, versioned,
+and materialized into workspaces as independent copies.
+"""
+
+import tarfile
+from pathlib import Path
+
+from app.services.template_store import TemplateSpec, TemplateStore
+
+
+def _make_tarball(bundled_dir: Path, name: str, content: str) -> None:
+    source = bundled_dir / "src" / "template-main"
+    source.mkdir(parents=True, exist_ok=True)
+    (source / "index.ts").write_text(content)
+    bundled_dir.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(bundled_dir / f"{name}.tar.gz", "w:gz") as tar:
+        tar.add(source, arcname="template-main")
+
+
+def _store(tmp_path: Path) -> TemplateStore:
+    store = TemplateStore(str(tmp_path / "store"), bundled_dir=tmp_path / "bundled")
+    store.register(TemplateSpec(name="demo", tarball="demo.tar.gz"))
+    return store
+
+
+def test_materialize_fetches_once_and_copies(tmp_path: Path) -> None:
+    """Test that the template is fetched once and copied into each workspace."""
+    _make_tarball(tmp_path / "bundled", "demo", "export const v = 1;")
+    store = _store(tmp_path)
+
+    first = store.materialize("demo", tmp_path / "ws1" / "mcp-server")
+    second = store.materialize("demo", tmp_path / "ws2" / "mcp-server")
+
+    assert first == second
+    assert store.stats["fetches"] == 1
+    assert store.stats["materializations"] == 2
+    # Single top-level directory is hoisted and a fresh repository is included
+    assert (tmp_path / "ws1" / "mcp-server" / "index.ts").read_text() == "export const v = 1;"
+    assert (tmp_path / "ws1" / "mcp-server" / ".git" / "HEAD").exists()
+
+    # Workspaces are independent of each other and of the store
+    (tmp_path / "ws1" / "mcp-server" / "index.ts").write_text("changed")
+    assert (tmp_path / "ws2" / "mcp-server" / "index.ts").read_text() == "export const v = 1;"
+
+
+def test_fetch_switches_version_when_tarball_changes(tmp_path: Path) -> None:
+    """Test that a refresh picks up a new bundled tarball as a new version."""
+    _make_tarball(tmp_path / "bundled", "demo", "v1")
+    store = _store(tmp_path)
+    v1 = store.ensure("demo")
+
+    assert store.fetch("demo") == v1
+
+    _make_tarball(tmp_path / "bundled", "demo", "v2")
+    v2 = store.fetch("demo")
+
+    assert v2 != v1
+    assert store.current_version("demo") == v2
+    store.materialize("demo", tmp_path / "ws")
+    assert (tmp_path / "ws" / "index.ts").read_text() == "v2"
@@ -0,0 +1,63 @@
+"""Tests for turn cancellation.
+
+Runs a scripted turn next to a real process tree in a scratch workspace to
+verify that an abandoned turn is cancelled after the grace period, that its
+followers are told, and that the processes in the workspace are killed.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import pytest
+
+import app.services.turn_cancellation as turn_cancellation
+import app.services.turn_events as turn_events
+from app.services.claude import ClaudeRequest
+from app.services.claude_events import ClaudeEvent, Content, TurnDone
+from app.services.turn_cancellation import TurnCanceller
+from app.services.turn_events import TurnEventLog, run_turn_into_log
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+async def test_abandoned_turn_is_cancelled_and_processes_killed(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a turn nobody follows is cancelled once the grace period is over."""
+    # Stands in for the CLI and a child it started in the workspace
+    process = await asyncio.create_subprocess_exec("sh", "-c", "sleep 60 & wait", cwd=tmp_path)
+
+    async def endless_stream(request: Any) -> AsyncIterator[ClaudeEvent]:
+        yield Content("working")
+        await asyncio.sleep(60)
+        yield TurnDone("never", request.conversation_id)
+
+    monkeypatch.setattr(turn_events.claude_service, "generate_stream", endless_stream)
+    monkeypatch.setattr(turn_cancellation.workspace_manager, "get_workspace_path", lambda _: str(tmp_path))
+    canceller = TurnCanceller(disconnect_grace_seconds=0.05, kill_timeout_seconds=2)
+
+    log = TurnEventLog("abandoned", max_events=100)
+    log.cancel_on_disconnect = True
+    log.task = asyncio.create_task(run_turn_into_log(ClaudeRequest(prompt="hi", conversation_id="abandoned"), log))
+    await asyncio.sleep(0.1)
+    assert len(turn_cancellation.workspace_process_pids(str(tmp_path))) == 2
+
+    # A client followed the turn for one event, then went away
+    events = log.follow()
+    await events.__anext__()
+    await events.aclose()
+    canceller.follower_left(log)
+
+    await asyncio.wait_for(process.wait(), timeout=5)
+    await asyncio.sleep(0.05)
+    assert log.task.cancelled() and log.closed
+    replay = [json.loads(data) async for _, data in log.follow()]
+    assert replay[-1] == {"type": "cancelled", "reason": "disconnect"}
+
+    stats = canceller.get_stats()
+    assert stats["cancelled_by_reason"]["disconnect"] == 1
+    assert stats["killed_processes"] == 2
+    assert turn_cancellation.workspace_process_pids(str(tmp_path)) == []
@@ -0,0 +1,157 @@
+"""Tests for turn event logs.
+
+Verifies that followers receive events appended while they wait, stop when
+the turn is over, and are told about events that fell out of the log; that
+slow followers are coalesced or dropped; that watchers follow every turn
+of a conversation; and that a turn ending on an error closes its stream.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+import pytest
+
+import app.services.turn_events as turn_events
+from app.services.claude import ClaudeRequest
+from app.services.claude_events import ClaudeEvent, Content, ContentDelta, MessageInfo, ToolUse, TurnError
+from app.services.turn_events import TurnEventLog, TurnEventLogRegistry, run_turn_into_log
+
+
+def _text(data: bytes) -> str:
+    return json.loads(data)["content"]
+
+
+@pytest.mark.asyncio
+async def test_follower_sees_live_events_until_close() -> None:
+    """Test that a follower replays, then waits for new events, then finishes."""
+    log = TurnEventLog("conv", max_events=100)
+    log.append(Content("a"))
+
+    async def collect() -> List[Tuple[Optional[str], bytes]]:
+        return [event async for event in log.follow()]
+
+    follower = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    log.append(Content("b"))
+    log.close()
+
+    events = await follower
+    assert [_text(data) for _, data in events] == ["a", "b"]
+    assert [event_id for event_id, _ in events] == [f"{log.turn_id}-1", f"{log.turn_id}-2"]
+
+
+@pytest.mark.asyncio
+async def test_trimmed_events_are_reported_as_a_gap() -> None:
+    """Test that replay from before the oldest kept event reports what was missed."""
+    registry = TurnEventLogRegistry(max_events=2, retention_seconds=60)
+    log = registry.start("conv")
+    for text in "abcd":
+        log.append(Content(text))
+    log.close()
+
+    resume = registry.find("conv", f"{log.turn_id}-1")
+    assert resume is not None
+    events = [event async for event in resume[0].follow(resume[1])]
+
+    assert events[0][0] is None
+    assert json.loads(events[0][1]) == {"type": "replay_gap", "missed": 1}
+    assert [_text(data) for _, data in events[1:]] == ["c", "d"]
+    assert registry.find("conv", "other-3", same_turn_only=True) is None
+
+
+@pytest.mark.asyncio
+async def test_slow_follower_is_coalesced_then_dropped() -> None:
+    """Test that a lagging follower gets merged deltas, and is dropped when still too far behind."""
+    log = TurnEventLog("conv", max_events=100, max_backlog=3)
+    log.append(MessageInfo("AssistantMessage"))
+    follower = log.follow()
+    await anext(follower)
+    # Caught up; everything below is appended while the follower does not read
+    for i in range(4):
+        log.append(MessageInfo("AssistantMessage"))
+        log.append(ContentDelta(f"{i} "))
+    log.append(Content("0 1 2 3 "))
+    log.close()
+
+    events = [(event_id, json.loads(data)) async for event_id, data in follower]
+    assert [data for _, data in events] == [
+        {"type": "content_delta", "delta": "0 1 2 3 ", "block_index": 0},
+        {"type": "content", "content": "0 1 2 3 ", "block_index": 0},
+    ]
+    assert events[0][0] == f"{log.turn_id}-9"
+
+    log = TurnEventLog("conv", max_events=100, max_backlog=3)
+    log.append(ToolUse("Bash", 0))
+    follower = log.follow()
+    await anext(follower)
+    for i in range(5):
+        log.append(ToolUse("Bash", i))
+    events = [json.loads(data) async for _, data in follower]
+    assert events == [{"type": "lagged", "last_event_id": f"{log.turn_id}-1"}]
+    assert log.get_stats()["lagged_followers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_late_follower_replays_a_long_turn_in_full() -> None:
+    """Test that joining (or resuming) a turn with more buffered events than the backlog limit replays them all."""
+    log = TurnEventLog("conv", max_events=1000, max_backlog=256)
+    for i in range(300):
+        log.append(Content(str(i)))
+    log.close()
+
+    events = [event async for event in log.follow(0)]
+    assert [_text(data) for _, data in events] == [str(i) for i in range(300)]
+    assert events[-1][0] == f"{log.turn_id}-300"
+
+    resumed = [event async for event in log.follow(10)]
+    assert [_text(data) for _, data in resumed] == [str(i) for i in range(10, 300)]
+    assert log.get_stats()["lagged_followers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_watchers_share_turns_across_the_conversation() -> None:
+    """Test that watchers see every turn of a conversation without starting one."""
+    registry = TurnEventLogRegistry(max_events=100, retention_seconds=60)
+
+    async def watch(count: int) -> List[str]:
+        events = []
+        async for _, data in registry.watch("conv"):
+            events.append(_text(data))
+            if len(events) == count:
+                return events
+        return events
+
+    watchers = [asyncio.create_task(watch(3)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    first = registry.start("conv")
+    first.append(Content("a"))
+    first.append(Content("b"))
+    first.close()
+    await asyncio.sleep(0.01)
+    second = registry.start("conv")
+    second.append(Content("c"))
+
+    assert await asyncio.gather(*watchers) == [["a", "b", "c"]] * 3
+    assert registry.get_stats()["turns"] == 2
+
+
+@pytest.mark.asyncio
+async def test_error_event_closes_the_stream(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that returning on an error unwinds the service stream at once."""
+    closed: List[bool] = []
+
+    async def failing_stream(request: Any) -> AsyncIterator[ClaudeEvent]:
+        try:
+            yield TurnError("boom", "api_error")
+            yield Content("never sent")
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(turn_events.claude_service, "generate_stream", failing_stream)
+    log = TurnEventLog("conv", max_events=100)
+
+    outcome = await run_turn_into_log(ClaudeRequest(prompt="hi", conversation_id="conv"), log)
+
+    assert outcome == TurnError("boom", "api_error")
+    assert closed == [True]
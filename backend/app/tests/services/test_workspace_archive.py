@@ -0,0 +1,99 @@
+"""Tests for cold-workspace archival.
+
+Verifies that archives round-trip a workspace tree, that idle workspaces are
+archived by the eviction pass and restored once when next ensured, and that a
+workspace claimed by a turn during archival keeps its tree.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.services.workspace_archive import WorkspaceArchiver
+from app.services.workspace_manager import ConversationWorkspaceManager
+
+
+def test_archive_and_restore_round_trip(tmp_path: Path) -> None:
+    """Test that restore reproduces the archived tree and removes the archive."""
+    workspace = tmp_path / "ws"
+    (workspace / "files" / "nested").mkdir(parents=True)
+    (workspace / "files" / "nested" / "a.txt").write_text("hello")
+    (workspace / "README.md").write_text("readme")
+    archiver = WorkspaceArchiver(tmp_path / ".archive")
+
+    archive_path = archiver.archive("conv", workspace)
+    assert archive_path.exists()
+    assert workspace.exists()
+
+    restored = tmp_path / "restored"
+    archiver.restore("conv", archive_path, restored)
+
+    assert (restored / "files" / "nested" / "a.txt").read_text() == "hello"
+    assert (restored / "README.md").read_text() == "readme"
+    assert not archive_path.exists()
+    stats = archiver.get_stats()
+    assert stats["archived"] == 1 and stats["restored"] == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_workspace_is_archived_then_rehydrated(tmp_path: Path) -> None:
+    """Test that an eviction pass archives idle workspaces and access restores them."""
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    manager.evictor.archive_after_seconds = 3600
+    manager.evictor.idle_ttl_seconds = 0
+    manager.evictor.disk_budget_bytes = 0
+
+    path = manager.base_dir / "cold"
+    path.mkdir()
+    (path / "notes.txt").write_text("keep me")
+    manager.active_workspaces["cold"] = {
+        "path": str(path),
+        "created_at": datetime.now().isoformat(),
+        "last_accessed": (datetime.now() - timedelta(hours=2)).isoformat(),
+        "size_bytes": 7,
+    }
+
+    assert await manager.evictor.run_once() == 0
+    info = manager.active_workspaces["cold"]
+    assert info["archived"] is True
+    assert info["size_bytes"] == 0
+    assert not path.exists()
+
+    # Plain lookups do not unpack, ensuring the workspace does, once
+    assert manager.get_workspace_path("cold") is None
+    paths = await asyncio.gather(*(manager.ensure_workspace_async("cold") for _ in range(3)))
+    assert paths == [str(path)] * 3
+    assert (path / "notes.txt").read_text() == "keep me"
+    assert "archived" not in manager.active_workspaces["cold"]
+    assert manager.archiver.get_stats()["restored"] == 1
+    assert manager.get_metrics()["archived_workspaces"] == 0
+
+
+def test_workspace_claimed_while_packing_is_not_archived(tmp_path: Path) -> None:
+    """Test that a turn starting during archival keeps its tree."""
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    path = manager.base_dir / "busy"
+    path.mkdir()
+    manager.active_workspaces["busy"] = {"path": str(path), "created_at": "", "last_accessed": ""}
+
+    archive = manager.archiver.archive
+    turn = manager.using_workspace("busy")
+
+    def archive_then_claim(conversation_id: str, workspace_path: Path) -> Path:
+        archive_path = archive(conversation_id, workspace_path)
+        turn.__enter__()
+        return archive_path
+
+    manager.archiver.archive = archive_then_claim  # type: ignore[method-assign]
+    try:
+        assert manager.archive_workspace("busy") is False
+    finally:
+        turn.__exit__(None, None, None)
+    assert path.is_dir()
+    assert not any(manager.archiver.archive_dir.iterdir())
@@ -0,0 +1,74 @@
+"""Tests for per-turn workspace checkpoints.
+
+Verifies that checkpoints only copy changed files, skip dependency trees,
+and that restores roll back edits, deletions and additions by touching only
+the files that differ.
+"""
+
+from pathlib import Path
+
+from app.services.workspace_checkpoints import CheckpointStore
+
+
+def _workspace(tmp_path: Path) -> Path:
+    workspace = tmp_path / "ws"
+    (workspace / "src").mkdir(parents=True)
+    (workspace / "src" / "main.py").write_text("print('v1')")
+    (workspace / "README.md").write_text("readme")
+    (workspace / "node_modules" / "pkg").mkdir(parents=True)
+    (workspace / "node_modules" / "pkg" / "index.js").write_text("dep")
+    return workspace
+
+
+def test_checkpoints_store_only_changed_files(tmp_path: Path) -> None:
+    """Test that a second checkpoint copies only the edited file."""
+    workspace = _workspace(tmp_path)
+    store = CheckpointStore(tmp_path / ".checkpoints")
+
+    first = store.create("conv", workspace, label="turn 1")
+    assert first["file_count"] == 2
+    assert first["new_bytes"] == len("print('v1')") + len("readme")
+
+    (workspace / "src" / "main.py").write_text("print('version 2')")
+    second = store.create("conv", workspace, label="turn 2")
+    assert second["new_bytes"] == len("print('version 2')")
+
+    assert [c["label"] for c in store.list_checkpoints("conv")] == ["turn 1", "turn 2"]
+
+
+def test_restore_rolls_back_only_the_diff(tmp_path: Path) -> None:
+    """Test that a restore rewrites edited files, recreates deleted ones and removes new ones."""
+    workspace = _workspace(tmp_path)
+    store = CheckpointStore(tmp_path / ".checkpoints")
+    store.create("conv", workspace)
+
+    (workspace / "src" / "main.py").write_text("broken")
+    (workspace / "README.md").unlink()
+    (workspace / "scratch").mkdir()
+    (workspace / "scratch" / "tmp.txt").write_text("junk")
+
+    result = store.restore("conv", 1, workspace)
+
+    assert result["files_written"] == 2
+    assert result["files_deleted"] == 1
+    assert (workspace / "src" / "main.py").read_text() == "print('v1')"
+    assert (workspace / "README.md").read_text() == "readme"
+    assert not (workspace / "scratch").exists()
+    # Dependency trees are neither captured nor removed
+    assert (workspace / "node_modules" / "pkg" / "index.js").read_text() == "dep"
+
+    assert store.restore("conv", 1, workspace)["files_written"] == 0
+
+
+def test_retention_prunes_old_checkpoints_and_objects(tmp_path: Path) -> None:
+    """Test that only the newest checkpoints and the objects they use are kept."""
+    workspace = _workspace(tmp_path)
+    store = CheckpointStore(tmp_path / ".checkpoints", keep=2)
+    for version in range(4):
+        (workspace / "src" / "main.py").write_text(f"print({version})")
+        store.create("conv", workspace)
+
+    assert [c["id"] for c in store.list_checkpoints("conv")] == [3, 4]
+    objects = [p for p in (tmp_path / ".checkpoints" / "conv" / "objects").rglob("*") if p.is_file()]
+    # README plus the two retained versions of main.py
+    assert len(objects) == 3
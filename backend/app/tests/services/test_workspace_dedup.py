@@ -0,0 +1,150 @@
+"""Tests for the workspace content store.
+
+Verifies that identical dependency files share one blob, that files outside
+dependency trees are left alone, that writing to a deduplicated file never
+reaches other workspaces, that shared bytes are not charged to every
+workspace, that unreferenced blobs are collected, and that nothing is
+deduplicated on filesystems without reflinks.
+
+Most tests stand in a plain copy for the FICLONE ioctl, which gives the same
+per-file isolation on filesystems (like the one running the tests) without
+reflinks.
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.services.workspace_dedup import CAS_DIR_NAME, ContentStore, WorkspaceDeduplicator, is_shared
+from app.services.workspace_manager import ConversationWorkspaceManager
+from app.services.workspace_stats import WorkspaceLedger
+
+PAYLOAD = b"module.exports = 1;\n" * 64
+
+
+def _workspace(root: Path, name: str) -> Path:
+    workspace = root / name
+    (workspace / "mcp-server" / "node_modules" / "pkg").mkdir(parents=True)
+    (workspace / "mcp-server" / "node_modules" / "pkg" / "index.js").write_bytes(PAYLOAD)
+    (workspace / "mcp-server" / "index.ts").write_bytes(PAYLOAD)
+    return workspace
+
+
+def _dep(workspace: Path) -> Path:
+    return workspace / "mcp-server" / "node_modules" / "pkg" / "index.js"
+
+
+@pytest.fixture
+def clones(monkeypatch: pytest.MonkeyPatch) -> None:
+    def copy_clone(src: str, dst: str) -> None:
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+            shutil.copyfileobj(fsrc, fdst)
+
+    monkeypatch.setattr(ContentStore, "_clone", staticmethod(copy_clone))
+
+
+@pytest.mark.usefixtures("clones")
+def test_dedup_shares_dependency_files_only(tmp_path: Path) -> None:
+    """Test that identical node_modules files share a blob, sources do not, and shared files are skipped later."""
+    store = ContentStore(tmp_path / CAS_DIR_NAME, min_size=16)
+    first = _workspace(tmp_path, "a")
+    second = _workspace(tmp_path, "b")
+
+    assert store.dedup_tree(first) == 0
+    assert store.dedup_tree(second) == 1
+
+    for workspace in (first, second):
+        dep = _dep(workspace)
+        assert dep.read_bytes() == PAYLOAD
+        assert os.stat(dep).st_nlink == 1
+        assert is_shared(str(dep), os.lstat(dep))
+    source = first / "mcp-server" / "index.ts"
+    assert not is_shared(str(source), os.lstat(source))
+
+    store.collect()
+    stats = store.get_stats()
+    assert stats["store_blobs"] == 1
+    assert stats["dedup_ratio"] == 2.0
+    assert stats["reflink_supported"] is True
+
+    # Unchanged shared files are not hashed again
+    scanned = stats["files_scanned"]
+    assert store.dedup_tree(second) == 0
+    assert store.get_stats()["files_scanned"] == scanned
+
+
+@pytest.mark.usefixtures("clones")
+def test_in_place_write_stays_private_and_collect(tmp_path: Path) -> None:
+    """Test that writing to one workspace's copy leaves the others alone and orphan blobs are dropped."""
+    store = ContentStore(tmp_path / CAS_DIR_NAME, min_size=16)
+    first = _workspace(tmp_path, "a")
+    second = _workspace(tmp_path, "b")
+    store.dedup_tree(first)
+    store.dedup_tree(second)
+    assert store.collect() == 0
+
+    dep_b = _dep(second)
+    with open(dep_b, "ab") as f:
+        f.write(b"patched")
+    assert _dep(first).read_bytes() == PAYLOAD
+    assert not is_shared(str(dep_b), os.lstat(dep_b))
+
+    shutil.rmtree(first)
+    store.dedup_tree(second)
+    assert store.collect() == 1
+    assert store.get_stats()["store_blobs"] == 1
+
+
+@pytest.mark.usefixtures("clones")
+def test_ledger_does_not_charge_shared_bytes(tmp_path: Path) -> None:
+    """Test that deduplicated dependency files count zero bytes in the workspace ledger."""
+    store = ContentStore(tmp_path / CAS_DIR_NAME, min_size=16)
+    first = _workspace(tmp_path, "a")
+    second = _workspace(tmp_path, "b")
+    store.dedup_tree(first)
+    store.dedup_tree(second)
+
+    ledger = WorkspaceLedger(second)
+    ledger.build()
+    assert ledger.size_bytes == len(PAYLOAD)
+    assert ledger.file_count == 2
+
+
+def test_dedup_is_skipped_without_reflinks(tmp_path: Path) -> None:
+    """Test that nothing is shared on a filesystem that cannot clone files."""
+    store = ContentStore(tmp_path / CAS_DIR_NAME, min_size=16)
+    first = _workspace(tmp_path, "a")
+    second = _workspace(tmp_path, "b")
+
+    assert store.dedup_tree(first) == 0
+    if store.reflink_supported:
+        pytest.skip("the test filesystem supports reflinks")
+    assert store.dedup_tree(second) == 0
+    assert store.reflink_supported is False
+    assert os.stat(_dep(first)).st_ino != os.stat(_dep(second)).st_ino
+    assert not is_shared(str(_dep(first)), os.lstat(_dep(first)))
+    assert store.collect() == 0
+    assert store.get_stats()["store_blobs"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("clones")
+async def test_offline_pass_skips_workspaces_in_use(tmp_path: Path) -> None:
+    """Test that the periodic pass leaves workspaces with a turn in progress alone."""
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    manager.content_store.min_size = 16
+    for conversation_id in ("one", "two", "busy"):
+        path = _workspace(manager.base_dir, conversation_id)
+        manager.active_workspaces[conversation_id] = {"path": str(path)}
+
+    deduplicator = WorkspaceDeduplicator(manager, manager.content_store, interval_seconds=0)
+    with manager.using_workspace("busy"):
+        assert await deduplicator.run_once() == 1
+
+    busy_dep = _dep(manager.base_dir / "busy")
+    assert not is_shared(str(busy_dep), os.lstat(busy_dep))
+    assert deduplicator.get_stats()["passes"] == 1
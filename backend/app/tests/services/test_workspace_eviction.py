@@ -0,0 +1,71 @@
+"""Tests for the workspace eviction scheduler.
+
+Verifies LRU victim selection against the idle TTL, per-workspace quota
+and overall disk budget, and that evicted workspaces go through the trash.
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.services.workspace_manager import ConversationWorkspaceManager
+
+
+def _manager(tmp_path: Path) -> ConversationWorkspaceManager:
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    return manager
+
+
+def _add(manager: ConversationWorkspaceManager, conversation_id: str, size: int, idle_hours: float) -> None:
+    path = manager.base_dir / conversation_id
+    path.mkdir()
+    (path / "data.bin").write_bytes(b"x" * size)
+    manager.active_workspaces[conversation_id] = {
+        "path": str(path),
+        "created_at": datetime.now().isoformat(),
+        "last_accessed": (datetime.now() - timedelta(hours=idle_hours)).isoformat(),
+        "size_bytes": size,
+    }
+
+
+def test_select_victims_orders_by_reason_and_lru(tmp_path: Path) -> None:
+    """Test that idle and over-quota workspaces go first, then LRU until under budget."""
+    manager = _manager(tmp_path)
+    evictor = manager.evictor
+    evictor.idle_ttl_seconds = 10 * 3600
+    evictor.quota_bytes = 500
+    evictor.disk_budget_bytes = 400
+
+    _add(manager, "idle", 100, idle_hours=20)
+    _add(manager, "huge", 600, idle_hours=0.1)
+    _add(manager, "old", 200, idle_hours=5)
+    _add(manager, "recent", 200, idle_hours=1)
+    _add(manager, "busy", 200, idle_hours=8)
+
+    with manager.using_workspace("busy"):
+        victims = evictor.select_victims()
+
+    assert victims == [("idle", "idle", 100), ("huge", "quota", 600), ("old", "budget", 200)]
+
+
+@pytest.mark.asyncio
+async def test_run_once_moves_to_trash_and_deletes(tmp_path: Path) -> None:
+    """Test that an eviction pass removes the workspace and records metrics."""
+    manager = _manager(tmp_path)
+    manager.evictor.idle_ttl_seconds = 3600
+    manager.evictor.disk_budget_bytes = 0
+    _add(manager, "stale", 1000, idle_hours=2)
+    _add(manager, "fresh", 10, idle_hours=0)
+
+    assert await manager.evictor.run_once() == 1
+
+    assert "stale" not in manager.active_workspaces
+    assert not (manager.base_dir / "stale").exists()
+    assert (manager.base_dir / "fresh").exists()
+    stats = manager.evictor.get_stats()
+    assert stats["evicted_bytes"] == 1000
+    assert stats["evictions_by_reason"]["idle"] == 1
+    assert stats["trash_pending"] == 0
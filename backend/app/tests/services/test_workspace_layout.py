@@ -0,0 +1,64 @@
+"""Tests for the sharded workspace layout.
+
+Verifies that workspaces resolve under hash-prefix shards, that legacy flat
+workspaces still resolve and are moved by the migration, and that file events
+are attributed to the right workspace in both layouts.
+"""
+
+from pathlib import Path
+
+from app.services.workspace_manager import ConversationWorkspaceManager
+
+
+def _manager(tmp_path: Path) -> ConversationWorkspaceManager:
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+    return manager
+
+
+def test_workspace_dir_is_sharded(tmp_path: Path) -> None:
+    """Test that workspace paths sit two shard levels below the base directory."""
+    manager = _manager(tmp_path)
+    path = manager._workspace_dir("chat_123")
+
+    relative = path.relative_to(manager.base_dir)
+    assert len(relative.parts) == 3
+    assert relative.parts[-1] == "chat_123"
+    assert all(manager._is_shard_name(p) for p in relative.parts[:2])
+    assert manager._workspace_dir("chat_123") == path
+
+
+def test_legacy_flat_workspace_resolves_and_migrates(tmp_path: Path) -> None:
+    """Test that flat workspaces resolve directly and are moved into their shard."""
+    manager = _manager(tmp_path)
+    legacy = manager.base_dir / "old_chat"
+    legacy.mkdir()
+    (legacy / "notes.txt").write_text("hi")
+    (manager.base_dir / "example.mcp.json").write_text("{}")
+
+    assert manager.get_workspace_path("old_chat") == str(legacy)
+
+    assert manager.migrate_flat_layout() == 1
+    sharded = manager._workspace_dir("old_chat")
+    assert (sharded / "notes.txt").read_text() == "hi"
+    assert not legacy.exists()
+    assert manager.active_workspaces["old_chat"]["path"] == str(sharded)
+    assert manager.get_workspace_path("old_chat") == str(sharded)
+    # Stray files and internal directories are left alone
+    assert (manager.base_dir / "example.mcp.json").exists()
+    assert manager.migrate_flat_layout() == 0
+
+
+def test_file_events_map_to_sharded_workspace(tmp_path: Path) -> None:
+    """Test that events under a shard update that workspace's ledger."""
+    manager = _manager(tmp_path)
+    path = manager._workspace_dir("sharded_chat")
+    path.mkdir(parents=True)
+    manager.active_workspaces["sharded_chat"] = {"path": str(path), "created_at": "2025-01-01T00:00:00"}
+    assert manager.get_workspace_stats("sharded_chat")["file_count"] == 0
+
+    (path / "new.txt").write_text("12345")
+    manager.record_file_event("created", str(path / "new.txt"), False)
+
+    assert manager.get_workspace_stats("sharded_chat")["size_bytes"] == 5
@@ -0,0 +1,70 @@
+"""Tests for the warm workspace pool.
+
+Verifies that pre-provisioned workspaces are claimed by rename and that
+hits, misses and refills are counted.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from app.services.workspace_pool import WorkspacePool
+
+
+def _build(path: Path) -> Optional[str]:
+    (path / "files").mkdir(parents=True)
+    return "v1"
+
+
+def test_claim_renames_ready_workspace(tmp_path: Path) -> None:
+    """Test that a claim hands out a ready workspace and falls back to a miss."""
+    pool = WorkspacePool(tmp_path / ".pool", _build, target_size=1)
+    assert pool.fill_one()
+    assert pool.size == 1
+
+    dest = tmp_path / "conv_1"
+    info = pool.claim(dest)
+
+    assert info == {"mcp_template_version": "v1"}
+    assert (dest / "files").is_dir()
+    assert pool.size == 0
+    assert pool.claim(tmp_path / "conv_2") is None
+
+    stats = pool.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["refills"] == 1
+    assert stats["last_refill_seconds"] is not None
+
+
+def test_failed_builds_are_not_pooled(tmp_path: Path) -> None:
+    """Test that a workspace whose template failed never enters the pool."""
+    pool = WorkspacePool(tmp_path / ".pool", lambda path: path.mkdir(parents=True), target_size=1)
+
+    assert not pool.fill_one()
+    assert pool.size == 0
+    assert pool.get_stats()["refill_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_adopts_workspaces_from_previous_run(tmp_path: Path) -> None:
+    """Test that ready workspaces survive a restart and half-built ones do not."""
+    first = WorkspacePool(tmp_path / ".pool", _build, target_size=2)
+    first.fill_one()
+    (first.building_dir / "pool_partial").mkdir(parents=True)
+    live_sibling = tmp_path / ".pool" / f".building-{os.getppid()}" / "pool_partial"
+    live_sibling.mkdir(parents=True)
+
+    second = WorkspacePool(tmp_path / ".pool", _build, target_size=2)
+    assert second.size == 0
+    assert first.building_dir.exists()
+
+    second.target_size = 1
+    second.start()
+    await second.stop()
+
+    assert second.size == 1
+    assert not first.building_dir.exists()
+    assert live_sibling.is_dir()
@@ -0,0 +1,68 @@
+"""Tests for single-flight workspace provisioning.
+
+Verifies that concurrent requests for the same new conversation build its
+workspace exactly once, both for async callers sharing an in-flight task and
+for threads contending on the creation lock.
+"""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from app.services.workspace_manager import ConversationWorkspaceManager
+
+
+def _manager(tmp_path: Path, builds: List[Path]) -> ConversationWorkspaceManager:
+    manager = ConversationWorkspaceManager(str(tmp_path / "workspaces"))
+    manager.open()
+    manager.pool.target_size = 0
+
+    def slow_build(workspace_path: Path) -> Optional[str]:
+        builds.append(workspace_path)
+        workspace_path.mkdir(parents=True)
+        time.sleep(0.05)
+        return "v1"
+
+    manager._build_workspace_tree = slow_build  # type: ignore[method-assign]
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_callers_share_one_creation(tmp_path: Path) -> None:
+    """Test that simultaneous requests await the same provisioning."""
+    builds: List[Path] = []
+    manager = _manager(tmp_path, builds)
+
+    paths = await asyncio.gather(*(manager.ensure_workspace_async("new_chat") for _ in range(5)))
+
+    assert len(builds) == 1
+    assert set(paths) == {str(manager._workspace_dir("new_chat"))}
+    assert (manager._workspace_dir("new_chat") / "README.md").exists()
+    assert manager.provisioning_stats["coalesced"] == 4
+    assert manager.get_metrics()["provisioning"]["in_flight"] == 0
+
+
+def test_concurrent_threads_create_once(tmp_path: Path) -> None:
+    """Test that the creation lock serializes threads and the loser reuses the workspace."""
+    builds: List[Path] = []
+    manager = _manager(tmp_path, builds)
+    results: List[str] = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(manager.ensure_workspace_exists("race")))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert len(set(results)) == 1
+    assert manager.provisioning_stats["created"] == 1
+    # The build happened in a staging directory, renamed into place
+    assert builds[0] != manager._workspace_dir("race")
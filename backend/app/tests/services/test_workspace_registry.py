@@ -0,0 +1,64 @@
+"""Tests for the durable workspace registry.
+
+Verifies that buffered updates are written in batches and reloaded in bulk.
+"""
+
+from pathlib import Path
+
+from app.services.workspace_registry import WorkspaceRegistry
+
+
+def test_records_survive_reopen(tmp_path: Path) -> None:
+    """Test that flushed entries, including extra keys, are loaded after a restart."""
+    registry = WorkspaceRegistry(tmp_path / "registry.sqlite3")
+    registry.open()
+    registry.record("conv_1", {
+        "path": "/w/conv_1",
+        "created_at": "2025-01-01T00:00:00",
+        "last_accessed": "2025-01-01T00:00:00",
+        "file_count": 3,
+        "size_bytes": 42,
+        "mcp_template_setup": True,
+        "mcp_template_version": "abc",
+        "archived": False,
+    })
+    registry.record("conv_2", {"path": "/w/conv_2", "mcp_template_setup": False})
+    # Only the latest state of an entry is written
+    registry.record("conv_1", {"path": "/w/conv_1", "last_accessed": "later", "mcp_template_setup": True})
+
+    assert registry.flush() == 2
+    assert registry.flush() == 0
+
+    reopened = WorkspaceRegistry(tmp_path / "registry.sqlite3").load_all()
+    assert reopened["conv_1"]["last_accessed"] == "later"
+    assert reopened["conv_1"]["mcp_template_setup"] is True
+    assert reopened["conv_2"]["mcp_template_setup"] is False
+
+
+def test_remove_deletes_on_flush(tmp_path: Path) -> None:
+    """Test that removals are batched like updates."""
+    registry = WorkspaceRegistry(tmp_path / "registry.sqlite3")
+    registry.open()
+    registry.record("conv_1", {"path": "/w/conv_1", "archived": True})
+    registry.flush()
+    assert registry.load_all()["conv_1"]["archived"] is True
+
+    registry.remove("conv_1")
+    assert registry.get_stats()["pending"] == 1
+    registry.flush()
+
+    assert registry.load_all() == {}
+
+
+def test_database_is_not_created_until_opened(tmp_path: Path) -> None:
+    """Test that constructing the registry leaves the disk alone and buffers updates."""
+    db_path = tmp_path / "registry.sqlite3"
+    registry = WorkspaceRegistry(db_path)
+    registry.record("conv_1", {"path": "/w/conv_1"})
+
+    assert registry.flush() == 0
+    assert not db_path.exists()
+
+    registry.open()
+    assert registry.flush() == 1
+    assert "conv_1" in WorkspaceRegistry(db_path).load_all()
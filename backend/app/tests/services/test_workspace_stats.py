@@ -0,0 +1,79 @@
+"""Tests for the incremental workspace statistics ledger.
+
+Verifies that the ledger matches a full walk after builds, mtime-based
+refreshes and file-change events.
+"""
+
+import os
+from pathlib import Path
+
+from app.services.workspace_stats import WorkspaceLedger
+
+
+def _walk_totals(root: Path) -> dict[str, int]:
+    files = [p for p in root.rglob("*") if p.is_file()]
+    return {
+        "size_bytes": sum(p.stat().st_size for p in files),
+        "file_count": len(files),
+        "folder_count": len([p for p in root.rglob("*") if p.is_dir()]),
+    }
+
+
+def _totals(ledger: WorkspaceLedger) -> dict[str, int]:
+    snapshot = ledger.snapshot()
+    return {key: snapshot[key] for key in ("size_bytes", "file_count", "folder_count")}  # type: ignore[misc]
+
+
+def _make_tree(root: Path) -> None:
+    (root / "files").mkdir(parents=True)
+    (root / "files" / "a.txt").write_text("hello")
+    (root / "node_modules" / "pkg").mkdir(parents=True)
+    (root / "node_modules" / "pkg" / "index.js").write_text("module.exports = 1;")
+
+
+def test_build_matches_full_walk(tmp_path: Path) -> None:
+    """Test that a fresh build reports the same totals as a full walk."""
+    _make_tree(tmp_path)
+    ledger = WorkspaceLedger(tmp_path)
+    ledger.build()
+
+    assert _totals(ledger) == _walk_totals(tmp_path)
+
+
+def test_refresh_picks_up_changes(tmp_path: Path) -> None:
+    """Test that refresh tracks added trees, removals and in-place edits."""
+    _make_tree(tmp_path)
+    ledger = WorkspaceLedger(tmp_path)
+    ledger.build()
+
+    (tmp_path / "outputs" / "nested").mkdir(parents=True)
+    (tmp_path / "outputs" / "nested" / "b.bin").write_bytes(b"x" * 1000)
+    (tmp_path / "node_modules" / "pkg" / "index.js").unlink()
+    # In-place edit: grows the file without touching the directory mtime
+    files_dir = tmp_path / "files"
+    mtime = files_dir.stat().st_mtime_ns
+    with open(files_dir / "a.txt", "a") as f:
+        f.write(" world")
+    os.utime(files_dir, ns=(mtime, mtime))
+
+    ledger.refresh()
+
+    assert _totals(ledger) == _walk_totals(tmp_path)
+
+
+def test_apply_event_updates_totals(tmp_path: Path) -> None:
+    """Test that file-change events keep the totals current without a refresh."""
+    _make_tree(tmp_path)
+    ledger = WorkspaceLedger(tmp_path)
+    ledger.build()
+
+    new_file = tmp_path / "files" / "c.txt"
+    new_file.write_text("12345")
+    ledger.apply_event("created", str(new_file), is_directory=False)
+    moved = tmp_path / "files" / "d.txt"
+    new_file.rename(moved)
+    ledger.apply_event("moved", str(new_file), is_directory=False, dest_path=str(moved))
+    (tmp_path / "files" / "a.txt").unlink()
+    ledger.apply_event("deleted", str(tmp_path / "files" / "a.txt"), is_directory=False)
+
+    assert _totals(ledger) == _walk_totals(tmp_path)
@@ -0,0 +1,132 @@
+"""Microbenchmark of the Claude stream event pipeline.
+
+Compares, in events per second, the old path of a streamed event with the
+typed one:
+
+- before: the service ``json.dumps`` a dict, the route ``json.loads`` it,
+  remaps it through an if/elif chain, ``json.dumps`` it again and formats
+  the SSE frame as text
+- after: the service yields a typed event, ``encode_event`` serializes it
+  once (orjson if installed) and the frame is assembled from bytes
+
+Run from the backend directory:
+
+    python benchmark_stream_events.py [--events 200000]
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.services.claude_events import (
+    ClaudeEvent,
+    Content,
+    ContentDelta,
+    MessageInfo,
+    ToolUse,
+    encode_event,
+    orjson,
+)
+
+
+def _legacy_chunk(event: ClaudeEvent) -> str:
+    """What the service used to yield for an event."""
+    if isinstance(event, MessageInfo):
+        return json.dumps({"type": "message_info", "message_type": event.message_type})
+    if isinstance(event, ContentDelta):
+        return json.dumps({"type": "content_delta", "delta": event.delta, "block_index": event.block_index})
+    if isinstance(event, Content):
+        return json.dumps({"type": "content", "content": event.content, "block_index": event.block_index})
+    return json.dumps({"type": "tool_use", "tool_name": event.tool_name, "block_index": event.block_index})
+
+
+def _legacy_client_event(chunk: str) -> Optional[Dict[str, Any]]:
+    """The route's old chunk mapping (trimmed to the event types used here)."""
+    try:
+        chunk_data = json.loads(chunk)
+    except json.JSONDecodeError:
+        return {"content": chunk, "type": "content"}
+    chunk_type = chunk_data.get("type")
+    if chunk_type == "message_info":
+        return {
+            "type": "progress",
+            "message_type": chunk_data.get("message_type"),
+            "timestamp": chunk_data.get("timestamp", 0)
+        }
+    elif chunk_type == "content":
+        return {
+            "type": "content",
+            "content": chunk_data.get("content", ""),
+            "block_index": chunk_data.get("block_index", 0)
+        }
+    elif chunk_type == "content_delta":
+        return {
+            "type": "content_delta",
+            "delta": chunk_data.get("delta", ""),
+            "block_index": chunk_data.get("block_index", 0)
+        }
+    elif chunk_type == "tool_use":
+        return {
+            "type": "tool_use",
+            "tool_name": chunk_data.get("tool_name"),
+            "block_index": chunk_data.get("block_index", 0)
+        }
+    return None
+
+
+def before(events: Iterable[ClaudeEvent]) -> int:
+    written = 0
+    for seq, event in enumerate(events):
+        payload = _legacy_client_event(_legacy_chunk(event))
+        if payload is None:
+            continue
+        frame = f"id: turn-{seq}\ndata: {json.dumps(payload)}\n\n".encode()
+        written += len(frame)
+    return written
+
+
+def after(events: Iterable[ClaudeEvent]) -> int:
+    written = 0
+    for seq, event in enumerate(events):
+        frame = b"id: %s\ndata: %s\n\n" % (f"turn-{seq}".encode(), encode_event(event))
+        written += len(frame)
+    return written
+
+
+def sample_turn(count: int) -> List[ClaudeEvent]:
+    """A turn that is mostly text deltas, with the occasional tool call and whole block."""
+    events: List[ClaudeEvent] = []
+    while len(events) < count:
+        events.append(MessageInfo("AssistantMessage"))
+        events.extend(ContentDelta("Updating the component so the form validates its input ", 0) for _ in range(40))
+        events.append(Content("Updating the component so the form validates its input " * 40, 0))
+        events.append(ToolUse("Edit", 1))
+    return events[:count]
+
+
+def measure(pipeline: Callable[[Iterable[ClaudeEvent]], int], events: List[ClaudeEvent], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        pipeline(events)
+        best = min(best, time.perf_counter() - started)
+    return len(events) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    events = sample_turn(args.events)
+    baseline = measure(before, events, args.rounds)
+    typed = measure(after, events, args.rounds)
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}")
+    print(f"before: {baseline:>12,.0f} events/s")
+    print(f"after:  {typed:>12,.0f} events/s  ({typed / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()